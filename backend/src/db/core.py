@@ -1,12 +1,178 @@
 import logging
+from typing import Callable, List, Optional
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, AsyncEngine, async_sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.elements import TextClause
 
 from src.config import Config
 from src.utils import build_db_url
+from .routing import Replica, ReplicaRouter, PrimaryPins, RoutingSession
+from .pool import PoolMonitor, MonitoredQueuePool, attach_monitor, pool_sizing, pool_stats
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 
+# How a request session ended, see LazySession.finish()
+SESSION_UNUSED = 'unused'
+SESSION_IDLE = 'idle'
+SESSION_COMMITTED = 'committed'
+SESSION_SKIPPED = 'skipped'
+SESSION_ROLLED_BACK = 'rolled_back'
+SESSION_OUTCOMES = (SESSION_UNUSED, SESSION_IDLE, SESSION_COMMITTED, SESSION_SKIPPED, SESSION_ROLLED_BACK)
+
+
+class SessionMetrics:
+    """Process wide counters of how request sessions were used and ended."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.connections = 0
+        self.outcomes = {outcome: 0 for outcome in SESSION_OUTCOMES}
+
+    def record(self, outcome: str, connected: bool):
+        self.requests += 1
+        self.connections += int(connected)
+        self.outcomes[outcome] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            'requests': self.requests,
+            'connections': self.connections,
+            'connection_ratio': round(self.connections / self.requests, 4) if self.requests else 0.0,
+            **self.outcomes,
+        }
+
+
+READ_ONLY_SQL_PREFIXES = ('SELECT', 'WITH', 'EXPLAIN', 'SHOW')
+
+
+def _is_write(orm_execute_state) -> bool:
+    statement = orm_execute_state.statement
+    if isinstance(statement, TextClause):
+        return not statement.text.lstrip().upper().startswith(READ_ONLY_SQL_PREFIXES)
+    return not orm_execute_state.is_select
+
+
+def _track_session(session: AsyncSession):
+    """
+    Flag in session.info whether the session ever began a transaction on a connection,
+    whether the current transaction wrote anything (a flush or a non-SELECT statement)
+    and whether the session wrote at all ("wrote" outlives commits, it pins the client to the primary).
+    """
+    sync_session = session.sync_session
+    session.info.update({'connected': False, 'writes': False, 'wrote': False})
+
+    @event.listens_for(sync_session, 'after_begin')
+    def after_begin(session, transaction, connection):
+        session.info['connected'] = True
+
+    @event.listens_for(sync_session, 'after_flush')
+    def after_flush(session, flush_context):
+        session.info['writes'] = session.info['wrote'] = True
+
+    @event.listens_for(sync_session, 'do_orm_execute')
+    def do_orm_execute(orm_execute_state):
+        if _is_write(orm_execute_state):
+            info = orm_execute_state.session.info
+            info['writes'] = info['wrote'] = True
+
+    def savepoint_ended(session) -> bool:
+        # Both events also fire for savepoints, the outer transaction is then still active and keeps its writes
+        transaction = session.get_transaction()
+        return transaction is not None and transaction.is_active
+
+    @event.listens_for(sync_session, 'after_commit')
+    def after_commit(session):
+        if not savepoint_ended(session):
+            session.info['writes'] = False
+
+    @event.listens_for(sync_session, 'after_rollback')
+    def after_rollback(session):
+        if not savepoint_ended(session):
+            session.info['writes'] = False
+            # Work queued for after the commit, see run_after_commit(), is void once the transaction is gone
+            session.info.pop('after_commit', None)
+
+
+async def run_after_commit(session: AsyncSession):
+    """
+    Run the callbacks repositories queued in session.info['after_commit'] during a unit-of-work transaction
+    (cache invalidations that must not happen before the rows are visible to other sessions).
+    """
+    for callback in session.info.pop('after_commit', []):
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f'After commit callback failed: {e}')
+
+
+class LazySession:
+    """
+    Request scoped AsyncSession proxy.
+    The session is only created on first attribute access, so requests that never touch request.state.db
+    (rejected by the rate limiter, served from a cache, ...) never create one or check out a connection.
+    """
+    def __init__(self, session_factory: Callable[[], AsyncSession]):
+        self._session_factory = session_factory
+        self._session: Optional[AsyncSession] = None
+        self._tracked = False
+
+    @property
+    def acquired(self) -> bool:
+        return self._session is not None
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._session_factory()
+            if isinstance(self._session, AsyncSession):
+                if 'writes' not in self._session.info:
+                    _track_session(self._session)
+                self._tracked = True
+        return self._session
+
+    @property
+    def wrote(self) -> bool:
+        return self._tracked and self._session.info['wrote']
+
+    @property
+    def connected(self) -> bool:
+        if not self._tracked:
+            return self.acquired
+        return self._session.info['connected']
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    async def finish(self, success: bool) -> str:
+        """
+        End the request transaction: commit when something was written, roll back on failure.
+        A transaction that only read is left to close(), which skips the COMMIT round trip.
+        """
+        if not self.acquired:
+            return SESSION_UNUSED
+        if not success:
+            await self._session.rollback()
+            return SESSION_ROLLED_BACK
+
+        if not self._tracked:
+            await self._session.commit()
+            return SESSION_COMMITTED
+        if not self._session.in_transaction():
+            return SESSION_IDLE
+        if self._session.info['writes'] or self._session.new or self._session.dirty or self._session.deleted:
+            await self._session.commit()
+            await run_after_commit(self._session)
+            return SESSION_COMMITTED
+        return SESSION_SKIPPED
+
+    async def close(self):
+        if self.acquired:
+            await self._session.close()
+
 
 class DatabaseSessionManager:
     """Singleton class to manage async db sessions"""
@@ -22,41 +188,96 @@ class DatabaseSessionManager:
         if not self._initialized:
             self.engine: AsyncEngine = None 
             self.session_maker: async_sessionmaker = None
+            self.router: Optional[ReplicaRouter] = None
+            self.pool_monitors: List[PoolMonitor] = []
+            self.pins = PrimaryPins(Config.DB_READ_YOUR_WRITES_SECONDS)
+            self.metrics = SessionMetrics()
             self._initialized = True
 
-    async def initialize(self) -> None:
+    def _create_engine(self, database_url: str, name: str) -> AsyncEngine:
+        """Engine with a monitored pool sized from the settings, see src/db/pool.py."""
+        url = make_url(database_url)
+        options = {'pool_pre_ping': False, 'pool_recycle': Config.DB_POOL_RECYCLE}
+        if url.get_backend_name() != 'sqlite' or url.database not in (None, '', ':memory:'):
+            pool_size, max_overflow = pool_sizing(
+                Config.DB_CONNECTION_BUDGET, Config.WEB_CONCURRENCY, Config.DB_POOL_SIZE, Config.DB_MAX_OVERFLOW
+            )
+            options.update({
+                'poolclass': MonitoredQueuePool,
+                'pool_size': pool_size,
+                'max_overflow': max_overflow,
+                'pool_timeout': Config.DB_POOL_TIMEOUT,
+            })
+        engine = create_async_engine(database_url, **options)
+
+        monitor = PoolMonitor(name)
+        pre_ping_idle = Config.DB_POOL_PRE_PING_IDLE if Config.DB_POOL_PRE_PING_IDLE >= 0 else None
+        attach_monitor(engine.sync_engine, monitor, pre_ping_idle)
+        self.pool_monitors.append(monitor)
+        return engine
+
+    async def initialize(self, database_url: Optional[str] = None, replica_urls: Optional[List[str]] = None) -> None:
         if self.engine:
-            await self.engine.dispose()
+            await self.close()
 
-        database_url = build_db_url(
+        database_url = database_url or build_db_url(
             Config.DB_USER, 
             Config.DB_PASSWORD,
             Config.DB_HOST,
             Config.DB_PORT,
             Config.DB_NAME
         )
+        replica_urls = Config.db_replica_urls if replica_urls is None else replica_urls
         
-        self.engine = create_async_engine(
-            database_url,
-            pool_size=5,
-            max_overflow=10,
-            pool_pre_ping=True,
-            pool_recycle=3600,
-            pool_timeout=10,
-        )
+        self.pool_monitors = []
+        self.engine = self._create_engine(database_url, 'primary')
+
+        self.router = None
+        if replica_urls:
+            replicas = []
+            for url in replica_urls:
+                name = make_url(url).render_as_string(hide_password=True)
+                replicas.append(Replica(name, self._create_engine(url, name)))
+            self.router = ReplicaRouter(replicas, Config.DB_REPLICA_RETRY_SECONDS)
         
         self.session_maker = async_sessionmaker(
             bind=self.engine, 
             class_=AsyncSession, 
+            sync_session_class=RoutingSession,
             expire_on_commit=False,
+            info={'router': self.router},
         )
     
-    async def get_session(self) -> AsyncSession:
+    def new_session(self, use_replica: bool = False, unit_of_work: bool = False) -> AsyncSession:
+        """
+        A new session, use_replica sends its plain reads to a replica when any is configured and healthy.
+        In a unit_of_work session repository writes only flush, whoever owns the session commits it.
+        """
         if not self.session_maker:
             raise RuntimeError('Database not initialized. Call initialize() first.')
-        return self.session_maker()
+        session = self.session_maker()
+        session.info['use_replica'] = use_replica
+        session.info['unit_of_work'] = unit_of_work
+        _track_session(session)
+        return session
+
+    async def get_session(self, use_replica: bool = False) -> AsyncSession:
+        return self.new_session(use_replica)
+
+    def lazy_session(self, use_replica: bool = False, unit_of_work: Optional[bool] = None) -> LazySession:
+        """Request session, committed once by LazySession.finish() (unit of work unless DB_UNIT_OF_WORK is off)."""
+        unit_of_work = Config.DB_UNIT_OF_WORK if unit_of_work is None else unit_of_work
+        # Resolved at call time so a patched new_session is picked up
+        return LazySession(lambda: self.new_session(use_replica, unit_of_work))
             
-    async def close(self, tenant: str) -> None:
+    async def close(self, tenant: str = None) -> None:
+        if self.router:
+            for replica in self.router.replicas:
+                try:
+                    await replica.engine.dispose()
+                except Exception as e:
+                    logger.error(f'Error disposing replica engine {replica.name}: {e}')
+            self.router = None
         if self.engine:
             try:
                 await self.engine.dispose()
@@ -73,11 +294,35 @@ class DatabaseSessionManager:
 
         try:
             async with self.engine.begin() as conn:
-                await conn.execute('SELECT 1')
+                await conn.execute(text('SELECT 1'))
             return True
         except Exception as e:
             logger.warning(f'Health check failed: {e}')
             return False
 
+    def pool_stats(self) -> List[dict]:
+        """Live state and checkout statistics of the primary and replica pools."""
+        return pool_stats(self.pool_monitors)
+
+    def stats(self) -> dict:
+        return {
+            'pools': self.pool_stats(),
+            'replicas': self.router.status() if self.router else [],
+            'sessions': self.metrics.snapshot(),
+        }
+
+    async def check_replicas(self) -> List[dict]:
+        """Ping every replica, putting reachable ones back in rotation and taking failing ones out."""
+        if not self.router:
+            return []
+        for replica in self.router.replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    await conn.execute(text('SELECT 1'))
+                self.router.mark_up(replica)
+            except Exception as e:
+                self.router.mark_down(replica, e)
+        return self.router.status()
+
 
 sessionmanager = DatabaseSessionManager()
@@ -0,0 +1,111 @@
+"""instrumentation.py
+
+Per-request SQL statistics from engine cursor events.
+
+track_queries() binds a QueryStats to the current context; every statement executed by any engine
+while it is bound is counted with its duration, along with the transactions committed. The request middleware reports the totals in the access log
+and a Server-Timing header, and statements repeated N_PLUS_ONE_THRESHOLD times or more are logged as a likely N+1.
+"""
+
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 5
+STATEMENT_PREVIEW_LENGTH = 200
+
+_current_stats: ContextVar[Optional['QueryStats']] = ContextVar('query_stats', default=None)
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.commits = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.statements = Counter()
+
+    def record(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.statements[statement] += 1
+        if elapsed_ms >= self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_statement = statement
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Statements executed at least threshold times, the usual shape of an N+1 loop."""
+        return [(statement, times) for statement, times in self.statements.most_common() if times >= threshold]
+
+    def summary(self) -> str:
+        if not self.count:
+            return '0 queries'
+        summary = f'{self.count} queries in {self.total_ms:.1f}ms, slowest {self.slowest_ms:.1f}ms'
+        return f'{summary}, {self.commits} commits' if self.commits else summary
+
+    def server_timing(self, app_ms: Optional[float] = None) -> str:
+        metrics = [f'db;dur={self.total_ms:.1f};desc="{self.count} queries"']
+        if self.count:
+            metrics.append(f'db-slowest;dur={self.slowest_ms:.1f}')
+        if app_ms is not None:
+            metrics.append(f'app;dur={app_ms:.1f}')
+        return ', '.join(metrics)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Count the statements executed in this context (and tasks started from it) while the block runs."""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault('query_started_at', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    started = conn.info.get('query_started_at')
+    if stats is None or not started:
+        return
+    stats.record(statement[:STATEMENT_PREVIEW_LENGTH], (perf_counter() - started.pop()) * 1000)
+
+
+def _commit(conn):
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.commits += 1
+
+
+def _handle_error(context):
+    # Failed statements never reach after_cursor_execute
+    started = context.connection.info.get('query_started_at') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def install():
+    """Listen on every engine, idempotent."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        event.listen(Engine, 'commit', _commit)
@@ -0,0 +1,4 @@
+-- up
+ALTER TABLE tasks ADD FULLTEXT INDEX ftx_tasks_title_description (title, description);
+-- down
+ALTER TABLE tasks DROP INDEX ftx_tasks_title_description;
@@ -0,0 +1,32 @@
+-- up
+-- Composite indexes matching the list queries: every query filters deleted_at IS NULL, then on status, priority
+-- or assignee_id, and keyset-paginates by a sort column with id as the tie-breaker (ORDER BY id DESC by default).
+-- Equality columns come first and the sort columns last, so the page is read as one index range in order.
+ALTER TABLE tasks
+    ADD INDEX idx_tasks_active (deleted_at, id),
+    ADD INDEX idx_tasks_active_created (deleted_at, created_at, id),
+    ADD INDEX idx_tasks_active_due (deleted_at, due_date, id),
+    ADD INDEX idx_tasks_status_active (status, deleted_at, id),
+    ADD INDEX idx_tasks_priority_active (priority, deleted_at, id),
+    ADD INDEX idx_tasks_assignee_active (assignee_id, deleted_at, id),
+    ADD INDEX idx_tasks_assignee_active_due (assignee_id, deleted_at, due_date, id);
+-- The single-column indexes are prefixes of the composite ones
+ALTER TABLE tasks
+    DROP INDEX idx_tasks_status,
+    DROP INDEX idx_tasks_priority,
+    DROP INDEX idx_tasks_assignee;
+ALTER TABLE users ADD INDEX idx_users_active (deleted_at, id);
+-- down
+ALTER TABLE users DROP INDEX idx_users_active;
+ALTER TABLE tasks
+    ADD INDEX idx_tasks_status (status),
+    ADD INDEX idx_tasks_priority (priority),
+    ADD INDEX idx_tasks_assignee (assignee_id);
+ALTER TABLE tasks
+    DROP INDEX idx_tasks_active,
+    DROP INDEX idx_tasks_active_created,
+    DROP INDEX idx_tasks_active_due,
+    DROP INDEX idx_tasks_status_active,
+    DROP INDEX idx_tasks_priority_active,
+    DROP INDEX idx_tasks_assignee_active,
+    DROP INDEX idx_tasks_assignee_active_due;
@@ -0,0 +1,152 @@
+"""pool.py
+
+Connection pool sizing, idle-aware liveness checks and statistics.
+
+- Pool size and overflow default to an even share of DB_CONNECTION_BUDGET across the worker processes.
+- Instead of pool_pre_ping on every checkout, a connection is pinged only when it sat idle in the pool
+  for longer than DB_POOL_PRE_PING_IDLE seconds; a failed ping swaps it for a fresh connection.
+- MonitoredQueuePool records checkout wait times and timeouts, PoolMonitor.stats() adds the live pool state.
+"""
+
+import logging
+from bisect import bisect_left
+from time import monotonic, perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the checkout wait time histogram, the last bucket is everything slower
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+SLOW_CHECKOUT_MS = 1000
+
+
+def pool_sizing(budget: int, workers: int, pool_size: Optional[int] = None, max_overflow: Optional[int] = None) -> Tuple[int, int]:
+    """
+    (pool_size, max_overflow) per worker process.
+    Unset values split the connection budget evenly between workers, two thirds kept open and one third as overflow.
+    """
+    per_worker = max(1, budget // max(1, workers))
+    if pool_size is None:
+        pool_size = max(1, (per_worker * 2) // 3)
+    if max_overflow is None:
+        max_overflow = max(0, per_worker - pool_size)
+    return pool_size, max_overflow
+
+
+class PoolMonitor:
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.max_wait_ms = 0.0
+
+    def record_wait(self, wait_ms: float):
+        self.checkouts += 1
+        self.wait_buckets[bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        if wait_ms >= SLOW_CHECKOUT_MS:
+            logger.warning(f'Pool {self.name}: waited {wait_ms:.0f}ms for a connection ({self.pool.status() if self.pool else ""})')
+
+    def record_timeout(self):
+        self.timeouts += 1
+        logger.error(f'Pool {self.name}: connection checkout timed out ({self.pool.status() if self.pool else ""})')
+
+    def histogram(self) -> Dict[str, int]:
+        labels = [f'<={bound}ms' for bound in WAIT_BUCKETS_MS] + [f'>{WAIT_BUCKETS_MS[-1]}ms']
+        return dict(zip(labels, self.wait_buckets))
+
+    def stats(self) -> dict:
+        live = {}
+        if self.pool is not None:
+            live = {
+                'size': self.pool.size(),
+                'checked_out': self.pool.checkedout(),
+                'checked_in': self.pool.checkedin(),
+                'overflow': self.pool.overflow(),
+                'max_overflow': self.pool._max_overflow,
+                'timeout': self.pool.timeout(),
+            }
+        return {
+            'name': self.name,
+            **live,
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'pings': self.pings,
+            'ping_failures': self.ping_failures,
+            'max_wait_ms': round(self.max_wait_ms, 3),
+            'wait_histogram': self.histogram(),
+        }
+
+
+class MonitoredQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool reporting checkout wait times and timeouts to its PoolMonitor."""
+    monitor: Optional[PoolMonitor] = None
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.monitor:
+                self.monitor.record_timeout()
+            raise
+        if self.monitor:
+            self.monitor.record_wait((perf_counter() - started) * 1000)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() recreates the pool, the monitor carries over
+        pool = super().recreate()
+        pool.monitor = self.monitor
+        if self.monitor:
+            self.monitor.pool = pool
+        return pool
+
+
+def attach_monitor(engine: Engine, monitor: PoolMonitor, pre_ping_idle: Optional[float]):
+    """
+    Watch engine's pool with monitor and ping connections idle for longer than pre_ping_idle seconds on checkout.
+    pre_ping_idle None disables the check, 0 pings on every checkout.
+    """
+    pool = engine.pool
+    if isinstance(pool, MonitoredQueuePool):
+        pool.monitor = monitor
+    monitor.pool = pool
+
+    if pre_ping_idle is None:
+        return
+
+    @event.listens_for(engine, 'checkin')
+    def checkin(dbapi_connection, connection_record):
+        connection_record.info['checked_in_at'] = monotonic()
+
+    @event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get('checked_in_at')
+        if checked_in_at is None or monotonic() - checked_in_at < pre_ping_idle:
+            return
+        monitor.pings += 1
+        try:
+            alive = engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            logger.info(f'Pool {monitor.name}: idle connection failed its ping: {e}')
+            alive = False
+        if not alive:
+            monitor.ping_failures += 1
+            # The pool discards the connection and retries the checkout with a new one
+            raise exc.DisconnectionError()
+
+
+def pool_stats(monitors: List[PoolMonitor]) -> List[dict]:
+    return [monitor.stats() for monitor in monitors]
@@ -1,60 +1,475 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from math import ceil
+from time import time
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple
 from redis import asyncio as aioredis
+from redis.commands.core import AsyncScript
+from redis.exceptions import DataError, NoScriptError, RedisError
 from src.config import Config
 from src.exceptions import AppException
 
+logger = logging.getLogger(__name__)
+
+
+class RedisManager:
+    """
+    Singleton owning the process wide Redis connection pool.
+    Opened in the app lifespan and closed on shutdown, every RedisClient without its own url borrows from it.
+    Used outside the app (scripts, tests) the pool is opened on first use.
+    """
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.redis: Optional[aioredis.Redis] = None
+            self._initialized = True
+
+    def _create(self, redis_url: str) -> aioredis.Redis:
+        # A blocking pool makes a burst wait up to REDIS_POOL_TIMEOUT for a connection instead of failing at the cap
+        pool = aioredis.BlockingConnectionPool.from_url(
+            redis_url,
+            max_connections=Config.REDIS_MAX_CONNECTIONS,
+            timeout=Config.REDIS_POOL_TIMEOUT,
+            socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=Config.REDIS_SOCKET_CONNECT_TIMEOUT,
+            health_check_interval=Config.REDIS_HEALTH_CHECK_INTERVAL,
+        )
+        return aioredis.Redis(connection_pool=pool)
+
+    async def initialize(self, redis_url: str = None) -> None:
+        if self.redis:
+            await self.close()
+        self.redis = self._create(redis_url or Config.REDIS_URL)
+
+    def client(self) -> aioredis.Redis:
+        if self.redis is None:
+            self.redis = self._create(Config.REDIS_URL)
+        return self.redis
+
+    async def close(self) -> None:
+        if self.redis:
+            try:
+                await self.redis.aclose(close_connection_pool=True)
+                logger.info('Redis connection pool closed')
+            except Exception as e:
+                logger.error(f'Error closing Redis connection pool: {e}')
+            finally:
+                self.redis = None
+
+    def stats(self) -> dict:
+        if self.redis is None:
+            return {}
+        pool = self.redis.connection_pool
+        return {
+            'max_connections': pool.max_connections,
+            'in_use': len(pool._in_use_connections),
+            'available': len(pool._available_connections),
+        }
+
+
+redismanager = RedisManager()
+
 
 class RedisClient:
-    def __init__(self, redis_url: str = None):
-        self.redis_url = redis_url or Config.REDIS_URL
+    """
+    Redis commands with AppException errors, on the shared pool unless a redis_url of its own is given.
+
+    With auto_batch, commands issued in the same event loop tick (by any number of concurrent requests)
+    are sent together in one pipeline, each caller still awaits its own result.
+    pipeline() batches explicitly, mget/mset/exists_many/delete_many cover several keys in one round trip.
+    """
+    def __init__(self, redis_url: str = None, auto_batch: bool = False):
+        self.redis_url = redis_url
         self.redis = None
+        self.auto_batch = auto_batch
+        self._pending: List[Tuple[Callable, asyncio.Future]] = []
+        self._batches: Set[asyncio.Task] = set()
+        self.batch_stats = {'batches': 0, 'commands': 0, 'max_batch': 0}
 
     async def connect(self):
-        if not self.redis:
+        # The shared pool is looked up on every call, it is replaced when the app (re)starts
+        if not self.redis_url:
+            self.redis = redismanager.client()
+        elif not self.redis:
             try:
                 self.redis = aioredis.from_url(self.redis_url)
             except Exception as e:
                 raise AppException(f'Failed to connect to Redis: {str(e)}')
-            return self.redis
+        return self.redis
+
+    def _enqueue(self, queue_command: Callable) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((queue_command, future))
+        if len(self._pending) == 1:
+            # Runs after every callback already due in this tick, whatever they queue joins the batch
+            loop.call_soon(self._send_batch)
+        return future
+
+    def _send_batch(self):
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._execute_batch(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _execute_batch(self, batch: List[Tuple[Callable, asyncio.Future]]):
+        self.batch_stats['batches'] += 1
+        self.batch_stats['commands'] += len(batch)
+        self.batch_stats['max_batch'] = max(self.batch_stats['max_batch'], len(batch))
+        try:
+            redis = await self.connect()
+            async with redis.pipeline(transaction=False) as pipe:
+                queued = self._queue_batch(pipe, batch)
+                results = await pipe.execute(raise_on_error=False) if queued else []
+        except DataError:
+            # A command could not be encoded, the pipeline was never sent: run each alone so only its caller fails
+            await self._execute_each(redis, batch)
+            return
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self._resolve(queued, results)
+
+    @staticmethod
+    def _queue_batch(pipe, batch: List[Tuple[Callable, asyncio.Future]]) -> List[asyncio.Future]:
+        """Queue every command on pipe, one that cannot be built fails its own caller. The futures in pipeline order."""
+        queued = []
+        for queue_command, future in batch:
+            try:
+                queue_command(pipe)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            queued.append(future)
+        return queued
+
+    async def _execute_each(self, redis: aioredis.Redis, batch: List[Tuple[Callable, asyncio.Future]]):
+        for command in batch:
+            try:
+                async with redis.pipeline(transaction=False) as pipe:
+                    queued = self._queue_batch(pipe, [command])
+                    results = await pipe.execute(raise_on_error=False) if queued else []
+            except Exception as e:
+                if not command[1].done():
+                    command[1].set_exception(e)
+                continue
+            self._resolve(queued, results)
+
+    @staticmethod
+    def _resolve(futures: List[asyncio.Future], results: List):
+        for future, result in zip(futures, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _execute(self, command: str, *args, **kwargs):
+        if self.auto_batch:
+            return await self._enqueue(lambda pipe: getattr(pipe, command)(*args, **kwargs))
+        redis = await self.connect()
+        return await getattr(redis, command)(*args, **kwargs)
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False) -> AsyncIterator[aioredis.client.Pipeline]:
+        """
+        Queue commands on the yielded pipeline, whatever is still queued is sent when the block exits.
+        Call `await pipe.execute()` inside the block to read the results.
+        """
+        redis = await self.connect()
+        async with redis.pipeline(transaction=transaction) as pipe:
+            yield pipe
+            if len(pipe):
+                try:
+                    await pipe.execute()
+                except RedisError as e:
+                    raise AppException(f'Failed to execute Redis pipeline: {str(e)}')
 
     async def set(self, name: str, value: str, expiry: int = None):
-        await self.connect()
         try:
-            await self.redis.set(name=name, value=value, ex=expiry)
+            await self._execute('set', name=name, value=value, ex=expiry)
         except Exception as e:
             raise AppException(f'Failed to set key "{name}" in Redis: {str(e)}')
 
     async def get(self, name: str):
-        await self.connect()
         try:
-            return await self.redis.get(name)
+            return await self._execute('get', name)
         except Exception as e:
             raise AppException(f'Failed to get key "{name}" from Redis: {str(e)}')
 
     async def delete(self, name: str):
-        await self.connect()
         try:
-            await self.redis.delete(name)
+            await self._execute('delete', name)
         except Exception as e:
             raise AppException(f'Failed to delete key "{name}" in Redis: {str(e)}')
 
+    async def incr(self, name: str):
+        try:
+            return await self._execute('incr', name)
+        except Exception as e:
+            raise AppException(f'Failed to increment key "{name}" in Redis: {str(e)}')
+
+    async def hget(self, name: str, key: str):
+        try:
+            return await self._execute('hget', name, key)
+        except Exception as e:
+            raise AppException(f'Failed to get field "{key}" of "{name}" from Redis: {str(e)}')
+
+    async def hset(self, name: str, key: str, value: str, expiry: int = None):
+        try:
+            async with self.pipeline() as pipe:
+                pipe.hset(name, key, value)
+                if expiry:
+                    pipe.expire(name, expiry)
+        except Exception as e:
+            raise AppException(f'Failed to set field "{key}" of "{name}" in Redis: {str(e)}')
+
+    async def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        try:
+            return await self._execute('hincrby', name, key, amount)
+        except Exception as e:
+            raise AppException(f'Failed to increment field "{key}" of "{name}" in Redis: {str(e)}')
+
     async def exists(self, name: str):
-        await self.connect()
         try:
-            return await self.redis.exists(name) > 0
+            return await self._execute('exists', name) > 0
         except Exception as e:
             raise AppException(f'Failed to check existence of key "{name}" in Redis: {str(e)}')
 
+    async def publish(self, channel: str, message: str):
+        try:
+            return await self._execute('publish', channel, message)
+        except Exception as e:
+            raise AppException(f'Failed to publish to "{channel}" in Redis: {str(e)}')
+
+    async def mget(self, names: List[str]) -> List:
+        if not names:
+            return []
+        try:
+            return await self._execute('mget', names)
+        except Exception as e:
+            raise AppException(f'Failed to get {len(names)} keys from Redis: {str(e)}')
+
+    async def mset(self, mapping: Dict[str, str], expiry: int = None):
+        """Set every key of mapping in one round trip, MSET has no expiry so with one the SETs are pipelined."""
+        if not mapping:
+            return
+        try:
+            if not expiry:
+                await self._execute('mset', mapping)
+                return
+            async with self.pipeline() as pipe:
+                for name, value in mapping.items():
+                    pipe.set(name=name, value=value, ex=expiry)
+        except Exception as e:
+            raise AppException(f'Failed to set {len(mapping)} keys in Redis: {str(e)}')
+
+    async def exists_many(self, names: List[str]) -> List[bool]:
+        """Whether each of names exists, EXISTS with several keys only returns how many do."""
+        if not names:
+            return []
+        try:
+            async with self.pipeline() as pipe:
+                for name in names:
+                    pipe.exists(name)
+                return [count > 0 for count in await pipe.execute()]
+        except Exception as e:
+            raise AppException(f'Failed to check existence of {len(names)} keys in Redis: {str(e)}')
+
+    async def delete_many(self, names: List[str]) -> int:
+        if not names:
+            return 0
+        try:
+            return await self._execute('delete', *names)
+        except Exception as e:
+            raise AppException(f'Failed to delete {len(names)} keys in Redis: {str(e)}')
+
+    async def run_script(self, script: AsyncScript, keys: List[str], args: List):
+        """Run a registered Lua script as EVALSHA, batched like any other command with auto_batch."""
+        if not self.auto_batch:
+            return await script(keys=keys, args=args)
+        try:
+            return await self._enqueue(lambda pipe: pipe.evalsha(script.sha, len(keys), *keys, *args))
+        except NoScriptError:
+            # First run on this server, the direct call loads the script
+            return await script(keys=keys, args=args)
+
+
+REVOKED_TOKEN_PREFIX = 'revoked-token:'
+REVOCATION_CHANNEL = 'token-revocations'
+REVOCATION_RESUBSCRIBE_SECONDS = 1
+# Hash of user id -> token version, tokens issued with an older version than the user's are stale
+TOKEN_VERSIONS_KEY = 'token-versions'
+USER_VERSION_PREFIX = 'user:'
+
+
+class RevocationFilter:
+    """
+    In-process copy of the revoked token ids with their expiry time, and of the users' token versions.
+    Only authoritative while `ready`, i.e. loaded and subscribed to the revocation channel.
+    """
+    def __init__(self):
+        self.ready = False
+        self._revoked: Dict[str, float] = {}
+        self._versions: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def add(self, jti: str, expires_at: float):
+        self._revoked[jti] = expires_at
+
+    def discard(self, jti: str):
+        self._revoked.pop(jti, None)
+
+    def contains(self, jti: str) -> bool:
+        expires_at = self._revoked.get(jti)
+        if expires_at is None:
+            return False
+        if expires_at <= time():
+            # The token itself has expired by now, its revocation is moot
+            self._revoked.pop(jti, None)
+            return False
+        return True
+
+    def replace(self, entries: Iterable[Tuple[str, float]], versions: Optional[Dict[str, int]] = None):
+        now = time()
+        self._revoked = {jti: expires_at for jti, expires_at in entries if expires_at > now}
+        self._versions = dict(versions or {})
+
+    def set_version(self, user_id: str, version: int):
+        # Messages may arrive out of order, a version never goes back
+        self._versions[user_id] = max(version, self._versions.get(user_id, 0))
+
+    def version(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
 
 class TokenBlocklist:
+    """
+    Revoked token ids in Redis, each kept for the token's remaining lifetime,
+    and a per-user token version bumped whenever the claims of the user's tokens go stale (role change, deletion).
+    Every worker mirrors both in a RevocationFilter, loaded on start() and kept current through pub/sub,
+    so checking a token needs no Redis call. While the subscription is down checks fall back to EXISTS / HGET.
+    """
     def __init__(self, redis_client: RedisClient = None, expiry: int = 3600):
         self.redis_client = redis_client or RedisClient()
+        # Lifetime assumed for tokens blocked without their expiry time
         self.expiry = expiry
+        self.filter = RevocationFilter()
+        self._listener: Optional[asyncio.Task] = None
+
+    def _key(self, jti: str) -> str:
+        return f'{REVOKED_TOKEN_PREFIX}{jti}'
 
-    async def block_token(self, jti: str):
-        await self.redis_client.set(name=jti, value='', expiry=self.expiry)
+    async def block_token(self, jti: str, expires_at: Optional[float] = None):
+        """Revoke jti until expires_at (the token's exp claim), when the token could not be used anyway."""
+        now = time()
+        expires_at = expires_at if expires_at is not None else now + self.expiry
+        if expires_at <= now:
+            return
+        await self.redis_client.set(name=self._key(jti), value=str(expires_at), expiry=ceil(expires_at - now))
+        self.filter.add(jti, expires_at)
+        await self.redis_client.publish(REVOCATION_CHANNEL, f'{jti} {expires_at}')
 
     async def is_token_blocked(self, jti: str) -> bool:
-        return await self.redis_client.exists(name=jti)
+        if self.filter.ready:
+            return self.filter.contains(jti)
+        return await self.redis_client.exists(name=self._key(jti))
 
     async def remove_token(self, jti: str):
-        await self.redis_client.delete(name=jti)
+        await self.redis_client.delete(name=self._key(jti))
+        self.filter.discard(jti)
+        await self.redis_client.publish(REVOCATION_CHANNEL, f'{jti} 0')
+
+    async def user_version(self, user_id) -> int:
+        """Token version tokens of user_id must carry (their "ver" claim) to be accepted, 0 until first bumped."""
+        if self.filter.ready:
+            return self.filter.version(str(user_id))
+        version = await self.redis_client.hget(TOKEN_VERSIONS_KEY, str(user_id))
+        return int(version) if version is not None else 0
+
+    async def bump_user_version(self, user_id) -> int:
+        """Make every token issued so far to user_id stale."""
+        version = await self.redis_client.hincrby(TOKEN_VERSIONS_KEY, str(user_id))
+        self.filter.set_version(str(user_id), version)
+        await self.redis_client.publish(REVOCATION_CHANNEL, f'{USER_VERSION_PREFIX}{user_id} {version}')
+        return version
+
+    async def is_token_stale(self, token_data: dict) -> bool:
+        """Whether the token was issued before its user's last token version bump."""
+        user_id = (token_data.get('user') or {}).get('user_id')
+        if user_id is None:
+            return False
+        return int(token_data['user'].get('ver', 0)) < await self.user_version(user_id)
+
+    async def start(self):
+        """Start mirroring revocations in this process, called from the app lifespan."""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self.filter.ready = False
+
+    async def _load(self, redis: aioredis.Redis):
+        keys = [key async for key in redis.scan_iter(match=f'{REVOKED_TOKEN_PREFIX}*', count=1000)]
+        entries = []
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            for key, value in zip(chunk, await redis.mget(chunk)):
+                if value is not None:
+                    entries.append((key.decode()[len(REVOKED_TOKEN_PREFIX):], float(value)))
+        versions = {user_id.decode(): int(version) for user_id, version in (await redis.hgetall(TOKEN_VERSIONS_KEY)).items()}
+        self.filter.replace(entries, versions)
+
+    def _apply(self, message: bytes):
+        subject, value = message.decode().split(' ')
+        if subject.startswith(USER_VERSION_PREFIX):
+            self.filter.set_version(subject[len(USER_VERSION_PREFIX):], int(value))
+        elif float(value) > 0:
+            self.filter.add(subject, float(value))
+        else:
+            self.filter.discard(subject)
+
+    async def _listen(self):
+        while True:
+            try:
+                redis = await self.redis_client.connect()
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(REVOCATION_CHANNEL)
+                    # Loaded after subscribing, so a revocation published in between is not missed
+                    await self._load(redis)
+                    self.filter.ready = True
+                    logger.info(f'Token revocation filter ready with {len(self.filter)} entries')
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self._apply(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f'Token revocation subscription lost, checking Redis directly: {e}')
+            finally:
+                self.filter.ready = False
+            await asyncio.sleep(REVOCATION_RESUBSCRIBE_SECONDS)
+
+
+token_blocklist = TokenBlocklist(RedisClient(auto_batch=Config.REDIS_AUTO_BATCH))
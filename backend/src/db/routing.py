@@ -0,0 +1,157 @@
+"""routing.py
+
+Read-replica routing for DatabaseSessionManager.
+
+- RoutingSession sends plain SELECTs of a replica-enabled session to a healthy replica,
+  anything else (writes, SELECT ... FOR UPDATE, raw SQL, reads after a write in the same session) goes to the primary.
+- ReplicaRouter picks replicas round robin, takes a failing replica out of rotation
+  and retries it after a cool-down, falling back to the primary while none is healthy.
+- PrimaryPins keeps clients that just wrote on the primary for a read-your-writes window,
+  shared by every worker through Redis (read-your-writes:<client key>) with an in-process copy as fallback.
+"""
+
+import logging
+from itertools import count
+from time import monotonic
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from .redis import RedisClient
+
+logger = logging.getLogger(__name__)
+
+REPLICA_RETRY_SECONDS = 30
+READ_YOUR_WRITES_SECONDS = 5
+PIN_PRUNE_SIZE = 10000
+PIN_PREFIX = 'read-your-writes:'
+
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.retry_at = 0.0
+        self.failures = 0
+
+    @property
+    def healthy(self) -> bool:
+        # An unhealthy replica is tried again once its cool-down is over
+        return monotonic() >= self.retry_at
+
+
+class ReplicaRouter:
+    def __init__(self, replicas: List[Replica], retry_seconds: int = REPLICA_RETRY_SECONDS):
+        self.replicas = replicas
+        self.retry_seconds = retry_seconds
+        self._counter = count()
+        for replica in replicas:
+            self._watch(replica)
+
+    def _watch(self, replica: Replica):
+        @event.listens_for(replica.engine.sync_engine, 'handle_error')
+        def handle_error(context):
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(replica, context.original_exception)
+
+    def mark_down(self, replica: Replica, error: Optional[BaseException] = None):
+        replica.failures += 1
+        replica.retry_at = monotonic() + self.retry_seconds
+        logger.warning(f'Replica {replica.name} taken out of rotation for {self.retry_seconds}s: {error}')
+
+    def mark_up(self, replica: Replica):
+        if replica.failures:
+            logger.info(f'Replica {replica.name} back in rotation')
+        replica.failures = 0
+        replica.retry_at = 0.0
+
+    def reader(self) -> Optional[Replica]:
+        """The next healthy replica, None when the primary has to serve reads."""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def status(self) -> List[dict]:
+        return [
+            {'name': replica.name, 'healthy': replica.healthy, 'failures': replica.failures}
+            for replica in self.replicas
+        ]
+
+
+class PrimaryPins:
+    """
+    Read-your-writes window keyed by a client identity.
+    Pins live in Redis so a write on one worker keeps the client's reads on the primary in every worker;
+    the pinning worker also remembers them locally, which answers its own checks and covers Redis outages.
+    """
+    def __init__(self, window_seconds: int = READ_YOUR_WRITES_SECONDS, redis_client: RedisClient = None):
+        self.window_seconds = window_seconds
+        self.redis_client = redis_client or RedisClient(auto_batch=True)
+        self._pins: Dict[str, float] = {}
+
+    def _key(self, client_key: str) -> str:
+        return f'{PIN_PREFIX}{client_key}'
+
+    async def pin(self, client_key: str):
+        if self.window_seconds <= 0:
+            return
+        if len(self._pins) >= PIN_PRUNE_SIZE:
+            self.prune()
+        self._pins[client_key] = monotonic() + self.window_seconds
+        try:
+            await self.redis_client.set(self._key(client_key), '1', expiry=self.window_seconds)
+        except Exception as e:
+            logger.warning(f'Read-your-writes pin kept in this worker only: {e}')
+
+    def is_pinned_locally(self, client_key: str) -> bool:
+        until = self._pins.get(client_key)
+        if until is None:
+            return False
+        if monotonic() >= until:
+            self._pins.pop(client_key, None)
+            return False
+        return True
+
+    async def is_pinned(self, client_key: str) -> bool:
+        if self.window_seconds <= 0:
+            return False
+        if self.is_pinned_locally(client_key):
+            return True
+        try:
+            return await self.redis_client.exists(self._key(client_key))
+        except Exception as e:
+            logger.warning(f'Read-your-writes check answered by this worker only: {e}')
+            return False
+
+    def prune(self):
+        now = monotonic()
+        for client_key, until in list(self._pins.items()):
+            if now >= until:
+                self._pins.pop(client_key, None)
+
+
+class RoutingSession(Session):
+    """
+    Session that reads from a replica when session.info['use_replica'] is set and a router is attached.
+    The replica chosen for a session is kept for its lifetime, so its reads see one consistent snapshot.
+    """
+    def get_bind(self, mapper=None, clause=None, **kw):
+        router: Optional[ReplicaRouter] = self.info.get('router')
+        if (
+            router is not None
+            and self.info.get('use_replica')
+            and not self.info.get('wrote')
+            and not self._flushing
+            and isinstance(clause, Select)
+            and clause._for_update_arg is None
+        ):
+            replica = self.info.get('replica')
+            if replica is None or not replica.healthy:
+                replica = self.info['replica'] = router.reader()
+            if replica is not None:
+                return replica.engine.sync_engine
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
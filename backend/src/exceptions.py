@@ -99,10 +99,13 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     Custom handler for HTTP exceptions.
     """
     logger.error(f'HTTPError : {str(exc)}')
-    return ApiResponser.error_response(
+    response = ApiResponser.error_response(
         message=exc.detail, 
         status_code=exc.status_code
     )
+    if exc.headers:
+        response.headers.update(exc.headers)
+    return response
 
 
 # Register all exception handlers
@@ -3,12 +3,13 @@ from typing import List, Any
 
 
 class Paginator:
-    def __init__(self, items: List[Any], total: int, page: int, per_page: int):
+    def __init__(self, items: List[Any], total: int, page: int, per_page: int, count_strategy: str = 'exact'):
         self.items = items
         self.total = total
         self.page = page
         self.per_page = per_page
         self.total_pages = ceil(total / per_page)
+        self.count_strategy = count_strategy
 
     def to_dict(self):
         return {
@@ -16,6 +17,7 @@ class Paginator:
             'page': self.page,
             'per_page': self.per_page,
             'total_pages': self.total_pages,
+            'count_strategy': self.count_strategy,
         }
 
 
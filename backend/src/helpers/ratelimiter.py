@@ -1,32 +1,314 @@
-from time import time
+"""ratelimiter.py
+
+Rate limiting with GCRA (generic cell rate algorithm), a token bucket stored as a single timestamp per key.
+
+- One atomic Lua script per check (EVALSHA): read the key's theoretical arrival time, admit or reject, store it back.
+  Memory is one string per key however high the limit, and the Redis server clock is used, so workers agree.
+- RateLimitPolicy: limit requests per period for an identity, scope 'ip', 'user' (token subject, falls back to ip)
+  or 'route' (one budget shared by every client of the route).
+- RateLimit: route dependency consuming cost tokens from a policy, declared in a route class' middlewares
+  like RoleChecker. The cost may be a callable on the request, so heavy variants of a route pay more.
+- The rate_limiter middleware applies DEFAULT_POLICY to every request and adds the X-RateLimit-* headers
+  (and Retry-After on 429) of the most restrictive policy that was checked, no extra Redis call needed.
+- LocalTier keeps Redis off the hot path: after a sync a worker may admit up to
+  min(RATE_LIMIT_LOCAL_BATCH, RATE_LIMIT_LOCAL_FRACTION x remaining) tokens of a key on its own for RATE_LIMIT_SYNC_MS.
+  The usage is reported with the next script call (or a background flush), so long-run rates stay exact and
+  the cluster can overshoot a key's limit by at most workers x that allowance.
+"""
+
+import asyncio
+import logging
+from math import ceil, floor
+from time import monotonic
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, Request
+
+from src.config import Config
 from src.db.redis import RedisClient
 
+logger = logging.getLogger(__name__)
+
 RATE_LIMIT = 50
 RATE_LIMIT_TIME_WINDOW = 60
 
+# KEYS[1] bucket key, ARGV[1] ms per token, ARGV[2] bucket size, ARGV[3] cost,
+# ARGV[4] tokens already admitted by a local tier, always recorded (beyond the bucket they delay later requests)
+# Returns {allowed, remaining, retry_after_ms (-1 never), reset_after_ms}
+GCRA_SCRIPT = """
+local emission = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local pending = tonumber(ARGV[4] or '0')
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local capacity = emission * burst
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+tat = tat + emission * pending
+
+local new_tat = tat + emission * cost
+local allow_at = new_tat - capacity
+if allow_at > now then
+    if pending > 0 then
+        redis.call('SET', KEYS[1], string.format('%.3f', tat), 'PX', math.ceil(tat - now))
+    end
+    local remaining = math.floor((capacity - (tat - now)) / emission)
+    local retry_after = math.ceil(allow_at - now)
+    if cost > burst then
+        retry_after = -1
+    end
+    return {0, math.max(remaining, 0), retry_after, math.ceil(tat - now)}
+end
+
+redis.call('SET', KEYS[1], string.format('%.3f', new_tat), 'PX', math.ceil(new_tat - now))
+return {1, math.floor((capacity - (new_tat - now)) / emission), 0, math.ceil(new_tat - now)}
+"""
+
+
+class RateLimitPolicy:
+    SCOPES = ('ip', 'user', 'route')
+
+    def __init__(self, name: str, limit: int, period: int, scope: str = 'ip'):
+        if scope not in self.SCOPES:
+            raise ValueError(f'Unsupported rate limit scope: {scope}')
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.scope = scope
+
+    @property
+    def emission_ms(self) -> float:
+        """Milliseconds it takes to earn back one token."""
+        return self.period * 1000 / self.limit
+
+    def identity(self, request: Request) -> str:
+        client_ip = request.client.host if request.client else 'unknown'
+        if self.scope == 'user':
+            auth = getattr(request.state, 'auth', None)
+            user_id = auth.user_id if auth is not None else None
+            return f'user:{user_id}' if user_id is not None else f'ip:{client_ip}'
+        if self.scope == 'route':
+            route = request.scope.get('route')
+            return f'route:{request.method}:{route.path if route else request.url.path}'
+        return f'ip:{client_ip}'
+
+    def key(self, request: Request) -> str:
+        return f'rate-limit:{self.name}:{self.identity(request)}'
+
+
+class RateLimitResult:
+    def __init__(self, policy: RateLimitPolicy, allowed: bool, remaining: int, retry_after_ms: int, reset_after_ms: int):
+        self.policy = policy
+        self.allowed = allowed
+        self.remaining = remaining
+        self.retry_after_ms = retry_after_ms
+        self.reset_after_ms = reset_after_ms
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            'X-RateLimit-Limit': str(self.policy.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(ceil(self.reset_after_ms / 1000)),
+        }
+        if not self.allowed:
+            # A cost above the policy's whole budget can never pass, retrying after a full period is the best hint
+            retry_after_ms = self.retry_after_ms if self.retry_after_ms >= 0 else self.policy.period * 1000
+            headers['Retry-After'] = str(ceil(retry_after_ms / 1000))
+        return headers
+
+
+def record_result(request: Request, result: RateLimitResult):
+    """Keep the most restrictive result of the request in request.state.rate_limit for the response headers."""
+    current: Optional[RateLimitResult] = getattr(request.state, 'rate_limit', None)
+    if current is None or (current.allowed and not result.allowed) or (current.allowed == result.allowed and result.remaining < current.remaining):
+        request.state.rate_limit = result
+
+
+class LocalBudget:
+    """What a worker may still admit for one key on its own, from the last Redis result."""
+    def __init__(self, policy: RateLimitPolicy, result: RateLimitResult, allowance: int, synced_at: float, expires_at: float):
+        self.policy = policy
+        self.result = result
+        self.allowance = allowance
+        self.pending = 0
+        self.synced_at = synced_at
+        self.expires_at = expires_at
+
+
+class LocalTier:
+    def __init__(self, batch_size: int, fraction: float, sync_ms: int):
+        self.batch_size = batch_size
+        self.fraction = fraction
+        self.sync_seconds = sync_ms / 1000
+        self.budgets: Dict[str, LocalBudget] = {}
+        self.local_hits = 0
+        self.syncs = 0
+
+    def admit(self, key: str, cost: int, now: float) -> Optional[RateLimitResult]:
+        """A local decision, None when the request has to go to Redis."""
+        budget = self.budgets.get(key)
+        if budget is None or now >= budget.expires_at:
+            return None
+        if not budget.result.allowed:
+            # Denied until the next sync window, retrying Redis sooner cannot change the answer much
+            self.local_hits += 1
+            return budget.result
+        if budget.pending + cost > budget.allowance:
+            return None
+        budget.pending += cost
+        self.local_hits += 1
+        result = budget.result
+        return RateLimitResult(
+            budget.policy, True, max(result.remaining - budget.pending, 0), 0,
+            result.reset_after_ms + ceil(budget.pending * budget.policy.emission_ms),
+        )
+
+    def take_pending(self, key: str) -> int:
+        """Usage to report with the next script call, the budget is spent until that call's result comes back."""
+        budget = self.budgets.get(key)
+        if budget is None:
+            return 0
+        pending, budget.pending, budget.allowance = budget.pending, 0, 0
+        return pending
+
+    def restore_pending(self, key: str, pending: int):
+        budget = self.budgets.get(key)
+        if budget is not None:
+            budget.pending += pending
+
+    def update(self, key: str, policy: RateLimitPolicy, result: RateLimitResult, now: float):
+        self.syncs += 1
+        allowance = min(self.batch_size, floor(result.remaining * self.fraction)) if result.allowed else 0
+        budget = self.budgets.get(key)
+        pending = budget.pending if budget is not None else 0
+        self.budgets[key] = LocalBudget(policy, result, allowance, now, now + self.sync_seconds)
+        # Requests admitted locally while the script call was in flight
+        self.budgets[key].pending = pending
+
+    def due(self, now: float) -> List[Tuple[str, LocalBudget]]:
+        """Budgets whose window is over, the ones with unreported usage are returned, idle ones dropped."""
+        due = []
+        for key, budget in list(self.budgets.items()):
+            if now < budget.expires_at:
+                continue
+            if budget.pending:
+                due.append((key, budget))
+            else:
+                del self.budgets[key]
+        return due
+
+    def stats(self) -> dict:
+        return {'keys': len(self.budgets), 'local_hits': self.local_hits, 'syncs': self.syncs}
+
 
 class RateLimiter:
-    def __init__(self, redis: RedisClient, rate_limit=RATE_LIMIT, expiry=RATE_LIMIT_TIME_WINDOW):
-        self.redis = redis
-        self.rate_limit = rate_limit
-        self.expiry = expiry
-
-    @classmethod
-    async def create(cls, redis_client=None):
-        redis_client = redis_client or RedisClient()
-        redis = await redis_client.connect()
-        return cls(redis)
-    
-    async def is_rate_limited(self, ip: str):
-        current_time = int(time())
-        async with self.redis.pipeline() as pipe:
-            key = f'rate-limit:{ip}'
-            pipe.zadd(key, {str(current_time): current_time})
-            pipe.zremrangebyscore(key, 0, current_time - self.expiry)
-            pipe.zcard(key)
-            pipe.expire(key, self.expiry)
-            _, _, request_count, _ = await pipe.execute()
-            
-            if request_count > self.rate_limit:
-                return True
-            return False
+    """
+    Created once per app, its RedisClient borrows connections from the shared pool on every check.
+    With a LocalTier most checks are answered in process, see the module docstring for the accuracy bound.
+    """
+    def __init__(self, redis_client: RedisClient = None, local_tier: Optional[LocalTier] = None):
+        self.redis_client = redis_client or RedisClient()
+        self.local = local_tier
+        self._script = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flushed_at = 0.0
+
+    async def _get_script(self):
+        redis = await self.redis_client.connect()
+        if self._script is None or self._script.registered_client is not redis:
+            # Script runs as EVALSHA, loading the source once per Redis server on NOSCRIPT
+            self._script = redis.register_script(GCRA_SCRIPT)
+        return redis, self._script
+
+    async def hit(self, key: str, policy: RateLimitPolicy, cost: int = 1, pending: int = 0) -> RateLimitResult:
+        _, script = await self._get_script()
+        # Checks of concurrent requests share a pipeline when the client auto batches
+        allowed, remaining, retry_after_ms, reset_after_ms = await self.redis_client.run_script(
+            script, keys=[key], args=[policy.emission_ms, policy.limit, cost, pending]
+        )
+        return RateLimitResult(policy, bool(allowed), int(remaining), int(retry_after_ms), int(reset_after_ms))
+
+    async def consume(self, key: str, policy: RateLimitPolicy, cost: int = 1) -> RateLimitResult:
+        if self.local is None:
+            return await self.hit(key, policy, cost)
+
+        now = monotonic()
+        result = self.local.admit(key, cost, now)
+        if result is None:
+            pending = self.local.take_pending(key)
+            try:
+                result = await self.hit(key, policy, cost, pending)
+            except Exception:
+                self.local.restore_pending(key, pending)
+                raise
+            self.local.update(key, policy, result, monotonic())
+        self._schedule_flush(now)
+        return result
+
+    def _schedule_flush(self, now: float):
+        if now - self._flushed_at < self.local.sync_seconds or (self._flush_task and not self._flush_task.done()):
+            return
+        self._flushed_at = now
+        self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Report the usage of keys that saw no Redis call during their window, in one pipeline."""
+        due = self.local.due(monotonic())
+        if not due:
+            return
+        pending = [self.local.take_pending(key) for key, _ in due]
+        try:
+            _, script = await self._get_script()
+            async with self.redis_client.pipeline() as pipe:
+                for (key, budget), used in zip(due, pending):
+                    await script(keys=[key], args=[budget.policy.emission_ms, budget.policy.limit, 0, used], client=pipe)
+                responses = await pipe.execute()
+        except Exception as e:
+            for (key, _), used in zip(due, pending):
+                self.local.restore_pending(key, used)
+            logger.warning(f'Rate limit usage flush failed: {e}')
+            return
+        now = monotonic()
+        for (key, budget), (_, remaining, retry_after_ms, reset_after_ms) in zip(due, responses):
+            # A zero cost check, what is left of the bucket decides the next allowance
+            result = RateLimitResult(budget.policy, int(remaining) > 0, int(remaining), int(retry_after_ms), int(reset_after_ms))
+            self.local.update(key, budget.policy, result, now)
+
+    async def check(self, request: Request, policy: RateLimitPolicy, cost: int = 1) -> Optional[RateLimitResult]:
+        """Consume cost tokens of policy for the request's identity, None when Redis is unavailable (fail open)."""
+        try:
+            result = await self.consume(policy.key(request), policy, cost)
+        except Exception as e:
+            logger.warning(f'Rate limit check "{policy.name}" skipped: {e}')
+            return None
+        record_result(request, result)
+        return result
+
+
+DEFAULT_POLICY = RateLimitPolicy('ip', RATE_LIMIT, RATE_LIMIT_TIME_WINDOW, scope='ip')
+# Per signed-in user budget the heavier routes draw from with their cost
+USER_POLICY = RateLimitPolicy('user', 300, 60, scope='user')
+
+local_tier = LocalTier(Config.RATE_LIMIT_LOCAL_BATCH, Config.RATE_LIMIT_LOCAL_FRACTION, Config.RATE_LIMIT_SYNC_MS) if Config.RATE_LIMIT_LOCAL_BATCH > 0 else None
+rate_limiter = RateLimiter(RedisClient(auto_batch=Config.REDIS_AUTO_BATCH), local_tier=local_tier)
+
+
+class RateLimit:
+    """
+    Route dependency, e.g. (RateLimit(USER_POLICY, cost=10), ['/export']) in a route class' middlewares.
+    cost is a number of tokens or a callable returning it for the request.
+    """
+    def __init__(self, policy: RateLimitPolicy, cost: Union[int, Callable[[Request], int]] = 1, limiter: RateLimiter = None):
+        self.policy = policy
+        self.cost = cost
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, request: Request):
+        cost = self.cost(request) if callable(self.cost) else self.cost
+        result = await self.limiter.check(request, self.policy, cost)
+        if result is not None and not result.allowed:
+            raise HTTPException(status_code=429, detail='Too Many Requests', headers=result.headers())
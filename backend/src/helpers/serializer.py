@@ -1,5 +1,6 @@
-from typing import List, Type, TypeVar, Union
-from pydantic import BaseModel
+from functools import lru_cache
+from typing import List, Optional, Tuple, Type, TypeVar, Union
+from pydantic import BaseModel, create_model
 
 from src.helpers.paginator import Paginator, CursorPaginator
 from src.utils import encode_cursor
@@ -31,3 +32,43 @@ def serialize_model(data: Union[dict, List[dict]], model_type: Type[T]) -> Union
         return [model_type.model_validate(each) for each in data]
     
     return model_type.model_validate(data)
+
+
+def projection_columns(model_type: Type[BaseModel]) -> List[str]:
+    """
+    Attribute names the response model reads, i.e. the columns a list query has to load for it.
+    Pass them as the repository "columns" projection so unused columns (e.g. TEXT bodies) are never fetched.
+    """
+    columns = []
+    for name, field in model_type.model_fields.items():
+        alias = field.validation_alias if isinstance(field.validation_alias, str) else None
+        columns.append(alias or name)
+    return columns
+
+
+@lru_cache(maxsize=128)
+def _partial_model(model_type: Type[T], fields: Tuple[str, ...]) -> Type[T]:
+    field_definitions = {
+        name: (field.annotation, field)
+        for name, field in model_type.model_fields.items()
+        if name in fields
+    }
+    return create_model(
+        f'{model_type.__name__}Partial',
+        __config__=model_type.model_config,
+        **field_definitions,
+    )
+
+
+def partial_model(model_type: Type[T], fields: Optional[str] = None, required: Tuple[str, ...] = ('id',)) -> Type[T]:
+    """
+    The response model narrowed to a sparse fieldset, e.g. fields="title,status,priority".
+    Unknown names are ignored, required fields are always kept and no fieldset returns the model unchanged.
+    """
+    if not fields:
+        return model_type
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    selected = tuple(name for name in model_type.model_fields if name in requested or name in required)
+    if len(selected) == len(model_type.model_fields):
+        return model_type
+    return _partial_model(model_type, selected)
@@ -9,6 +9,8 @@ from src.middlewares import register_global_middlewares
 from src.helpers.router import register_route_middlewares
 from src.routes import routes
 from src.db.core import sessionmanager
+from src.db.redis import redismanager, token_blocklist
+from src.modules.auth.utils import password_hasher
 
 
 def load_config(path='settings.yml'):
@@ -33,6 +35,9 @@ async def lifespan(app: FastAPI):
     try:
         await sessionmanager.initialize()
         logger.info('Database session manager initialized')
+        await redismanager.initialize()
+        logger.info('Redis connection pool initialized')
+        await token_blocklist.start()
         logger.info('Server startup complete!')
         yield
     finally:
@@ -42,6 +47,9 @@ async def lifespan(app: FastAPI):
             logger.info('All database connections closed')
         except Exception as e:
             logger.error(f'Error during shutdown: {e}')
+        await token_blocklist.stop()
+        await redismanager.close()
+        password_hasher.close()
         
         logger.info('Server shutdown complete!')
 
@@ -1,4 +1,5 @@
 import time
+import hashlib
 import logging
 
 from fastapi import FastAPI, HTTPException, Header
@@ -7,8 +8,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from src.db.core import sessionmanager
+from src.db.instrumentation import install as install_query_instrumentation, track_queries
 from src.helpers.response import ApiResponser
-from src.helpers.ratelimiter import RateLimiter
+from src.helpers.ratelimiter import rate_limiter as limiter, DEFAULT_POLICY
 from src.config import Config
 
 logger = logging.getLogger('uvicorn.access')
@@ -16,27 +18,32 @@ logger.disabled = True
 
 logger = logging.getLogger(__name__)
 
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+SLOW_QUERY_MS = 500
+
+
+def db_client_key(request: Request) -> str:
+    """Identity used for the read-your-writes window, the bearer token when present, the client address otherwise."""
+    identity = request.headers.get('authorization') or (request.client.host if request.client else '')
+    return hashlib.sha256(identity.encode()).hexdigest()
+
 
 def register_global_middlewares(app: FastAPI):
     """Register global middlewares."""
+    install_query_instrumentation()
     
-    @app.middleware('http')
-    async def custom_logging(request: Request, call_next):
-        start_time = time.time()
-        response = await call_next(request)
-        processing_time = time.time() - start_time
-        message = f'{request.client.host}:{request.client.port} - {request.method} - {request.url.path} - {response.status_code} completed after {processing_time}s'
-        logger.info(message)
-        return response
-
     @app.middleware('http')
     async def rate_limiter(request: Request, call_next):
-        rate_limiter = await RateLimiter.create()
-        client_ip = request.client.host
-        if await rate_limiter.is_rate_limited(client_ip):
-            return ApiResponser.error_response(message='Too Many Requests', status_code=429)
+        # Route level RateLimit dependencies record their result in request.state.rate_limit too
+        result = await limiter.check(request, DEFAULT_POLICY)
+        if result is not None and not result.allowed:
+            response = ApiResponser.error_response(message='Too Many Requests', status_code=429)
+        else:
+            response = await call_next(request)
 
-        response = await call_next(request)
+        result = getattr(request.state, 'rate_limit', None)
+        if result is not None:
+            response.headers.update(result.headers())
         return response
     
     @app.middleware('http')
@@ -48,29 +55,39 @@ def register_global_middlewares(app: FastAPI):
             if request.url.path in excluded_routes:
                 return await call_next(request)
 
-            db_session = await sessionmanager.get_session()
+            # The session is only created when a handler first uses request.state.db
+            # Safe methods read from a replica unless the client wrote within the read-your-writes window
+            # (no window to look up when there is no replica to read from)
+            client_key = db_client_key(request)
+            use_replica = (
+                request.method in SAFE_METHODS
+                and sessionmanager.router is not None
+                and not await sessionmanager.pins.is_pinned(client_key)
+            )
+            db_session = sessionmanager.lazy_session(use_replica)
 
             request.state.db = db_session
             
             response = await call_next(request)
             
-            if response.status_code < 400:
-                await db_session.commit()
-            else:
-                await db_session.rollback()
+            outcome = await db_session.finish(response.status_code < 400)
+            if db_session.wrote and sessionmanager.router is not None:
+                await sessionmanager.pins.pin(client_key)
+            sessionmanager.metrics.record(outcome, db_session.connected)
+            logger.debug(f'Database session {outcome}, connection used: {db_session.connected}')
                 
             return response
         except HTTPException as e:
             if db_session is not None:
                 try:
-                    await db_session.rollback()
+                    await db_session.finish(False)
                 except Exception as rollback_error:
                     logger.error(f'Error during rollback: {rollback_error}')
             return ApiResponser.error_response(message=e.detail, status_code=e.status_code)
         except Exception as e:
             if db_session is not None:
                 try:
-                    await db_session.rollback()
+                    await db_session.finish(False)
                 except Exception as rollback_error:
                     logger.error(f'Error during rollback: {rollback_error}')
             logger.error(f'Database middleware error: {str(e)}', exc_info=True)
@@ -86,6 +103,22 @@ def register_global_middlewares(app: FastAPI):
             if hasattr(request.state, 'db'):
                 delattr(request.state, 'db')
 
+    # Registered last so it is the outermost middleware and its timings include the session commit
+    @app.middleware('http')
+    async def custom_logging(request: Request, call_next):
+        start_time = time.time()
+        with track_queries() as query_stats:
+            response = await call_next(request)
+        processing_time = time.time() - start_time
+        response.headers['Server-Timing'] = query_stats.server_timing(processing_time * 1000)
+        message = f'{request.client.host}:{request.client.port} - {request.method} - {request.url.path} - {response.status_code} completed after {processing_time}s - {query_stats.summary()}'
+        logger.info(message)
+        for statement, times in query_stats.repeated():
+            logger.warning(f'Possible N+1 in {request.method} {request.url.path}: executed {times} times: {statement}')
+        if query_stats.slowest_statement and query_stats.slowest_ms >= SLOW_QUERY_MS:
+            logger.warning(f'Slow query in {request.method} {request.url.path} ({query_stats.slowest_ms:.1f}ms): {query_stats.slowest_statement}')
+        return response
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=Config.cors_allowed_origins,
@@ -7,6 +7,8 @@ from decimal import Decimal
 
 
 class Base(DeclarativeBase):
+    # Fetch server generated values with the INSERT/UPDATE (RETURNING where supported) instead of a refresh later
+    __mapper_args__ = {'eager_defaults': True}
 
     def as_dict(self, included: List[str] = [], excluded: List[str] = []):
         result = {}
@@ -0,0 +1,49 @@
+"""context.py
+
+Request scoped authentication state.
+
+The bearer scheme verifies the token once and stores an AuthContext in request.state.auth,
+every later dependency (get_current_user, RoleChecker, rate limit policies, ...) reads it from there
+instead of decoding the token again, and the principal is loaded from the database at most once per request.
+"""
+
+from typing import Optional
+
+from fastapi import Request
+
+
+class AuthContext:
+    def __init__(self, token: str, claims: dict):
+        self.token = token
+        self.claims = claims
+        self._user = None
+        self._user_loaded = False
+
+    @property
+    def user_claims(self) -> dict:
+        return self.claims.get('user') or {}
+
+    @property
+    def user_id(self):
+        return self.user_claims.get('user_id')
+
+    @property
+    def email(self) -> Optional[str]:
+        return self.user_claims.get('email')
+
+    @property
+    def role(self) -> Optional[str]:
+        """Role signed into the token, None for tokens issued before roles were."""
+        return self.user_claims.get('role')
+
+    async def get_user(self, db_session):
+        """The token's user, loaded on first use."""
+        if not self._user_loaded:
+            from .dependencies import user_service
+            self._user = await user_service.get_user_by_email(db_session, self.email)
+            self._user_loaded = True
+        return self._user
+
+
+def get_auth_context(request: Request) -> Optional[AuthContext]:
+    return getattr(request.state, 'auth', None)
@@ -1,11 +1,12 @@
 from typing import Any, List
-from fastapi import Depends, Request
+from fastapi import Request
 
 from src.modules.user.models import User
 from .services import AuthService
 from .exceptions import (
     InsufficientPermission
 )
+from .context import get_auth_context
 from .schemes.bearer import AccessTokenBearer, RefreshTokenBearer
 from .handlers import AuthHandler
 
@@ -16,16 +17,26 @@ user_service = AuthService(User)
 
 
 async def get_current_user(request: Request, token_details: dict = access_token_handler):
-    user_email = token_details['user']['email']
-    user = await user_service.get_user_by_email(request.state.db, user_email)
-    return user
+    # The access token dependency left the verified token in the request's AuthContext
+    return await get_auth_context(request).get_user(request.state.db)
 
 
 class RoleChecker:
-    def __init__(self, allowed_roles: List[str]) -> None:
+    """
+    Allow the roles in allowed_roles.
+    With from_claims the role is read from the verified token, which the bearer scheme already checked
+    against the user's token version, so no query is made; tokens without a role claim fall back to the user row.
+    """
+    def __init__(self, allowed_roles: List[str], from_claims: bool = True) -> None:
         self.allowed_roles = allowed_roles
-
-    def __call__(self, current_user: User = Depends(get_current_user)) -> Any:
-        if current_user.role in self.allowed_roles:
+        self.from_claims = from_claims
+
+    async def __call__(self, request: Request, token_details: dict = access_token_handler) -> Any:
+        context = get_auth_context(request)
+        role = context.role if self.from_claims else None
+        if role is None:
+            current_user = await context.get_user(request.state.db)
+            role = current_user.role if current_user else None
+        if role in self.allowed_roles:
             return True
         raise InsufficientPermission()
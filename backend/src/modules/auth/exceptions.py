@@ -19,6 +19,12 @@ class AccessTokenRequired(AppException):
     pass
 
 
+class PasswordHasherBusy(AppException):
+    """Too many password checks in progress, try again shortly."""
+
+    pass
+
+
 class InsufficientPermission(AppException):
     """Insufficient permission."""
 
@@ -0,0 +1,98 @@
+"""hashing.py
+
+Password hashing off the event loop.
+
+bcrypt is deliberately slow (~250ms at cost 12) and would stall every other request of the worker while it runs,
+so PasswordHasher runs it in a bounded thread pool (bcrypt releases the GIL, threads hash in parallel).
+- At most PASSWORD_HASH_WORKERS hashes run at once, up to PASSWORD_HASH_QUEUE more callers wait for a slot,
+  past that PasswordHasherBusy is raised right away instead of letting the queue grow without bound.
+- Hashes made with another cost factor than PASSWORD_HASH_ROUNDS are reported by verify_and_update()
+  with their replacement, so logins move stored hashes to the current parameters.
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from .exceptions import PasswordHasherBusy
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasher:
+    def __init__(self, context: CryptContext, workers: int, queue_size: int):
+        self.context = context
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = asyncio.Semaphore(self.workers)
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        return self._executor
+
+    async def _run(self, fn: Callable, *args):
+        if self._slots.locked() and self.waiting >= self.queue_size:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        loop = asyncio.get_running_loop()
+        self.running += 1
+
+        def release(_):
+            # Only once the thread is done, a cancelled caller does not free a slot that is still hashing
+            def done():
+                self.running -= 1
+                self.completed += 1
+                self._slots.release()
+            loop.call_soon_threadsafe(done)
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self.running -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hash: str) -> bool:
+        return await self._run(self.context.verify, password, hash)
+
+    async def verify_and_update(self, password: str, hash: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new_hash), new_hash is set when the password is valid but hash was made with other parameters."""
+        return await self._run(self.context.verify_and_update, password, hash)
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'running': self.running,
+            'waiting': self.waiting,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        # A fresh semaphore for the next event loop (app restarts, tests)
+        self._slots = asyncio.Semaphore(self.workers)
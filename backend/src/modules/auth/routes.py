@@ -4,13 +4,15 @@ from fastapi import APIRouter, Depends, Request
 
 from src.helpers.response import ApiResponser
 from src.helpers.router import route_method, register_routers
+from src.helpers.ratelimiter import RateLimit, RateLimitPolicy
 from src.helpers.serializer import serialize_model
-from src.db.redis import TokenBlocklist
+from src.db.redis import token_blocklist
 from src.modules.auth import schemas
 from src.modules.user.models import User
 
 from .exceptions import (
     InvalidToken,
+    PasswordHasherBusy,
 )
 from .services import AuthService
 from .utils import (
@@ -27,6 +29,15 @@ logger = logging.getLogger(__name__)
 ACCESS_TOKEN_EXPIRY_MIN = 60
 REFRESH_TOKEN_EXPIRY_DAY = 7
 
+# Credential endpoints get a tight per-ip budget of their own against password guessing
+AUTH_POLICY = RateLimitPolicy('auth', 10, 60, scope='ip')
+
+
+def hasher_busy_response(e: PasswordHasherBusy) -> ApiResponser:
+    response = ApiResponser.error_response(str(e), 503)
+    response.headers['Retry-After'] = '1'
+    return response
+
 
 class AuthRoute:
     def __init__(self):
@@ -35,8 +46,9 @@ class AuthRoute:
         register_routers(self.router, self)
         self.middlewares = [
             (access_token_handler, ['/profile', '/logout']),
+            (RateLimit(AUTH_POLICY), ['/signup', '/login']),
         ]
-        self.token_blocklist = TokenBlocklist()
+        self.token_blocklist = token_blocklist
 
     @property
     def base(self):
@@ -65,6 +77,8 @@ class AuthRoute:
             new_user = await self.service.signup(db_session, user_data)
             new_user = serialize_model(new_user, schemas.SignupResponseModel)
             return ApiResponser.success_response(data=new_user)
+        except PasswordHasherBusy as e:
+            return hasher_busy_response(e)
         except Exception as e:
             logger.error(str(e))
             return ApiResponser.error_response('Something went wrong!', 500)
@@ -77,6 +91,8 @@ class AuthRoute:
             if user:
                 return ApiResponser.success_response(user)
             return ApiResponser.error_response('Invalid Email or Password', 403)
+        except PasswordHasherBusy as e:
+            return hasher_busy_response(e)
         except Exception as e:
             logger.error(str(e))
             return ApiResponser.error_response('Something went wrong!', 500)
@@ -84,7 +100,7 @@ class AuthRoute:
     @route_method(methods=['GET'], route_path='/logout')
     async def logout(self, token_details: dict = access_token_handler):
         jti = token_details['jti']
-        await self.token_blocklist.block_token(jti)
+        await self.token_blocklist.block_token(jti, token_details['exp'])
         return ApiResponser.success_response(message='Logged Out Successfully')
     
     @route_method(methods=['GET'], route_path='/refresh_token')
@@ -1,11 +1,12 @@
 from fastapi import Request, HTTPException
 
-from src.db.redis import TokenBlocklist
+from src.db.redis import token_blocklist
 from ..exceptions import (
     InvalidToken,
     RefreshTokenRequired,
     AccessTokenRequired,
 )
+from ..context import AuthContext, get_auth_context
 from ..utils import decode_jwt_token
 from .base import Auth, HTTPAuthorizationCredentials
 
@@ -13,7 +14,7 @@ from .base import Auth, HTTPAuthorizationCredentials
 class BearerTokenAuth(Auth.scheme('bearer')):
     def __init__(self, auto_error=False):
         super().__init__(auto_error=auto_error)
-        self.token_blocklist = TokenBlocklist()
+        self.token_blocklist = token_blocklist
 
     async def __call__(self, request: Request) -> HTTPAuthorizationCredentials | None:
         creds = await super().__call__(request)
@@ -29,35 +30,38 @@ class BearerTokenAuth(Auth.scheme('bearer')):
                 )
             token = authorization.split('Bearer ')[1]
 
-        if not self._token_valid(token):
+        # Another bearer dependency of this request already verified the token
+        context = get_auth_context(request)
+        if context is not None and context.token == token:
+            self.authenticate(context.claims)
+            return context.claims
+
+        token_data = decode_jwt_token(token)
+        if token_data is None:
             raise InvalidToken()
-        
-        token_data = await self.authenticate(token)
+        self.authenticate(token_data)
         
         if await self.token_blocklist.is_token_blocked(token_data['jti']):
             raise InvalidToken()
+        # Issued before the user's role changed (or the user was deleted), its claims no longer hold
+        if await self.token_blocklist.is_token_stale(token_data):
+            raise InvalidToken()
         
+        request.state.auth = AuthContext(token, token_data)
         return token_data
 
-    def _token_valid(self, token: str) -> bool:
-        token_data = decode_jwt_token(token)
-        return token_data is not None
-
-    async def authenticate(self, token):
+    def authenticate(self, token_data: dict):
+        """Check the decoded token is the kind this scheme accepts."""
         raise NotImplementedError('Please Override this method in child classes')
 
 
 class AccessTokenBearer(BearerTokenAuth):
-    async def authenticate(self, token):
-        token_data = decode_jwt_token(token)
-        if token_data and token_data.get('refresh'):
+    def authenticate(self, token_data: dict):
+        if token_data.get('refresh'):
             raise AccessTokenRequired('Access token required, not refresh token.')
-        return token_data
 
 
 class RefreshTokenBearer(BearerTokenAuth):
-    async def authenticate(self, token):
-        token_data = decode_jwt_token(token)
-        if token_data and not token_data.get('refresh'):
+    def authenticate(self, token_data: dict):
+        if not token_data.get('refresh'):
             raise RefreshTokenRequired('Refresh token required, not access token.')
-        return token_data
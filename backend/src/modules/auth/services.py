@@ -2,9 +2,11 @@ import logging
 from datetime import timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.db.redis import token_blocklist
 from src.modules.user.repositories import UserRepository
 from . import schemas
-from .utils import create_jwt_token
+from .exceptions import PasswordHasherBusy
+from .utils import create_jwt_token, hash_password, password_hasher
 
 logger = logging.getLogger(__name__)
 
@@ -19,8 +21,19 @@ class AuthService:
     async def authenticate(self, db_session: AsyncSession, email: str, password: str):
         try:
             user = await self.get_user_by_email(db_session, email, load_sensitive=True)
-            if user and user.verify_password(password):
-                user_data = {'email': user.email, 'user_id': str(user.id)}
+            if not user:
+                return None
+            valid, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+            if valid:
+                if new_hash:
+                    await self._rehash(db_session, user, new_hash)
+                # role and token version are signed into the tokens, RoleChecker authorizes from them alone
+                user_data = {
+                    'email': user.email,
+                    'user_id': str(user.id),
+                    'role': user.role,
+                    'ver': await token_blocklist.user_version(user.id),
+                }
                 access_token = create_jwt_token(user_data=user_data, expiry=timedelta(minutes=ACCESS_TOKEN_EXPIRY_MIN))
                 refresh_token = create_jwt_token(user_data=user_data, expiry=timedelta(days=REFRESH_TOKEN_EXPIRY_DAY), refresh=True)
                 
@@ -32,15 +45,27 @@ class AuthService:
                     'role': user.role
                 }
             return None
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             logger.error(str(e))
             raise Exception(str(e))
+
+    async def _rehash(self, db_session: AsyncSession, user, new_hash: str):
+        """Store the hash made with the current parameters, the login goes through even if this fails."""
+        try:
+            await self.user_repository.update(db_session, user.id, {'password_hash': new_hash})
+        except Exception as e:
+            logger.error(f'Failed to re-hash the password of user {user.id}: {e}')
     
     async def signup(self, db_session: AsyncSession, user_data: schemas.SingupModel):
         try:
             user_data_dict = user_data.model_dump()
+            user_data_dict['password_hash'] = await hash_password(user_data_dict.pop('password'))
             new_user = await self.user_repository.create(db_session, user_data_dict)
             return new_user
+        except PasswordHasherBusy:
+            raise
         except Exception as e:
             logger.error(str(e))
             await db_session.rollback()
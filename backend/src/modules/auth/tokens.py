@@ -0,0 +1,89 @@
+"""tokens.py
+
+JWT key material and the verified token cache.
+
+- JWTKeys parses JWT_SECRET (and JWT_PUBLIC_KEY) once for the configured algorithm, so signing and
+  verification get ready key objects instead of a PEM string to parse on every call.
+  For RS*/ES*/PS*/EdDSA, JWT_SECRET holds the PEM private key, the public key is derived from it
+  unless JWT_PUBLIC_KEY is set.
+- VerifiedTokenCache keeps the claims of tokens whose signature was already verified, in a bounded LRU
+  keyed by the SHA-256 digest of the token, until the token's exp. Clients reuse an access token for its
+  whole lifetime, so most requests skip the signature check and claim parsing.
+  Revocation is not cached here: the bearer scheme checks the blocklist and token version on every request.
+"""
+
+import hashlib
+from time import time
+from typing import Optional
+
+import jwt
+from cachetools import LRUCache
+
+
+def _pem(value: str) -> str:
+    # PEM keys in .env files are usually written on one line with \n escapes
+    return value.replace('\\n', '\n')
+
+
+class JWTKeys:
+    def __init__(self, algorithm: str, secret: str, public_key: Optional[str] = None):
+        self.algorithm = algorithm
+        algorithm_obj = jwt.get_algorithm_by_name(algorithm)
+        self.signing_key = algorithm_obj.prepare_key(_pem(secret))
+        if public_key:
+            self.verifying_key = algorithm_obj.prepare_key(_pem(public_key))
+        elif hasattr(self.signing_key, 'public_key'):
+            # Asymmetric private key, HMAC secrets are plain bytes
+            self.verifying_key = self.signing_key.public_key()
+        else:
+            self.verifying_key = self.signing_key
+
+
+class VerifiedTokenCache:
+    """Claims of verified tokens by token digest, the returned dicts are shared and must not be modified."""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = LRUCache(maxsize=max(1, maxsize))
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        if not self.maxsize:
+            return None
+        key = self._key(token)
+        claims = self._entries.get(key)
+        if claims is None:
+            self.misses += 1
+            return None
+        exp = claims.get('exp')
+        if exp is not None and exp <= time():
+            # Expired since it was verified, jwt.decode would reject it now
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return claims
+
+    def set(self, token: str, claims: dict):
+        if self.maxsize:
+            self._entries[self._key(token)] = claims
+
+    def discard(self, token: str):
+        self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'maxsize': self.maxsize,
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -5,12 +5,24 @@ from datetime import datetime, timedelta
 from passlib.context import CryptContext
 
 from src.config import Config
+from .hashing import PasswordHasher
+from .tokens import JWTKeys, VerifiedTokenCache
 
+# Hashes with any other cost factor are flagged for re-hashing, see PasswordHasher.verify_and_update()
 passwd_context = CryptContext(
     schemes=['bcrypt'],
-    deprecated='auto'
+    deprecated='auto',
+    bcrypt__default_rounds=Config.PASSWORD_HASH_ROUNDS,
+    bcrypt__min_rounds=Config.PASSWORD_HASH_ROUNDS,
+    bcrypt__max_rounds=Config.PASSWORD_HASH_ROUNDS,
 )
 
+password_hasher = PasswordHasher(passwd_context, Config.PASSWORD_HASH_WORKERS, Config.PASSWORD_HASH_QUEUE)
+
+# Parsed once at import, a malformed key fails at startup rather than on the first request
+jwt_keys = JWTKeys(Config.JWT_ALGORITHM, Config.JWT_SECRET, Config.JWT_PUBLIC_KEY)
+verified_tokens = VerifiedTokenCache(Config.JWT_VERIFIED_CACHE_SIZE)
+
 
 def generate_password_hash(password: str) -> str:
     hash = passwd_context.hash(password.encode('utf8'))
@@ -21,6 +33,11 @@ def verify_password(password: str, hash: str) -> bool:
     return passwd_context.verify(password, hash)
 
 
+async def hash_password(password: str) -> str:
+    """generate_password_hash() without blocking the event loop."""
+    return await password_hasher.hash(password)
+
+
 def create_jwt_token(user_data: dict, expiry: timedelta = None, refresh: bool = False) -> str:
     payload = {
         'user': user_data,
@@ -29,14 +46,19 @@ def create_jwt_token(user_data: dict, expiry: timedelta = None, refresh: bool =
         'refresh': refresh,
     }
     token = jwt.encode(
-        payload=payload, key=Config.JWT_SECRET, algorithm=Config.JWT_ALGORITHM
+        payload=payload, key=jwt_keys.signing_key, algorithm=jwt_keys.algorithm
     )
     return token
 
 
 def decode_jwt_token(token: str) -> dict:
+    """Verified claims of token or None, served from the verified token cache while the token is unexpired."""
+    token_data = verified_tokens.get(token)
+    if token_data is not None:
+        return token_data
     try:        
-        token_data = jwt.decode(jwt=token, key=Config.JWT_SECRET, algorithms=[Config.JWT_ALGORITHM])
+        token_data = jwt.decode(jwt=token, key=jwt_keys.verifying_key, algorithms=[jwt_keys.algorithm])
+        verified_tokens.set(token, token_data)
         return token_data
     except jwt.PyJWTError as jwte:
         logging.exception(jwte)
@@ -0,0 +1,66 @@
+import logging
+from fastapi import APIRouter, Request
+
+from src.db.core import sessionmanager
+from src.db.redis import redismanager, token_blocklist
+from src.helpers.ratelimiter import local_tier, rate_limiter
+from src.helpers.response import ApiResponser
+from src.helpers.router import route_method, register_routers
+
+from src.modules.auth.dependencies import RoleChecker
+from src.modules.auth.utils import password_hasher, verified_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class SystemRoute:
+    def __init__(self):
+        self.router = APIRouter()
+        register_routers(self.router, self)
+        self.middlewares = [
+            (RoleChecker(['ADMIN']), ['*']),
+        ]
+
+    @property
+    def base(self):
+        return {
+            'router' : self.router,
+            'prefix' : 'system',
+            'middlewares' : self.middlewares
+        }
+
+    @route_method(methods=['GET'], route_path='/db')
+    async def db(self, request: Request):
+        """Connection pool, replica and request session statistics of this worker."""
+        try:
+            return ApiResponser.success_response(data=sessionmanager.stats())
+        except Exception as e:
+            logger.error(str(e))
+            return ApiResponser.error_response('Something went wrong', 500)
+
+    @route_method(methods=['GET'], route_path='/redis')
+    async def redis(self, request: Request):
+        """Shared Redis connection pool usage, local rate limit tier and auto batching of this worker."""
+        try:
+            data = {
+                'pool': redismanager.stats(),
+                'rate_limit_local': local_tier.stats() if local_tier else None,
+                'auto_batch': {
+                    'rate_limiter': rate_limiter.redis_client.batch_stats,
+                    'token_blocklist': token_blocklist.redis_client.batch_stats,
+                },
+            }
+            return ApiResponser.success_response(data=data)
+        except Exception as e:
+            logger.error(str(e))
+            return ApiResponser.error_response('Something went wrong', 500)
+
+    @route_method(methods=['GET'], route_path='/auth')
+    async def auth(self, request: Request):
+        """Verified token cache and password hashing pool of this worker."""
+        try:
+            data = {'verified_tokens': verified_tokens.stats(), 'password_hasher': password_hasher.stats()}
+            return ApiResponser.success_response(data=data)
+        except Exception as e:
+            logger.error(str(e))
+            return ApiResponser.error_response('Something went wrong', 500)
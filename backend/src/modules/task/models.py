@@ -6,7 +6,8 @@ from sqlalchemy import (
     Text,
     ForeignKey,
     TIMESTAMP,
-    BigInteger
+    BigInteger,
+    Index
 )
 from sqlalchemy.orm import relationship, deferred
 
@@ -18,6 +19,16 @@ TaskPriority = Enum('LOW', 'MEDIUM', 'HIGH', name='task_priority')
 
 class Task(Base):
     __tablename__ = 'tasks'
+    # Mirrors src/db/migrations/0004_list_indexes.sql, one index per hot list query shape
+    __table_args__ = (
+        Index('idx_tasks_active', 'deleted_at', 'id'),
+        Index('idx_tasks_active_created', 'deleted_at', 'created_at', 'id'),
+        Index('idx_tasks_active_due', 'deleted_at', 'due_date', 'id'),
+        Index('idx_tasks_status_active', 'status', 'deleted_at', 'id'),
+        Index('idx_tasks_priority_active', 'priority', 'deleted_at', 'id'),
+        Index('idx_tasks_assignee_active', 'assignee_id', 'deleted_at', 'id'),
+        Index('idx_tasks_assignee_active_due', 'assignee_id', 'deleted_at', 'due_date', 'id'),
+    )
 
     id = Column(BigInteger, primary_key=True, nullable=False, autoincrement=True)
     title = Column(String(255), nullable=False)
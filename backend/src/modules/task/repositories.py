@@ -1,6 +1,10 @@
+from src.config import Config
 from src.repositories import BaseRepository
+from src.repositories.search import FullTextSearchBackend
 
 
 class TaskRepository(BaseRepository):
+    entity_cache_ttl = 60
+
     def __init__(self, model):
-        super().__init__(model)
+        super().__init__(model, search_backend=FullTextSearchBackend(mode=Config.SEARCH_MODE))
@@ -1,15 +1,17 @@
 import logging
-from typing import Union, Optional
+from typing import Literal, Union, Optional
 from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from src.schemas import PaginationParams, CursorPaginationParams
 from src.exceptions import ValidationException
 from src.utils import encode_cursor, decode_cursor
 
-from src.helpers.serializer import serialize_model
+from src.helpers.serializer import serialize_model, partial_model, projection_columns
 from src.helpers.response import ApiResponser
 from src.helpers.router import route_method, register_routers
+from src.helpers.ratelimiter import RateLimit, USER_POLICY
 
 from src.modules.auth.dependencies import (
     RoleChecker,
@@ -22,6 +24,14 @@ from . import schemas
 
 logger = logging.getLogger(__name__)
 
+# Tokens of USER_POLICY a request consumes, full-text searches and exports cost more than a plain page
+SEARCH_COST = 5
+EXPORT_COST = 20
+
+
+def list_cost(request: Request) -> int:
+    return SEARCH_COST if request.query_params.get('search') else 1
+
 
 class OtherParams(BaseModel):
     status: Optional[str] = None
@@ -36,7 +46,9 @@ class TaskRoute:
         register_routers(self.router, self)
         self.middlewares = [
             (access_token_handler, ['*']),
-            (RoleChecker(['ADMIN']), [('', 'POST'), ('/{id}', 'DELETE')]),
+            (RoleChecker(['ADMIN']), [('', 'POST'), ('/{id}', 'DELETE'), ('/bulk', 'POST'), ('/bulk', 'PATCH')]),
+            (RateLimit(USER_POLICY, cost=list_cost), [('', 'GET')]),
+            (RateLimit(USER_POLICY, cost=EXPORT_COST), ['/export']),
         ]
     
     @property
@@ -54,6 +66,8 @@ class TaskRoute:
             decoded_cursor = None
             if params.cursor:
                 decoded_cursor = decode_cursor(params.cursor)
+            # Only the columns the (optionally narrowed) response model reads are selected
+            response_model = partial_model(schemas.TaskResponseModel, params.fields)
             data = await self.service.paginateList(
                 db_session,
                 cursor=decoded_cursor,
@@ -62,14 +76,31 @@ class TaskRoute:
                 priority=other_params.priority,
                 assignee_id=other_params.assignee_id,
                 search=params.search,
-                sort=params.sort
+                sort=params.sort,
+                columns=projection_columns(response_model)
             )
-            data = serialize_model(data, schemas.TaskResponseModel)
+            data = serialize_model(data, response_model)
             return ApiResponser.success_response(data=data, paginated=True)
         except Exception as e:
             logger.error(str(e))
             return ApiResponser.error_response('Something went wrong', 500)
     
+    @route_method(methods=['GET'], route_path='/export')
+    async def export(self, request: Request, format: Literal['ndjson', 'csv'] = 'ndjson', other_params: OtherParams = Depends()):
+        try:
+            stream = self.service.export(
+                format,
+                status=other_params.status,
+                priority=other_params.priority,
+                assignee_id=other_params.assignee_id,
+            )
+            media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+            headers = {'Content-Disposition': f'attachment; filename="tasks.{format}"'}
+            return StreamingResponse(stream, media_type=media_type, headers=headers)
+        except Exception as e:
+            logger.error(str(e))
+            return ApiResponser.error_response('Something went wrong', 500)
+
     @route_method(methods=['GET'], route_path='/{id}', response_model=schemas.TaskResponseModel)
     async def find(self, request: Request, id: Union[int, str]) -> schemas.TaskResponseModel:
         try: 
@@ -97,6 +128,34 @@ class TaskRoute:
             logger.error(str(e))
             return ApiResponser.error_response('Something went wrong!', 500)
         
+    @route_method(methods=['POST'], route_path='/bulk', response_model=schemas.TaskBulkResponseModel)
+    async def bulk_create(self, request: Request, data: schemas.TaskBulkCreateModel, user = Depends(get_current_user)):
+        try:
+            db_session = request.state.db
+            count = await self.service.bulk_create(db_session, data, user)
+            result = serialize_model({'count': count}, schemas.TaskBulkResponseModel)
+            return ApiResponser.success_response(data=result)
+        except ValidationException as e:
+            logger.error(str(e))
+            raise e
+        except Exception as e:
+            logger.error(str(e))
+            return ApiResponser.error_response('Something went wrong!', 500)
+
+    @route_method(methods=['PATCH'], route_path='/bulk', response_model=schemas.TaskBulkResponseModel)
+    async def bulk_update(self, request: Request, data: schemas.TaskBulkUpdateModel):
+        try:
+            db_session = request.state.db
+            count = await self.service.bulk_update(db_session, data)
+            result = serialize_model({'count': count}, schemas.TaskBulkResponseModel)
+            return ApiResponser.success_response(data=result)
+        except ValidationException as e:
+            logger.error(str(e))
+            raise e
+        except Exception as e:
+            logger.error(str(e))
+            return ApiResponser.error_response('Something went wrong!', 500)
+        
     @route_method(methods=['PATCH'], route_path='/{id}', response_model=schemas.TaskResponseModel)
     async def update(self, request: Request, data: schemas.TaskUpdateModel, id: Union[int, str], user = Depends(get_current_user)):
         try:
@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import Optional, Union
-from pydantic import BaseModel, ConfigDict, field_validator
+from typing import List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 from src.schemas import CustomValidator
 from src.schemas import validate_foreign_exitence
@@ -106,3 +106,22 @@ class TaskUpdateModel(BaseModel):
             }
         },
     )
+
+
+BULK_MAX_TASKS = 1000
+
+
+class TaskBulkCreateModel(BaseModel):
+    tasks: List[TaskCreateModel] = Field(min_length=1, max_length=BULK_MAX_TASKS)
+
+
+class TaskBulkUpdateItemModel(TaskUpdateModel):
+    id: Union[int, str]
+
+
+class TaskBulkUpdateModel(BaseModel):
+    tasks: List[TaskBulkUpdateItemModel] = Field(min_length=1, max_length=BULK_MAX_TASKS)
+
+
+class TaskBulkResponseModel(BaseModel):
+    count: int
@@ -1,7 +1,11 @@
+import csv
+import io
+import json
 import logging
-from typing import Union
+from typing import AsyncIterator, List, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.db.core import sessionmanager
 from src.exceptions import ValidationException
 
 from .repositories import TaskRepository
@@ -10,6 +14,9 @@ from .models import Task
 
 logger = logging.getLogger(__name__)
 
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_BATCH_SIZE = 1000
+
 
 class TaskService:
     def __init__(self, model=Task):
@@ -32,7 +39,8 @@ class TaskService:
         priority: str = None,
         assignee_id: int = None,
         search: str = None,
-        sort: str = None
+        sort: str = None,
+        columns: List[str] = None
     ):
         try:
             conditions = {}
@@ -52,7 +60,8 @@ class TaskService:
                 conditions=conditions,
                 search=search,
                 search_columns=search_columns,
-                sort=sort
+                sort=sort,
+                columns=columns
             )
 
             return result
@@ -60,6 +69,56 @@ class TaskService:
             logger.error(str(e))
             raise Exception(str(e))
 
+    async def export(self, format: str = 'ndjson', status: str = None, priority: str = None, assignee_id: int = None) -> AsyncIterator[str]:
+        """
+        Stream every task as NDJSON lines or CSV rows, one chunk per fetched batch.
+        The export owns its session, the request session is closed before a streamed body is sent.
+        It reads from a replica when one is configured.
+        A failure once streaming started cannot change the response status: NDJSON ends with an
+        {"error": ..., "rows": n} line after the n rows sent, a CSV stream is aborted so the body is left incomplete.
+        """
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f'Unsupported export format: {format}')
+
+        conditions = {}
+        if status:
+            conditions['status'] = status
+        if priority:
+            conditions['priority'] = priority
+        if assignee_id:
+            conditions['assignee_id'] = assignee_id
+
+        fields = list(schemas.TaskResponseModel.model_fields.keys())
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields)
+        if format == 'csv':
+            writer.writeheader()
+
+        count = 0
+        db_session = await sessionmanager.get_session(use_replica=True)
+        try:
+            async for task in self._repository.stream(db_session, conditions, batch_size=EXPORT_BATCH_SIZE, columns=fields):
+                row = schemas.TaskResponseModel.model_validate(task).model_dump(mode='json')
+                if format == 'csv':
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(row) + '\n')
+                count += 1
+                if count % EXPORT_BATCH_SIZE == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate(0)
+            if buffer.tell():
+                yield buffer.getvalue()
+        except Exception as e:
+            logger.error(f'Task export failed after {count} rows: {str(e)}')
+            if format == 'csv':
+                raise Exception(str(e))
+            buffer.write(json.dumps({'error': 'Export failed', 'rows': count}) + '\n')
+            yield buffer.getvalue()
+        finally:
+            await db_session.close()
+
     async def find(self, db_session: AsyncSession, id):
         try:
             data = await self._repository.get_by_id(db_session, id)
@@ -95,6 +154,34 @@ class TaskService:
             await db_session.rollback()
             raise Exception(str(e))
         
+    async def bulk_create(self, db_session: AsyncSession, data: schemas.TaskBulkCreateModel, user):
+        try:
+            rows = []
+            for task in data.tasks:
+                data_dict = task.model_dump()
+                data_dict['creator_id'] = user.id
+                rows.append(data_dict)
+            return await self._repository.bulk_create(db_session, rows)
+        except ValidationException as e:
+            logger.error(str(e))
+            raise e
+        except Exception as e:
+            logger.error(str(e))
+            await db_session.rollback()
+            raise Exception(e)
+
+    async def bulk_update(self, db_session: AsyncSession, data: schemas.TaskBulkUpdateModel):
+        try:
+            rows = [task.model_dump(exclude_none=True) for task in data.tasks]
+            return await self._repository.bulk_update(db_session, rows)
+        except ValidationException as e:
+            logger.error(str(e))
+            raise e
+        except Exception as e:
+            logger.error(str(e))
+            await db_session.rollback()
+            raise Exception(str(e))
+
     async def delete(self, db_session: AsyncSession, id: Union[int, str]):
         try:
             result = await self._repository.delete(db_session, id)
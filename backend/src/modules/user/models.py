@@ -4,7 +4,8 @@ from sqlalchemy import (
     String,
     Enum,
     TIMESTAMP,
-    BigInteger
+    BigInteger,
+    Index
 )
 from sqlalchemy.dialects.mysql import CHAR
 from sqlalchemy.orm import relationship, deferred
@@ -19,6 +20,8 @@ ROLE = Enum('USER', 'ADMIN', name='user_role')
 class User(Base):
     __tablename__ = 'users'
     __sensitive_fields__ = {'password_hash'}
+    # Mirrors src/db/migrations/0004_list_indexes.sql
+    __table_args__ = (Index('idx_users_active', 'deleted_at', 'id'),)
 
     id = Column(BigInteger, primary_key=True, autoincrement=True, nullable=False)
     name = Column(String, nullable=True)
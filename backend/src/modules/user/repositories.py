@@ -1,6 +1,39 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.db.redis import token_blocklist
 from src.repositories import BaseRepository
+from src.repositories.counting import CountCache
 
 
 class UserRepository(BaseRepository):
+    # Looked up by email on every authenticated request, role changes go through update() and invalidate
+    entity_cache_ttl = 300
+
     def __init__(self, model):
-        super().__init__(model)
+        super().__init__(model, count_cache=CountCache(model.__tablename__))
+
+    async def update(self, session: AsyncSession, id, attributes: dict):
+        # Loaded into the identity map here, the update below reuses the instance without another query
+        user = await session.get(self.model, id)
+        previous_role = user.role if user else None
+        updated = await super().update(session, id, attributes)
+        if updated is not None and updated.role != previous_role:
+            await self._expire_tokens(session, id)
+        return updated
+
+    async def delete(self, session: AsyncSession, id):
+        deleted = await super().delete(session, id)
+        if deleted:
+            await self._expire_tokens(session, id)
+        return deleted
+
+    async def _expire_tokens(self, session: AsyncSession, id):
+        """
+        Make the role claims in the user's tokens stale.
+        In a unit-of-work session only once the change is committed: a login between the bump and the commit
+        would otherwise read the old role and sign it with the new token version.
+        """
+        if self._unit_of_work(session):
+            self._after_commit(session, lambda: token_blocklist.bump_user_version(id))
+        else:
+            await token_blocklist.bump_user_version(id)
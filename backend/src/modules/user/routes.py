@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends, Request
 
 from src.schemas import PaginationParams
 from src.exceptions import ValidationException
-from src.helpers.serializer import serialize_model
+from src.helpers.serializer import serialize_model, projection_columns
 from src.helpers.response import ApiResponser
 from src.helpers.router import route_method, register_routers
 
@@ -40,10 +40,11 @@ class UserRoute:
     async def list(self, request: Request, params: PaginationParams = Depends()):
         try:
             db_session = request.state.db
+            columns = projection_columns(schemas.UserResponseModel)
             if params.page is None or params.per_page is None:
-                data = await self.service.list(db_session)
+                data = await self.service.list(db_session, columns)
             else:
-                data = await self.service.paginateList(db_session, params.page, params.per_page)
+                data = await self.service.paginateList(db_session, params.page, params.per_page, columns)
             data = serialize_model(data, schemas.UserResponseModel)
             return ApiResponser.success_response(data=data, paginated=True)
         except Exception as e:
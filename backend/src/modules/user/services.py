@@ -1,8 +1,10 @@
 import logging
-from typing import Union
+from typing import List, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.exceptions import ValidationException
+from src.modules.auth.utils import hash_password
+from src.repositories.counting import COUNT_CACHED
 
 from .repositories import UserRepository
 from .schemas import UserCreateModel, UserUpdateModel
@@ -15,17 +17,17 @@ class UserService:
     def __init__(self, model=User):
         self._repository = UserRepository(model)
 
-    async def list(self, db_session: AsyncSession):
+    async def list(self, db_session: AsyncSession, columns: List[str] = None):
         try:
-            data = await self._repository.get_all(db_session)
+            data = await self._repository.get_all(db_session, columns=columns)
             return data
         except Exception as e:
             logger.error(str(e))
             raise Exception(str(e))
         
-    async def paginateList(self, db_session: AsyncSession, page, per_page):
+    async def paginateList(self, db_session: AsyncSession, page, per_page, columns: List[str] = None):
         try:
-            data = await self._repository.paginate(db_session, page, per_page)
+            data = await self._repository.paginate(db_session, page, per_page, count_strategy=COUNT_CACHED, columns=columns)
             return data
         except Exception as e:
             logger.error(str(e))
@@ -42,7 +44,7 @@ class UserService:
     async def create(self, db_session: AsyncSession, data: UserCreateModel):
         try:
             data_dict = data.model_dump()
-            data_dict['password'] = 'password@default'
+            data_dict['password_hash'] = await hash_password('password@default')
             result = await self._repository.create(db_session, data_dict)
             return result
         except ValidationException as e:
@@ -56,6 +58,7 @@ class UserService:
     async def update(self, db_session: AsyncSession, id: Union[int, str], data: UserUpdateModel):
         try:
             data_dict = data.model_dump()
+            # A role change makes the user's tokens stale, see UserRepository.update()
             data = await self._repository.update(db_session, id, data_dict)
             return data
         except ValidationException as e:
@@ -1 +1,2 @@
 from .base import BaseRepository
+from .search import SearchBackend, LikeSearchBackend, FullTextSearchBackend
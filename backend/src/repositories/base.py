@@ -1,24 +1,54 @@
 import logging
-from typing import List, Optional, Dict, Any
+import re
+from typing import List, Optional, Dict, Any, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import and_, func, text, delete, not_, asc, desc, or_
-from sqlalchemy.orm import Query, undefer, joinedload, selectinload, load_only
+from sqlalchemy import and_, func, delete, not_, asc, desc, or_, tuple_, false, insert, update, case, bindparam, Integer, inspect
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Query, undefer, joinedload, selectinload, load_only, make_transient_to_detached
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql.elements import BindParameter
 
 from src.exceptions import ValidationException
 from src.helpers.paginator import Paginator, CursorPaginator
+from .search import SearchBackend, LikeSearchBackend
+from .counting import CountCache, COUNT_EXACT, COUNT_CACHED, COUNT_ESTIMATED, COUNT_STRATEGIES
+from .entity_cache import EntityCache
+from .statements import StatementCache, conditions_shape, relationships_shape, condition_filter, condition_params
+from .raw_sql import parse_raw_sql, cached_text, parse_sort as parse_raw_sort, keyset_sql, TOTAL_COUNT_COLUMN, CURSOR_PARAM_PREFIX
 
 logger = logging.getLogger(__name__)
 
+BULK_BATCH_SIZE = 500
+STREAM_BATCH_SIZE = 1000
+
+DUPLICATE_ENTRY_PATTERN = re.compile(r"Duplicate entry '(?P<value>.*)' for key '(?P<key>[^']*)'")
+
 
 class RepositoryError(Exception):
     pass
 
 
 class BaseRepository:
-    def __init__(self, model):
+    # Seconds get_by_id/where_first results stay in the Redis tier of the entity cache, None keeps it off
+    entity_cache_ttl: Optional[int] = None
+    # Hot statement templates keyed by model and filter shape, shared because repositories are created per request
+    statement_cache = StatementCache()
+
+    def __init__(
+        self,
+        model,
+        search_backend: Optional[SearchBackend] = None,
+        count_cache: Optional[CountCache] = None,
+        entity_cache: Optional[EntityCache] = None,
+    ):
         self.model = model
+        self.search_backend = search_backend or LikeSearchBackend()
+        self.count_cache = count_cache
+        self.entity_cache = entity_cache
+        if self.entity_cache is None and self.entity_cache_ttl:
+            self.entity_cache = EntityCache(model, ttl=self.entity_cache_ttl)
 
     def _apply_eager_loading(self, query: Query, relationships: Optional[List[dict]] = []):
         """
@@ -42,6 +72,21 @@ class BaseRepository:
                     query = query.options(selectinload(relationship_attr))
         return query
     
+    def _apply_projection(self, statement, columns: Optional[List[str]] = None, required: Optional[List[str]] = None):
+        """
+        Load only the given root entity columns (plus id and required), e.g. the fields of a response model.
+        Unknown, relationship and sensitive names are skipped, no columns loads the full entity.
+        """
+        if not columns:
+            return statement
+        valid_columns = self.model.__mapper__.columns.keys()
+        sensitive_fields = getattr(self.model, '__sensitive_fields__', set())
+        names = [
+            name for name in dict.fromkeys(['id', *(required or []), *columns])
+            if name in valid_columns and name not in sensitive_fields
+        ]
+        return statement.options(load_only(*[getattr(self.model, name) for name in names]))
+
     def _get_valid_attributes(self, attributes):
         valid_attributes = {}
 
@@ -53,36 +98,226 @@ class BaseRepository:
 
         return valid_attributes
 
+    async def _estimate_rows(self, session: AsyncSession, sql: str, params=None) -> Optional[int]:
+        """
+        Row estimate from the MySQL optimizer (EXPLAIN rows * filtered), None when not available.
+        Joined tables multiply like the optimizer's own nested-loop estimate.
+        """
+        if session.get_bind().dialect.name != 'mysql':
+            return None
+
+        connection = await session.connection()
+        result = await connection.exec_driver_sql(f'EXPLAIN {sql}', params or ())
+        plan = result.mappings().all()
+        if not plan:
+            return None
+
+        estimate = 1
+        for row in plan:
+            if row.get('rows') is not None:
+                estimate *= row['rows'] * (row.get('filtered') or 100) / 100
+        return int(round(estimate))
+
+    async def _resolve_total(self, count_strategy: str, cache_filters: Any, exact_count, estimate_count):
+        """
+        Resolve a pagination total with the requested strategy.
+        exact_count / estimate_count are coroutine functions, the strategy actually used is returned with the total,
+        e.g. a cache miss or an unsupported estimate reports "exact".
+        """
+        if count_strategy not in COUNT_STRATEGIES:
+            raise ValueError(f'Unsupported count strategy: {count_strategy}')
+
+        if count_strategy == COUNT_CACHED and self.count_cache:
+            total = await self.count_cache.get(cache_filters)
+            if total is not None:
+                return total, COUNT_CACHED
+            total = await exact_count()
+            await self.count_cache.set(cache_filters, total)
+            return total, COUNT_EXACT
+
+        if count_strategy == COUNT_ESTIMATED:
+            try:
+                total = await estimate_count()
+            except Exception as e:
+                # Estimates are best effort, fall back to an exact count
+                logger.warning(f'Row estimate failed in {self.model.__name__}: {str(e)}')
+                total = None
+            if total is not None:
+                return total, COUNT_ESTIMATED
+
+        return await exact_count(), COUNT_EXACT
+
+    def _unit_of_work(self, session: AsyncSession) -> bool:
+        return session.info.get('unit_of_work') is True
+
+    async def _commit(self, session: AsyncSession):
+        """Commit the write, or only flush it in a unit-of-work session where the request commits once."""
+        if self._unit_of_work(session):
+            await session.flush()
+        else:
+            await session.commit()
+
+    async def _refresh_expired(self, session: AsyncSession, entity):
+        """Reload only what the write left expired, python-side and eager defaults need no query."""
+        expired = inspect(entity).expired_attributes
+        if expired:
+            await session.refresh(entity, attribute_names=list(expired))
+
+    def _after_commit(self, session: Optional[AsyncSession], callback):
+        """Run callback again once a unit-of-work session commits, so readers cannot re-cache pre-commit rows."""
+        if session is not None and self._unit_of_work(session):
+            session.info.setdefault('after_commit', []).append(callback)
+
+    async def _invalidate_counts(self, session: Optional[AsyncSession] = None):
+        if self.count_cache:
+            await self.count_cache.invalidate()
+            self._after_commit(session, self.count_cache.invalidate)
+
+    async def _invalidate_entities(self, entity_ids: Optional[List[Any]] = None, session: Optional[AsyncSession] = None):
+        """Drop the given ids from the entity cache, or every cached entity when entity_ids is None."""
+        if self.entity_cache:
+            await self.entity_cache.invalidate(entity_ids)
+            self._after_commit(session, lambda: self.entity_cache.invalidate(entity_ids))
+
+    def _use_entity_cache(self, relationships, load_sensitive: bool, conditions: Optional[dict] = None) -> bool:
+        if not self.entity_cache or relationships or load_sensitive:
+            return False
+        if conditions is not None:
+            return bool(conditions) and all(
+                key in self.entity_cache.columns and isinstance(value, (str, int, bool))
+                for key, value in conditions.items()
+            )
+        return True
+
+    async def _cached_entity(self, session: AsyncSession, entity_id, conditions: Optional[dict] = None):
+        """Cached entity attached to the session without a query, None on a miss or a stale lookup."""
+        data = await self.entity_cache.get(entity_id)
+        if data is None or data.get('deleted_at') is not None:
+            return None
+        if conditions and any(data.get(key) != value for key, value in conditions.items()):
+            return None
+
+        entity = self.model(**data)
+        make_transient_to_detached(entity)
+        return await session.merge(entity, load=False)
+
     async def get_by_raw_sql(self, session: AsyncSession, sql: str, params: Optional[dict] = None):
         try:
-            result = await session.execute(text(sql), params or {})
+            result = await session.execute(cached_text(sql), params or {})
             return result.mappings().all()
         except Exception as e:
             logger.error(f'{str(e)}')
             raise RepositoryError(f'Failed to execute raw SQL in {self.model.__name__}') from e
     
-    async def paginate_by_raw_sql(self, session: AsyncSession, sql: str, params: Optional[dict] = None, page: int = 1, per_page: int = 10):
+    async def paginate_by_raw_sql(
+        self,
+        session: AsyncSession,
+        sql: str,
+        params: Optional[dict] = None,
+        page: int = 1,
+        per_page: int = 10,
+        count_strategy: str = COUNT_EXACT,
+        single_query: bool = True,
+    ):
+        """
+        Offset pagination over a raw query.
+        With single_query and an exact count, the total comes back with the page through COUNT(*) OVER(),
+        queries the window cannot count correctly (DISTINCT, UNION, LIMIT) fall back to a separate COUNT query.
+        """
         try:
             params = params or {}
+            count_params = dict(params)
+            raw_query = parse_raw_sql(sql)
+            offset = (page - 1) * per_page
+
+            async def exact_count():
+                count_result = await session.execute(cached_text(raw_query.count_sql), count_params)
+                return count_result.scalar()
 
-            count_sql = f'SELECT COUNT(*) FROM ({sql.split('ORDER BY')[0]}) AS total_count'
-            count_result = await session.execute(text(count_sql), params)
-            total_count = count_result.scalar()
+            async def estimate_count():
+                compiled = cached_text(raw_query.body).bindparams(**count_params).compile(dialect=session.get_bind().dialect)
+                positional = tuple(compiled.params[name] for name in (compiled.positiontup or []))
+                return await self._estimate_rows(session, str(compiled), positional)
 
-            paginated_sql = f'{sql} LIMIT :limit OFFSET :offset'
-            params.update({'limit': per_page, 'offset': (page - 1) * per_page})
+            params.update({'limit': per_page, 'offset': offset})
 
-            result = await session.execute(text(paginated_sql), params)
+            windowed_sql = raw_query.windowed_sql if single_query and count_strategy == COUNT_EXACT else None
+            if windowed_sql is not None:
+                result = await session.execute(cached_text(f'{windowed_sql} LIMIT :limit OFFSET :offset'), params)
+                rows = result.mappings().all()
+                data = [{key: value for key, value in row.items() if key != TOTAL_COUNT_COLUMN} for row in rows]
+                if rows:
+                    return Paginator(data, rows[0][TOTAL_COUNT_COLUMN], page, per_page, COUNT_EXACT)
+                # A page past the end carries no window total
+                total_count = await exact_count() if offset else 0
+                return Paginator(data, total_count, page, per_page, COUNT_EXACT)
+
+            result = await session.execute(cached_text(f'{raw_query.sql} LIMIT :limit OFFSET :offset'), params)
             data = result.mappings().all()
+
+            total_count, count_strategy = await self._resolve_total(
+                count_strategy, {'sql': raw_query.sql, 'params': count_params}, exact_count, estimate_count
+            )
+            if count_strategy == COUNT_ESTIMATED:
+                total_count = max(total_count, offset + len(data))
             
-            return Paginator(data, total_count, page, per_page)
+            return Paginator(data, total_count, page, per_page, count_strategy)
+        except Exception as e:
+            logger.error(f'{str(e)}')
+            raise RepositoryError(f'Failed to execute raw SQL in {self.model.__name__}') from e
+
+    async def paginate_cursor_by_raw_sql(
+        self,
+        session: AsyncSession,
+        sql: str,
+        params: Optional[dict] = None,
+        cursor: Optional[Dict[str, Any]] = None,
+        limit: int = 10,
+        sort: Optional[str] = None,
+    ):
+        """
+        Keyset pagination over a raw query, sorted by its output columns, e.g. sort=-created_at => created_at DESC, id DESC.
+        The query must select an "id" column, it is the tie-breaker that keeps every key set unique.
+        Its own outer ORDER BY is replaced by the sort.
+        """
+        try:
+            raw_query = parse_raw_sql(sql)
+            sort_keys = parse_raw_sort(sort)
+            sort_signature = ','.join(f'{"-" if descending else ""}{column_name}' for column_name, descending in sort_keys)
+
+            params = dict(params or {})
+            null_values = None
+            if cursor and 'values' in cursor:
+                values = cursor['values']
+                if cursor.get('sort') == sort_signature and len(values) == len(sort_keys):
+                    null_values = tuple(value is None for value in values)
+                    params.update({f'{CURSOR_PARAM_PREFIX}{index}': value for index, value in enumerate(values) if value is not None})
+                else:
+                    logger.warning(f'Cursor does not match sort "{sort_signature}" in {self.model.__name__}, ignored')
+            params['limit'] = limit + 1 # limit + 1 is to check hasNext
+
+            result = await session.execute(cached_text(keyset_sql(raw_query.body, sort_keys, null_values)), params)
+            rows = result.mappings().all()
+
+            has_next = len(rows) > limit
+            if has_next:
+                rows = rows[:-1]
+
+            next_cursor = None
+            if has_next and rows:
+                next_cursor = {
+                    'values': [rows[-1][column_name] for column_name, _ in sort_keys],
+                    'sort': sort_signature,
+                }
+            return CursorPaginator(rows, limit, has_next, next_cursor)
         except Exception as e:
             logger.error(f'{str(e)}')
             raise RepositoryError(f'Failed to execute raw SQL in {self.model.__name__}') from e
 
-    async def get_all(self, session: AsyncSession, relationships: Optional[List[dict]] = []):
+    async def get_all(self, session: AsyncSession, relationships: Optional[List[dict]] = [], columns: Optional[List[str]] = None):
         try:
             statement = select(self.model).filter(self.model.deleted_at == None)
+            statement = self._apply_projection(statement, columns)
             statement = self._apply_eager_loading(statement, relationships)
 
             result = await session.execute(statement)
@@ -93,6 +328,161 @@ class BaseRepository:
             logger.error(f'{str(e)}')
             raise RepositoryError(f'Failed in {self.model.__name__}') from e
 
+    def _parse_sort(self, sort: Optional[str] = None, computed_columns: Optional[dict] = None):
+        """
+        Parse a sort string like "-priority,due_date" into (column_name, direction) pairs.
+        Unknown columns are ignored and "id" is always appended as the tie-breaker
+        so that every key set is unique and keyset pagination is stable.
+        computed_columns (e.g. {'relevance': rank}) are sortable too and sorted descending by default.
+        """
+        computed_columns = computed_columns or {}
+        sort_keys = []
+        for part in (sort or '').split(','):
+            part = part.strip()
+            if not part:
+                continue
+            direction = desc if part.startswith('-') else asc
+            column_name = part.lstrip('-+')
+            if column_name in getattr(self.model, '__sensitive_fields__', set()):
+                continue
+            sortable = column_name in self.model.__mapper__.columns.keys() or column_name in computed_columns
+            if sortable and column_name not in [key for key, _ in sort_keys]:
+                sort_keys.append((column_name, direction))
+
+        if not sort_keys:
+            sort_keys.extend((column_name, desc) for column_name in computed_columns)
+        if not sort_keys:
+            sort_keys.append(('id', desc))
+        elif 'id' not in [key for key, _ in sort_keys]:
+            # Tie-breaker follows the last key direction so uniform sorts can use a row-value seek
+            sort_keys.append(('id', sort_keys[-1][1]))
+        return sort_keys
+
+    def _sort_signature(self, sort_keys):
+        return ','.join(f'{"-" if direction == desc else ""}{column_name}' for column_name, direction in sort_keys)
+
+    def _seek_after(self, column, value, direction):
+        """
+        Strict "comes after" predicate for a single sort key.
+        NULLs are treated as the smallest value (MySQL and SQLite default ordering),
+        and ENUM columns are compared by declaration order like MySQL sorts them.
+        Returns None when no row can come after the value (e.g. NULL in descending order).
+        """
+        enums = getattr(column.type, 'enums', None)
+        if value is None:
+            if direction == asc:
+                return column.is_not(None)
+            return None
+
+        if enums and value in enums:
+            index = enums.index(value)
+            following = enums[index + 1:] if direction == asc else enums[:index]
+            condition = column.in_(following)
+        else:
+            condition = column > value if direction == asc else column < value
+
+        if direction == desc and getattr(column, 'nullable', False):
+            condition = or_(condition, column.is_(None))
+        return condition
+
+    def _seek_equal(self, column, value):
+        if value is None:
+            return column.is_(None)
+        return column == value
+
+    def _sort_columns(self, sort_keys, computed_columns: Optional[dict] = None):
+        computed_columns = computed_columns or {}
+        return [
+            computed_columns[column_name] if column_name in computed_columns else self.model.__mapper__.columns[column_name]
+            for column_name, _ in sort_keys
+        ]
+
+    def _build_cursor_filter(self, sort_keys, values, columns):
+        """
+        Build the keyset predicate for rows after the cursor values.
+        Uniform, non-nullable, non-enum sorts use a row-value comparison, e.g. (created_at, id) < (:v, :id),
+        everything else is expanded to (a > x) OR (a = x AND b > y) OR ...
+        """
+        directions = {direction for _, direction in sort_keys}
+        row_value_seek = (
+            len(directions) == 1
+            and all(value is not None for value in values)
+            and all(not getattr(column, 'nullable', False) and not getattr(column.type, 'enums', None) for column in columns)
+        )
+        if row_value_seek:
+            if directions.pop() == asc:
+                return tuple_(*columns) > tuple_(*values)
+            return tuple_(*columns) < tuple_(*values)
+
+        seek_filters = []
+        for index, (column, (_, direction)) in enumerate(zip(columns, sort_keys)):
+            seek_after = self._seek_after(column, values[index], direction)
+            if seek_after is None:
+                continue
+            equal_filters = [self._seek_equal(columns[i], values[i]) for i in range(index)]
+            seek_filters.append(and_(*equal_filters, seek_after))
+        return or_(false(), *seek_filters)
+
+    def _condition_filters(self, conditions: dict):
+        """Equality filters for known columns, list values become IN (...)."""
+        filters = []
+        for column, value in conditions.items():
+            if hasattr(self.model, column):
+                column_attribute = getattr(self.model, column)
+                if isinstance(value, list):
+                    filters.append(column_attribute.in_(value))
+                else:
+                    filters.append(column_attribute == value)
+        return filters
+
+    async def stream(
+        self,
+        session: AsyncSession,
+        conditions: dict = {},
+        relationships: Optional[List[dict]] = [],
+        batch_size: int = STREAM_BATCH_SIZE,
+        columns: Optional[List[str]] = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Iterate non-deleted rows in id order through a server-side cursor, batch_size rows at a time.
+        Each batch is expunged from the session once consumed, so memory stays bounded by one batch.
+        The session must stay open until iteration finishes.
+        """
+        filters = [self.model.deleted_at == None, *self._condition_filters(conditions)]
+
+        statement = select(self.model).where(and_(*filters)).order_by(asc(self.model.id))
+        statement = self._apply_projection(statement, columns)
+        statement = self._apply_eager_loading(statement, relationships)
+        statement = statement.execution_options(yield_per=batch_size)
+
+        try:
+            result = await session.stream(statement)
+        except Exception as e:
+            logger.error(f'{str(e)}')
+            raise RepositoryError(f'Stream failed in {self.model.__name__}') from e
+
+        try:
+            async for partition in result.scalars().partitions():
+                for item in partition:
+                    yield item
+                for item in partition:
+                    session.expunge(item)
+        finally:
+            await result.close()
+
+    def _cursor_placeholders(self, values, columns):
+        """
+        Cursor values as they shape the seek predicate: NULL and ENUM values change the SQL and stay literal,
+        everything else becomes a cursor_<n> bindparam.
+        """
+        placeholders = []
+        for index, (value, column) in enumerate(zip(values, columns)):
+            if value is None or getattr(column.type, 'enums', None):
+                placeholders.append(value)
+            else:
+                placeholders.append(bindparam(f'cursor_{index}', type_=column.type))
+        return placeholders
+
     async def paginate_cursor(
         self,
         session: AsyncSession,
@@ -103,146 +493,222 @@ class BaseRepository:
         search: Optional[str] = None,
         search_columns: Optional[List[str]] = None,
         sort: Optional[str] = None,
+        columns: Optional[List[str]] = None,
     ):
+        """
+        Keyset pagination sorted by the sort string, with id as the tie-breaker.
+        columns projects the loaded entities, the sort columns are always loaded to build the next cursor.
+        Without a search the statement is a template keyed by the filter, sort and cursor shape,
+        reused across calls with the values passed as parameters.
+        """
         try:
-            filters = [self.model.deleted_at == None]
+            searching = bool(search and search_columns)
+            conditions = {column: value for column, value in conditions.items() if hasattr(self.model, column)}
 
-            # Conditions filters
-            for column, value in conditions.items():
-                if hasattr(self.model, column):
-                    column_attribute = getattr(self.model, column)
-                    if isinstance(value, list):
-                        filters.append(column_attribute.in_(value))
-                    else:
-                        filters.append(column_attribute == value)
-
-            # Search filters
-            if search and search_columns:
-                search_filters = []
-                for col_name in search_columns:
-                    if hasattr(self.model, col_name):
-                        column_attr = getattr(self.model, col_name)
-                        search_filters.append(column_attr.ilike(f'%{search}%'))
-                if search_filters:
-                    filters.append(or_(*search_filters))
-
-            statement = select(self.model).where(and_(*filters))
-
-            # Sorting
-            sort_column = 'id'
-            order_direction = desc
-            if sort:
-                if sort.startswith('-'):
-                    sort_column = sort[1:]
-                    order_direction = desc
+            # Search filters, ranked backends also give a relevance expression to sort on
+            statement = select(self.model)
+            computed_columns = {}
+            if searching:
+                statement, rank = await self.search_backend.apply(session, statement, self.model, search, search_columns)
+                if rank is not None:
+                    computed_columns['relevance'] = rank
+                    statement = statement.add_columns(rank.label('relevance'))
+
+            # Sorting, e.g. sort=-priority,due_date => ORDER BY priority DESC, due_date ASC, id ASC
+            # Searches without an explicit sort are ordered by relevance
+            sort_keys = self._parse_sort(sort, computed_columns)
+            sort_signature = self._sort_signature(sort_keys)
+            sort_columns = self._sort_columns(sort_keys, computed_columns)
+
+            # Cursor filter
+            values = None
+            if cursor and 'values' in cursor:
+                if cursor.get('sort') == sort_signature and len(cursor['values']) == len(sort_keys):
+                    values = cursor['values']
                 else:
-                    sort_column = sort
-                    order_direction = asc
+                    logger.warning(f'Cursor does not match sort "{sort_signature}" in {self.model.__name__}, ignored')
 
-            if hasattr(self.model, sort_column):
-                statement = statement.order_by(order_direction(getattr(self.model, sort_column)))
+            params = {'limit': limit + 1} # limit + 1 isto check hasNext
+            if searching:
+                placeholders = values
             else:
-                statement = statement.order_by(desc(self.model.id))
+                placeholders = self._cursor_placeholders(values, sort_columns) if values is not None else None
+                params.update(condition_params(conditions))
+                params.update({f'cursor_{index}': value for index, value in enumerate(values or [])})
 
-            # Cursor filter
-            if cursor and 'last_id' in cursor:
-                last_id = cursor['last_id']
-                sort_key = cursor.get('sort', sort_column)
-                if hasattr(self.model, sort_key):
-                    column_attr = getattr(self.model, sort_key)
-                    if order_direction == asc:
-                        statement = statement.where(column_attr > last_id)
-                    else:
-                        statement = statement.where(column_attr < last_id)
-
-            statement = statement.limit(limit + 1) # limit + 1 isto check hasNext
-            statement = self._apply_eager_loading(statement, relationships)
+            def build(statement=statement):
+                if searching:
+                    filters = [self.model.deleted_at == None, *self._condition_filters(conditions)]
+                else:
+                    filters = [self.model.deleted_at == None]
+                    filters.extend(condition_filter(getattr(self.model, column), column, shape) for column, shape in conditions_shape(conditions))
+                if placeholders is not None:
+                    filters.append(self._build_cursor_filter(sort_keys, placeholders, sort_columns))
 
-            result = await session.execute(statement)
-            items = result.scalars().unique().all()
+                statement = statement.where(and_(*filters))
+                statement = statement.order_by(*[direction(column) for column, (_, direction) in zip(sort_columns, sort_keys)])
+                statement = statement.limit(bindparam('limit', type_=Integer))
+                statement = self._apply_projection(statement, columns, [column_name for column_name, _ in sort_keys])
+                return self._apply_eager_loading(statement, relationships)
+
+            if searching:
+                statement = build()
+            else:
+                cursor_shape = None if placeholders is None else tuple(
+                    'param' if isinstance(value, BindParameter) else ('literal', value) for value in placeholders
+                )
+                key = (
+                    self.model, 'paginate_cursor', conditions_shape(conditions), sort_signature, cursor_shape,
+                    relationships_shape(relationships), tuple(columns or []),
+                )
+                statement = self.statement_cache.get(key, build)
+
+            result = await session.execute(statement, params)
+            if computed_columns:
+                rows = result.unique().all()
+            else:
+                rows = [(item,) for item in result.scalars().unique().all()]
 
-            has_next = len(items) > limit
+            has_next = len(rows) > limit
             if has_next:
-                items = items[:-1]
+                rows = rows[:-1]
+            items = [row[0] for row in rows]
 
             next_cursor = None
-            if has_next and items:
-                last_item = items[-1]
+            if has_next and rows:
+                last_row = rows[-1]
                 next_cursor = {
-                    'last_id': getattr(last_item, sort_column),
-                    'sort': sort_column,
+                    'values': [
+                        getattr(last_row, column_name) if column_name in computed_columns else getattr(last_row[0], column_name)
+                        for column_name, _ in sort_keys
+                    ],
+                    'sort': sort_signature,
                 }
             return CursorPaginator(items, limit, has_next, next_cursor)
         except Exception as e:
             logger.error(f'Cursor pagination failed in {self.model.__name__}: {str(e)}')
             raise RepositoryError(f'Cursor pagination failed in {self.model.__name__}') from e
         
-    async def paginate(self, session: AsyncSession, page: int = 1, per_page: int = 10, conditions: dict = {}, relationships: Optional[List[dict]] = []):
+    async def paginate(
+        self,
+        session: AsyncSession,
+        page: int = 1,
+        per_page: int = 10,
+        conditions: dict = {},
+        relationships: Optional[List[dict]] = [],
+        count_strategy: str = COUNT_EXACT,
+        columns: Optional[List[str]] = None,
+    ):
         try:
             filters = [self.model.deleted_at == None]
 
             for column, value in conditions.items():
                 column_attribute = getattr(self.model, column)
                 filters.append(column_attribute == value)
-            
-            total = await session.execute(select(func.count()).select_from(self.model).where(and_(*filters)))
-            total = total.scalar()
+
+            async def exact_count():
+                total = await session.execute(select(func.count()).select_from(self.model).where(and_(*filters)))
+                return total.scalar()
+
+            async def estimate_count():
+                compiled = select(self.model.id).where(and_(*filters)).compile(dialect=session.get_bind().dialect)
+                positional = tuple(compiled.params[name] for name in (compiled.positiontup or []))
+                return await self._estimate_rows(session, str(compiled), positional)
 
             offset = (page - 1) * per_page
             # statement = select(self.model).filter(self.model.deleted_at == None).offset(offset).limit(per_page)
             statement = select(self.model).where(and_(*filters)).offset(offset).limit(per_page)
+            statement = self._apply_projection(statement, columns)
             statement = self._apply_eager_loading(statement, relationships)
 
             result = await session.execute(statement)
             items = result.scalars().unique().all()
+
+            total, count_strategy = await self._resolve_total(count_strategy, conditions, exact_count, estimate_count)
+            if count_strategy == COUNT_ESTIMATED:
+                # Never report fewer rows than the pages already served
+                total = max(total, offset + len(items))
             
-            return Paginator(items, total, page, per_page)
+            return Paginator(items, total, page, per_page, count_strategy)
         except Exception as e:
             logger.error(f'{str(e)}')
             raise RepositoryError(f'Pagination failed in {self.model.__name__}') from e
 
+    def _sensitive_options(self, load_sensitive: bool):
+        # Add undefer option if sensitive fields need to be loaded
+        # Currently need only for password_hash
+        if load_sensitive and hasattr(self.model, 'password_hash'):
+            return [undefer(self.model.password_hash)]
+        return []
+
     async def get_by_id(self, session: AsyncSession, id, relationships: Optional[List[dict]] = [], load_sensitive: bool = False):
         try:
-            # Add undefer option if sensitive fields need to be loaded
-            # Currently need only for password_hash
-            options = []
-            if load_sensitive and hasattr(self.model, 'password_hash'):
-                options.append(undefer(self.model.password_hash))
-                
-            statement = select(self.model).filter(self.model.id == id).filter(self.model.deleted_at == None)
-            statement = self._apply_eager_loading(statement, relationships)
-            result = await session.execute(statement)
-            
-            return result.scalars().first()
+            use_cache = self._use_entity_cache(relationships, load_sensitive)
+            if use_cache:
+                entity = await self._cached_entity(session, id)
+                if entity is not None:
+                    return entity
+
+            def build():
+                statement = (
+                    select(self.model)
+                    .options(*self._sensitive_options(load_sensitive))
+                    .filter(self.model.id == bindparam('entity_id'))
+                    .filter(self.model.deleted_at == None)
+                )
+                return self._apply_eager_loading(statement, relationships)
+
+            key = (self.model, 'get_by_id', relationships_shape(relationships), load_sensitive)
+            statement = self.statement_cache.get(key, build)
+            result = await session.execute(statement, {'entity_id': id})
+            entity = result.scalars().first()
+
+            if use_cache and entity is not None:
+                await self.entity_cache.set(entity)
+            return entity
         except Exception as e:
             logger.error(f'{str(e)}')
             raise RepositoryError(f'Failed in {self.model.__name__}') from e
 
     async def where_first(self, session: AsyncSession, conditions: dict = {}, relationships: Optional[List[dict]] = [], load_sensitive: bool = False):
         try:
-            filters = []
-            for column, value in conditions.items():
-                column_attribute = getattr(self.model, column)
-                filters.append(column_attribute == value)
+            use_cache = self._use_entity_cache(relationships, load_sensitive, conditions)
+            if use_cache:
+                entity_id = await self.entity_cache.get_id(conditions)
+                if entity_id is not None:
+                    entity = await self._cached_entity(session, entity_id, conditions)
+                    if entity is not None:
+                        return entity
 
-            # Add undefer option if sensitive fields need to be loaded
-            # Currently need only for password_hash
-            options = []
-            if load_sensitive and hasattr(self.model, 'password_hash'):
-                options.append(undefer(self.model.password_hash))
-            
-            filters.append(self.model.deleted_at == None)  # Exclude soft-deleted records
-            
-            statement = select(self.model).options(*options).where(and_(*filters))
-            statement = self._apply_eager_loading(statement, relationships)
+            shape = conditions_shape(conditions)
+
+            def build():
+                filters = [condition_filter(getattr(self.model, column), column, value_shape) for column, value_shape in shape]
+                filters.append(self.model.deleted_at == None)  # Exclude soft-deleted records
+                statement = select(self.model).options(*self._sensitive_options(load_sensitive)).where(and_(*filters))
+                return self._apply_eager_loading(statement, relationships)
+
+            key = (self.model, 'where_first', shape, relationships_shape(relationships), load_sensitive)
+            statement = self.statement_cache.get(key, build)
             
-            result = await session.execute(statement)
-            return result.scalars().first()
+            result = await session.execute(statement, condition_params(conditions))
+            entity = result.scalars().first()
+
+            if use_cache and entity is not None:
+                await self.entity_cache.set(entity, conditions)
+            return entity
         except Exception as e:
             logger.error(f'{str(e)}')
             raise RepositoryError(f'Failed in {self.model.__name__}') from e
 
-    async def where_all(self, session: AsyncSession, conditions: dict = {}, relationships: Optional[List[dict]] = [], load_sensitive: bool = False):
+    async def where_all(
+        self,
+        session: AsyncSession,
+        conditions: dict = {},
+        relationships: Optional[List[dict]] = [],
+        load_sensitive: bool = False,
+        columns: Optional[List[str]] = None,
+    ):
         try:
             filters = []
             for column, value in conditions.items():
@@ -257,7 +723,8 @@ class BaseRepository:
                 
             filters.append(self.model.deleted_at == None)  # Exclude soft-deleted records
             
-            statement = select(self.model).where(and_(*filters))
+            statement = select(self.model).options(*options).where(and_(*filters))
+            statement = self._apply_projection(statement, columns)
             statement = self._apply_eager_loading(statement, relationships)
             
             result = await session.execute(statement)
@@ -271,8 +738,9 @@ class BaseRepository:
             valid_attributes = self._get_valid_attributes(attributes)
             entity = self.model(**valid_attributes)
             session.add(entity)
-            await session.commit()
-            await session.refresh(entity)
+            await self._commit(session)
+            await self._invalidate_counts(session)
+            await self._refresh_expired(session, entity)
             return entity
         except IntegrityError as e:
             logger.error(f'{str(e)}')
@@ -298,8 +766,10 @@ class BaseRepository:
                 valid_attributes = self._get_valid_attributes(attributes)
                 for key, value in valid_attributes.items():
                     setattr(entity, key, value)
-                await session.commit()
-                await session.refresh(entity)
+                await self._commit(session)
+                await self._invalidate_counts(session)
+                await self._invalidate_entities([id], session)
+                await self._refresh_expired(session, entity)
                 return entity
             return None
         except IntegrityError as e:
@@ -330,11 +800,14 @@ class BaseRepository:
             result = await session.execute(query)
             entity = result.scalars().first()
             if entity:
+                entity_id = entity.id
                 valid_attributes = self._get_valid_attributes(attributes)
                 for key, value in valid_attributes.items():
                     setattr(entity, key, value)
-                await session.commit()
-                await session.refresh(entity)
+                await self._commit(session)
+                await self._invalidate_counts(session)
+                await self._invalidate_entities([entity_id], session)
+                await self._refresh_expired(session, entity)
                 return entity
             return None
         except IntegrityError as e:
@@ -354,22 +827,45 @@ class BaseRepository:
             logger.error(f'{str(e)}')
             raise RepositoryError(f'Failed in {self.model.__name__}') from e
         
-    async def update_where_all(self, session: AsyncSession, where_conditions, attributes: dict):
+    async def update_where_all(self, session: AsyncSession, where_conditions, attributes: dict, return_entities: bool = True):
+        """
+        Set-based UPDATE ... WHERE for every matching row.
+        With return_entities the updated rows are re-read in one batched query (RETURNING where the
+        dialect supports it, otherwise the matching ids are selected first) and returned, or None if nothing matched.
+        Without it only the affected row count is returned and no rows are loaded.
+        """
         try:
             conditions = [getattr(self.model, key) == value for key, value in where_conditions.items()]
-            
-            query = select(self.model).where(*conditions)
-            result = await session.execute(query)
-            entities = result.scalars().all()
+            valid_attributes = self._get_valid_bulk_attributes(attributes)
+
+            if not return_entities:
+                result = await session.execute(update(self.model).where(*conditions).values(valid_attributes))
+                await self._commit(session)
+                await self._invalidate_counts(session)
+                await self._invalidate_entities(None, session)
+                return result.rowcount
+
+            if session.get_bind().dialect.update_returning:
+                statement = update(self.model).where(*conditions).values(valid_attributes).returning(self.model)
+                result = await session.execute(statement, execution_options={'populate_existing': True})
+                entities = result.scalars().all()
+                await self._commit(session)
+            else:
+                # Conditions may no longer match after the update, so pin the affected rows by id
+                result = await session.execute(select(self.model.id).where(*conditions))
+                ids = result.scalars().all()
+                if not ids:
+                    return None
+                await session.execute(update(self.model).where(self.model.id.in_(ids)).values(valid_attributes))
+                await self._commit(session)
+                result = await session.execute(
+                    select(self.model).where(self.model.id.in_(ids)).execution_options(populate_existing=True)
+                )
+                entities = result.scalars().all()
 
             if entities:
-                valid_attributes = self._get_valid_attributes(attributes)
-                for entity in entities:
-                    for key, value in valid_attributes.items():
-                        setattr(entity, key, value)
-                await session.commit()
-                for entity in entities:
-                    await session.refresh(entity)
+                await self._invalidate_counts(session)
+                await self._invalidate_entities([entity.id for entity in entities], session)
                 return entities
             return None
         except IntegrityError as e:
@@ -389,12 +885,193 @@ class BaseRepository:
             logger.error(f'{str(e)}')
             raise RepositoryError(f'Failed in {self.model.__name__}') from e
 
+    def _get_valid_bulk_attributes(self, attributes):
+        """
+        Column-only attributes for Core INSERT/UPDATE, which bypass ORM properties.
+        A write-only "password" is hashed into password_hash like the model setter does.
+        """
+        valid_attributes = {key: value for key, value in self._get_valid_attributes(attributes).items() if key != 'password'}
+        if 'password' in attributes and hasattr(self.model, 'generate_hash'):
+            valid_attributes['password_hash'] = self.model.generate_hash(attributes['password'])
+        return valid_attributes
+
+    def _chunks(self, rows: List[dict], batch_size: int):
+        for start in range(0, len(rows), batch_size):
+            yield start, rows[start:start + batch_size]
+
+    def _group_by_keys(self, rows: List[dict]):
+        """Multi-row VALUES need the same columns in every row, group rows by their key set."""
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row.keys())), []).append(row)
+        return groups.values()
+
+    async def _bulk_duplicate_errors(self, session: AsyncSession, rows: List[dict], offset: int, error: IntegrityError):
+        """
+        Map a duplicate-key failure of a multi-row statement to the offending rows.
+        MySQL reports only the first duplicate, so unique columns are re-checked for the whole chunk.
+        """
+        errors = []
+        unique_columns = [column for column in self.model.__table__.columns if column.unique]
+        for column in unique_columns:
+            values = [row[column.name] for row in rows if row.get(column.name) is not None]
+            if not values:
+                continue
+            result = await session.execute(select(column).where(column.in_(values)))
+            existing = set(result.scalars().all())
+            seen = set()
+            for index, row in enumerate(rows):
+                value = row.get(column.name)
+                if value is None:
+                    continue
+                if value in existing or value in seen:
+                    errors.append({'row': offset + index, 'field': column.name, 'error': f'{column.name} already existed.'})
+                seen.add(value)
+
+        if not errors and error.orig is not None and error.orig.args:
+            match = DUPLICATE_ENTRY_PATTERN.search(str(error.orig.args[-1]))
+            if match:
+                column = match.group('key').split('.')[-1]
+                for index, row in enumerate(rows):
+                    if str(row.get(column)) == match.group('value'):
+                        errors.append({'row': offset + index, 'field': column, 'error': f'{column} already existed.'})
+        return errors
+
+    def _is_duplicate_error(self, error: IntegrityError) -> bool:
+        if error.orig is None or not error.orig.args:
+            return False
+        code = error.orig.args[0]
+        # MySQL 1062 duplicate entry, SQLite reports UNIQUE constraint failures by message
+        return str(code) == '1062' or 'UNIQUE constraint failed' in str(code)
+
+    async def _execute_bulk(
+        self, session: AsyncSession, rows: List[dict], batch_size: int, build_statements, invalidate_entities: bool = True
+    ):
+        """
+        Run build_statements(chunk) for every chunk in one transaction and return the affected row count.
+        Duplicate keys roll back the whole batch and raise ValidationException with one error per row.
+        In a unit-of-work session the batch runs in a savepoint, a failure only undoes the batch and
+        leaves the request's earlier writes in place.
+        """
+        affected = 0
+        offset = 0
+        chunk = []
+        savepoint = await session.begin_nested() if self._unit_of_work(session) else None
+        try:
+            for offset, chunk in self._chunks(rows, batch_size):
+                for statement in build_statements(chunk):
+                    result = await session.execute(statement)
+                    affected += result.rowcount
+            if savepoint is not None:
+                await savepoint.commit()
+            await self._commit(session)
+            await self._invalidate_counts(session)
+            if invalidate_entities:
+                await self._invalidate_entities(None, session)
+            return affected
+        except IntegrityError as e:
+            logger.error(f'{str(e)}')
+            await self._rollback_bulk(session, savepoint)
+            if self._is_duplicate_error(e):
+                errors = await self._bulk_duplicate_errors(session, chunk, offset, e)
+                raise ValidationException(details={'validationErrors': errors})
+            raise RepositoryError(f'Failed in {self.model.__name__}') from e
+        except Exception as e:
+            logger.error(f'{str(e)}')
+            await self._rollback_bulk(session, savepoint)
+            raise RepositoryError(f'Failed in {self.model.__name__}') from e
+
+    async def _rollback_bulk(self, session: AsyncSession, savepoint):
+        if savepoint is None:
+            await session.rollback()
+        elif savepoint.is_active:
+            await savepoint.rollback()
+
+    async def bulk_create(self, session: AsyncSession, rows: List[dict], batch_size: int = BULK_BATCH_SIZE) -> int:
+        """
+        Insert rows with one multi-row INSERT per chunk and a single commit.
+        Returns the number of inserted rows, entities are not loaded back.
+        """
+        rows = [self._get_valid_bulk_attributes(row) for row in rows]
+
+        def build_statements(chunk):
+            return [insert(self.model).values(group) for group in self._group_by_keys(chunk)]
+
+        return await self._execute_bulk(session, rows, batch_size, build_statements, invalidate_entities=False)
+
+    async def bulk_update(self, session: AsyncSession, rows: List[dict], batch_size: int = BULK_BATCH_SIZE) -> int:
+        """
+        Update rows by id with one UPDATE ... SET col = CASE id WHEN ... END WHERE id IN (...) per chunk.
+        Each row needs an "id"; columns missing from a row keep their current value.
+        """
+        rows = [{'id': row['id'], **self._get_valid_bulk_attributes(row)} for row in rows]
+
+        def build_statements(chunk):
+            ids = [row['id'] for row in chunk]
+            columns = {key for row in chunk for key in row.keys() if key != 'id'}
+            if not columns:
+                return []
+            values = {}
+            for column_name in columns:
+                column = getattr(self.model, column_name)
+                whens = {row['id']: row[column_name] for row in chunk if column_name in row}
+                values[column_name] = case(whens, value=self.model.id, else_=column)
+            statement = (
+                update(self.model)
+                .where(self.model.id.in_(ids), self.model.deleted_at == None)
+                .values(values)
+                .execution_options(synchronize_session=False)
+            )
+            return [statement]
+
+        return await self._execute_bulk(session, rows, batch_size, build_statements)
+
+    async def bulk_upsert(
+        self,
+        session: AsyncSession,
+        rows: List[dict],
+        update_columns: Optional[List[str]] = None,
+        conflict_columns: Optional[List[str]] = None,
+        batch_size: int = BULK_BATCH_SIZE,
+    ) -> int:
+        """
+        INSERT ... ON DUPLICATE KEY UPDATE (MySQL) / ON CONFLICT DO UPDATE (SQLite) per chunk.
+        update_columns defaults to every given column except id and created_at,
+        conflict_columns is only used by SQLite and defaults to the primary key.
+        Note MySQL counts 2 affected rows for an updated row and 1 for an inserted one.
+        """
+        rows = [self._get_valid_bulk_attributes(row) for row in rows]
+        dialect_name = session.get_bind().dialect.name
+        conflict_columns = conflict_columns or [column.name for column in self.model.__table__.primary_key.columns]
+
+        def build_statements(chunk):
+            statements = []
+            for group in self._group_by_keys(chunk):
+                columns = update_columns or [key for key in group[0].keys() if key not in ('id', 'created_at')]
+                if dialect_name == 'mysql':
+                    statement = mysql_insert(self.model).values(group)
+                    statement = statement.on_duplicate_key_update({column: statement.inserted[column] for column in columns})
+                elif dialect_name == 'sqlite':
+                    statement = sqlite_insert(self.model).values(group)
+                    statement = statement.on_conflict_do_update(
+                        index_elements=conflict_columns,
+                        set_={column: statement.excluded[column] for column in columns},
+                    )
+                else:
+                    raise RepositoryError(f'Upsert is not supported for {dialect_name}')
+                statements.append(statement)
+            return statements
+
+        return await self._execute_bulk(session, rows, batch_size, build_statements)
+
     async def delete(self, session: AsyncSession, id):
         try:
             entity = await session.get(self.model, id)
             if entity:
                 await session.delete(entity)
-                await session.commit()
+                await self._commit(session)
+                await self._invalidate_counts(session)
+                await self._invalidate_entities([id], session)
                 return True
             return False
         except Exception as e:
@@ -406,7 +1083,9 @@ class BaseRepository:
             conditions = [getattr(self.model, key) == value for key, value in where_conditions.items()]
             stmt = delete(self.model).where(and_(*conditions))
             result = await session.execute(stmt)
-            await session.commit()
+            await self._commit(session)
+            await self._invalidate_counts(session)
+            await self._invalidate_entities(None, session)
             return result.rowcount
         except Exception as e:
             logger.error(f'{str(e)}')
@@ -417,7 +1096,9 @@ class BaseRepository:
             conditions = [not_(getattr(self.model, key) == value) for key, value in where_conditions.items()]
             stmt = delete(self.model).where(and_(*conditions))
             result = await session.execute(stmt)
-            await session.commit()
+            await self._commit(session)
+            await self._invalidate_counts(session)
+            await self._invalidate_entities(None, session)
             return result.rowcount
         except Exception as e:
             logger.error(f'{str(e)}')
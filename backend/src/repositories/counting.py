@@ -0,0 +1,68 @@
+"""counting.py
+
+Count strategies for offset pagination totals.
+
+- exact: SELECT COUNT(*) on every call.
+- cached: exact count stored in a per-table Redis hash, keyed by a hash of the filters.
+  Repository writes drop the whole hash, the expiry only bounds staleness from writes made elsewhere.
+- estimated: the optimizer's row estimate (MySQL EXPLAIN), exact count on other dialects.
+"""
+
+import hashlib
+import json
+import logging
+from time import time
+from typing import Any, Optional
+
+from src.db.redis import RedisClient
+
+logger = logging.getLogger(__name__)
+
+COUNT_EXACT = 'exact'
+COUNT_CACHED = 'cached'
+COUNT_ESTIMATED = 'estimated'
+COUNT_STRATEGIES = (COUNT_EXACT, COUNT_CACHED, COUNT_ESTIMATED)
+
+COUNT_CACHE_EXPIRY = 60
+
+
+class CountCache:
+    def __init__(self, namespace: str, redis_client: RedisClient = None, expiry: int = COUNT_CACHE_EXPIRY):
+        self.namespace = namespace
+        self.redis_client = redis_client or RedisClient()
+        self.expiry = expiry
+
+    @property
+    def key(self) -> str:
+        return f'count:{self.namespace}'
+
+    @staticmethod
+    def field(filters: Any) -> str:
+        return hashlib.sha1(json.dumps(filters, sort_keys=True, default=str).encode()).hexdigest()
+
+    async def get(self, filters: Any) -> Optional[int]:
+        try:
+            value = await self.redis_client.hget(self.key, self.field(filters))
+        except Exception as e:
+            logger.warning(f'Count cache read failed for {self.key}: {str(e)}')
+            return None
+        if value is None:
+            return None
+
+        cached = json.loads(value)
+        if time() - cached['at'] > self.expiry:
+            return None
+        return cached['total']
+
+    async def set(self, filters: Any, total: int):
+        value = json.dumps({'total': total, 'at': time()})
+        try:
+            await self.redis_client.hset(self.key, self.field(filters), value, expiry=self.expiry)
+        except Exception as e:
+            logger.warning(f'Count cache write failed for {self.key}: {str(e)}')
+
+    async def invalidate(self):
+        try:
+            await self.redis_client.delete(self.key)
+        except Exception as e:
+            logger.warning(f'Count cache invalidation failed for {self.key}: {str(e)}')
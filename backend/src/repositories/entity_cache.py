@@ -0,0 +1,204 @@
+"""entity_cache.py
+
+Opt-in read-through cache for single-row repository lookups.
+
+Two tiers hold plain column dicts, never ORM instances:
+- an in-process TTL/LRU tier, shared per namespace inside the worker, with a short TTL that bounds
+  how long other workers can serve an entry after an invalidation
+- a Redis tier with versioned keys: entity:<namespace>:<schema>:<generation>:<id>
+
+Writes by id delete that id in both tiers. Set-based writes (update_where_*, delete_where*, bulk)
+bump the namespace generation, which orphans every Redis key of the namespace at once.
+Lookups by conditions (where_first) cache only the matching id and are re-validated against the row.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import inspect
+
+from src.db.redis import RedisClient
+
+logger = logging.getLogger(__name__)
+
+ENTITY_CACHE_LOCAL_TTL = 5
+ENTITY_CACHE_LOCAL_MAXSIZE = 1024
+
+# Tiers and counters are shared by every repository instance of a namespace within the worker,
+# so an invalidation through one service is seen by the others
+_local_tiers: Dict[str, TTLCache] = {}
+_counters: Dict[str, Dict[str, int]] = {}
+
+
+def entity_cache_stats() -> List[dict]:
+    return [EntityCache.namespace_stats(namespace) for namespace in sorted(_local_tiers)]
+
+
+class EntityCache:
+    def __init__(
+        self,
+        model,
+        ttl: int,
+        local_ttl: int = ENTITY_CACHE_LOCAL_TTL,
+        local_maxsize: int = ENTITY_CACHE_LOCAL_MAXSIZE,
+        redis_client: RedisClient = None,
+    ):
+        self.model = model
+        self.namespace = model.__tablename__
+        self.ttl = ttl
+        self.redis_client = redis_client or RedisClient()
+        self.local = _local_tiers.setdefault(self.namespace, TTLCache(maxsize=local_maxsize, ttl=local_ttl))
+        self.sensitive_fields = getattr(model, '__sensitive_fields__', set())
+        # Table columns, inspecting the mapper here would configure it before related models are imported
+        self.columns = {column.key: column for column in model.__table__.columns}
+        # Column layout is part of the key so a schema change never reads old shaped entries
+        self.schema_version = hashlib.sha1(','.join(sorted(self.columns)).encode()).hexdigest()[:8]
+        self.counters = _counters.setdefault(self.namespace, {'local_hits': 0, 'redis_hits': 0, 'misses': 0})
+
+    @staticmethod
+    def clear_local():
+        for tier in _local_tiers.values():
+            tier.clear()
+        for counters in _counters.values():
+            counters.update(local_hits=0, redis_hits=0, misses=0)
+
+    @property
+    def _generation_key(self) -> str:
+        return f'entity-generation:{self.namespace}'
+
+    def _entity_key(self, generation: int, entity_id) -> str:
+        return f'entity:{self.namespace}:{self.schema_version}:{generation}:{entity_id}'
+
+    def _lookup_key(self, generation: int, conditions: dict) -> str:
+        digest = hashlib.sha1(json.dumps(conditions, sort_keys=True, default=str).encode()).hexdigest()
+        return f'entity:{self.namespace}:{self.schema_version}:{generation}:lookup:{digest}'
+
+    async def _generation(self) -> int:
+        generation = self.local.get(self._generation_key)
+        if generation is None:
+            value = await self.redis_client.get(self._generation_key)
+            generation = int(value) if value is not None else 0
+            self.local[self._generation_key] = generation
+        return generation
+
+    def dump(self, entity) -> Optional[dict]:
+        """Column values of a fully loaded entity, None if any non-sensitive column is unloaded."""
+        state = inspect(entity)
+        data = {}
+        for key in self.columns:
+            if key in self.sensitive_fields:
+                continue
+            if key not in state.dict:
+                # A partial entry would come back with expired attributes that lazy load on access
+                return None
+            value = state.dict[key]
+            data[key] = value.isoformat() if isinstance(value, (datetime, date)) else value
+        return data
+
+    def load(self, data: dict) -> dict:
+        values = {}
+        for key, value in data.items():
+            if isinstance(value, str):
+                try:
+                    python_type = self.columns[key].type.python_type
+                except NotImplementedError:
+                    python_type = None
+                if python_type is datetime:
+                    value = datetime.fromisoformat(value)
+                elif python_type is date:
+                    value = date.fromisoformat(value)
+            values[key] = value
+        return values
+
+    async def get(self, entity_id) -> Optional[dict]:
+        local_key = ('id', str(entity_id))
+        data = self.local.get(local_key)
+        if data is not None:
+            self.counters['local_hits'] += 1
+            return self.load(data)
+
+        try:
+            value = await self.redis_client.get(self._entity_key(await self._generation(), entity_id))
+        except Exception as e:
+            logger.warning(f'Entity cache read failed for {self.namespace}: {str(e)}')
+            value = None
+        if value is None:
+            self.counters['misses'] += 1
+            return None
+
+        self.counters['redis_hits'] += 1
+        data = json.loads(value)
+        self.local[local_key] = data
+        return self.load(data)
+
+    async def get_id(self, conditions: dict) -> Optional[Any]:
+        local_key = ('lookup', json.dumps(conditions, sort_keys=True, default=str))
+        entity_id = self.local.get(local_key)
+        if entity_id is not None:
+            return entity_id
+
+        try:
+            value = await self.redis_client.get(self._lookup_key(await self._generation(), conditions))
+        except Exception as e:
+            logger.warning(f'Entity cache read failed for {self.namespace}: {str(e)}')
+            value = None
+        if value is None:
+            self.counters['misses'] += 1
+            return None
+
+        entity_id = json.loads(value)
+        self.local[local_key] = entity_id
+        return entity_id
+
+    async def set(self, entity, conditions: Optional[dict] = None):
+        data = self.dump(entity)
+        if data is None or data.get('id') is None:
+            return
+        entity_id = data['id']
+
+        self.local[('id', str(entity_id))] = data
+        if conditions:
+            self.local[('lookup', json.dumps(conditions, sort_keys=True, default=str))] = entity_id
+        try:
+            generation = await self._generation()
+            values = {self._entity_key(generation, entity_id): json.dumps(data)}
+            if conditions:
+                values[self._lookup_key(generation, conditions)] = json.dumps(entity_id)
+            await self.redis_client.mset(values, expiry=self.ttl)
+        except Exception as e:
+            logger.warning(f'Entity cache write failed for {self.namespace}: {str(e)}')
+
+    async def invalidate(self, entity_ids=None):
+        """Drop the given ids, or every entry of the namespace when entity_ids is None."""
+        try:
+            if entity_ids is None:
+                self.local.clear()
+                value = await self.redis_client.incr(self._generation_key)
+                self.local[self._generation_key] = int(value)
+                return
+
+            generation = await self._generation()
+            for entity_id in entity_ids:
+                self.local.pop(('id', str(entity_id)), None)
+            await self.redis_client.delete_many([self._entity_key(generation, entity_id) for entity_id in entity_ids])
+        except Exception as e:
+            logger.warning(f'Entity cache invalidation failed for {self.namespace}: {str(e)}')
+
+    def stats(self) -> dict:
+        return self.namespace_stats(self.namespace)
+
+    @staticmethod
+    def namespace_stats(namespace: str) -> dict:
+        counters = _counters.get(namespace, {'local_hits': 0, 'redis_hits': 0, 'misses': 0})
+        lookups = sum(counters.values())
+        hits = counters['local_hits'] + counters['redis_hits']
+        return {
+            'namespace': namespace,
+            **counters,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'local_size': len(_local_tiers.get(namespace, ())),
+        }
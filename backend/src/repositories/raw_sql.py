@@ -0,0 +1,185 @@
+"""raw_sql.py
+
+Parsing and caching helpers for the repository raw SQL paginators.
+
+Raw queries are scanned once for their top-level clauses (parentheses, quotes and comments aware),
+so ORDER BY inside subqueries or window clauses is never mistaken for the outer one.
+Parsed queries and their text() constructs are cached by SQL string, hot report queries are not rebuilt per request.
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+RAW_SQL_CACHE_SIZE = 256
+TOTAL_COUNT_COLUMN = '_total_count'
+CURSOR_PARAM_PREFIX = '_cursor_'
+
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+_TOP_LEVEL_KEYWORDS = {'SELECT', 'DISTINCT', 'FROM', 'ORDER', 'LIMIT', 'UNION', 'INTERSECT', 'EXCEPT'}
+_COMPOUND_KEYWORDS = {'UNION', 'INTERSECT', 'EXCEPT'}
+
+
+def scan_top_level_keywords(sql: str) -> List[Tuple[str, int]]:
+    """(KEYWORD, position) of the clause keywords outside parentheses, literals and comments."""
+    keywords = []
+    depth = 0
+    index = 0
+    length = len(sql)
+    while index < length:
+        char = sql[index]
+        if char in ('\'', '"', '`'):
+            index += 1
+            while index < length:
+                if sql[index] == '\\' and char != '`':
+                    index += 2
+                    continue
+                if sql[index] == char:
+                    # Doubled quotes are an escaped quote, not the end of the literal
+                    if index + 1 < length and sql[index + 1] == char:
+                        index += 2
+                        continue
+                    break
+                index += 1
+        elif sql.startswith('--', index) or char == '#':
+            newline = sql.find('\n', index)
+            index = length if newline == -1 else newline
+        elif sql.startswith('/*', index):
+            end = sql.find('*/', index + 2)
+            index = length if end == -1 else end + 1
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif (char.isalpha() or char == '_') and (index == 0 or not (sql[index - 1].isalnum() or sql[index - 1] in '_$.')):
+            end = index
+            while end < length and (sql[end].isalnum() or sql[end] in '_$'):
+                end += 1
+            word = sql[index:end].upper()
+            if depth == 0 and word in _TOP_LEVEL_KEYWORDS:
+                keywords.append((word, index))
+            index = end
+            continue
+        index += 1
+    return keywords
+
+
+class RawQuery:
+    def __init__(self, sql: str):
+        self.sql = sql.strip().rstrip(';').rstrip()
+        keywords = scan_top_level_keywords(self.sql)
+        words = [word for word, _ in keywords]
+
+        self.is_compound = any(word in _COMPOUND_KEYWORDS for word in words)
+        self.is_distinct = 'SELECT' in words and words.index('SELECT') + 1 < len(words) and words[words.index('SELECT') + 1] == 'DISTINCT'
+        self.has_limit = 'LIMIT' in words
+
+        self.from_position = None
+        if 'SELECT' in words:
+            select_index = words.index('SELECT')
+            self.from_position = next((position for word, position in keywords[select_index:] if word == 'FROM'), None)
+
+        order_positions = [position for word, position in keywords if word == 'ORDER']
+        self.order_position = order_positions[-1] if order_positions and not self.is_compound else None
+
+    @property
+    def body(self) -> str:
+        """The query without its outer ORDER BY, unless a LIMIT makes the ordering part of the result."""
+        if self.order_position is None or self.has_limit:
+            return self.sql
+        return self.sql[:self.order_position].rstrip()
+
+    @property
+    def count_sql(self) -> str:
+        return f'SELECT COUNT(*) FROM ({self.body}) AS raw_count'
+
+    @property
+    def windowed_sql(self) -> Optional[str]:
+        """
+        The query with COUNT(*) OVER() added to its select list, so one round trip returns the page and the total.
+        None when the window would count the wrong rows (DISTINCT, UNION, an existing LIMIT).
+        """
+        if self.is_compound or self.is_distinct or self.has_limit or self.from_position is None:
+            return None
+        head, tail = self.sql[:self.from_position].rstrip(), self.sql[self.from_position:]
+        return f'{head}, COUNT(*) OVER() AS {TOTAL_COUNT_COLUMN} {tail}'
+
+
+def parse_sort(sort: Optional[str], tie_breaker: str = 'id') -> Tuple[Tuple[str, bool], ...]:
+    """
+    Parse "-created_at,title" into ((column_name, descending), ...) for the raw keyset paginator.
+    Names refer to the raw query's output columns, anything that is not a plain identifier is rejected
+    and the tie-breaker is appended so every key set is unique.
+    """
+    sort_keys = []
+    for part in (sort or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        column_name = part.lstrip('-+')
+        if not IDENTIFIER_PATTERN.match(column_name):
+            raise ValueError(f'Invalid sort column: {column_name}')
+        if column_name not in [key for key, _ in sort_keys]:
+            sort_keys.append((column_name, part.startswith('-')))
+
+    if not sort_keys:
+        sort_keys.append((tie_breaker, True))
+    elif tie_breaker not in [key for key, _ in sort_keys]:
+        sort_keys.append((tie_breaker, sort_keys[-1][1]))
+    return tuple(sort_keys)
+
+
+def _seek_sql(sort_keys: Tuple[Tuple[str, bool], ...], null_values: Tuple[bool, ...]) -> str:
+    """
+    Expanded keyset predicate (a > :c0) OR (a = :c0 AND b > :c1) OR ... over raw_page columns.
+    Output column nullability is unknown, so NULLs are handled like nullable columns:
+    they sort first, like MySQL and SQLite do.
+    """
+    def after(index):
+        column, descending = f'raw_page.{sort_keys[index][0]}', sort_keys[index][1]
+        if null_values[index]:
+            return None if descending else f'{column} IS NOT NULL'
+        if descending:
+            return f'({column} < :{CURSOR_PARAM_PREFIX}{index} OR {column} IS NULL)'
+        return f'{column} > :{CURSOR_PARAM_PREFIX}{index}'
+
+    def equal(index):
+        column = f'raw_page.{sort_keys[index][0]}'
+        if null_values[index]:
+            return f'{column} IS NULL'
+        return f'{column} = :{CURSOR_PARAM_PREFIX}{index}'
+
+    seek_filters = []
+    for index in range(len(sort_keys)):
+        seek_after = after(index)
+        if seek_after is None:
+            continue
+        seek_filters.append(' AND '.join([*(equal(i) for i in range(index)), seek_after]))
+    if not seek_filters:
+        return '1 = 0'
+    return ' OR '.join(f'({seek_filter})' for seek_filter in seek_filters)
+
+
+@lru_cache(maxsize=RAW_SQL_CACHE_SIZE)
+def keyset_sql(body: str, sort_keys: Tuple[Tuple[str, bool], ...], null_values: Optional[Tuple[bool, ...]] = None) -> str:
+    """
+    The raw query wrapped as a derived table, filtered to the rows after the cursor and ordered by the sort keys.
+    null_values marks the cursor values that are NULL, None means the first page.
+    """
+    order_by = ', '.join(f'raw_page.{column_name} {"DESC" if descending else "ASC"}' for column_name, descending in sort_keys)
+    where = f' WHERE {_seek_sql(sort_keys, null_values)}' if null_values is not None else ''
+    return f'SELECT * FROM ({body}) AS raw_page{where} ORDER BY {order_by} LIMIT :limit'
+
+
+@lru_cache(maxsize=RAW_SQL_CACHE_SIZE)
+def parse_raw_sql(sql: str) -> RawQuery:
+    return RawQuery(sql)
+
+
+@lru_cache(maxsize=RAW_SQL_CACHE_SIZE)
+def cached_text(sql: str) -> TextClause:
+    return text(sql)
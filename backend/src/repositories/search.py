@@ -0,0 +1,164 @@
+"""search.py
+
+Pluggable search backends for BaseRepository.
+
+A backend narrows a select statement to the rows matching a search term and,
+when it can rank results, returns a relevance expression (higher is better)
+that the repository can sort and keyset paginate on.
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Float, or_, literal_column, select, type_coerce, bindparam
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import table, column, Select
+
+SEARCH_MODES = ('natural', 'boolean')
+
+# Only word characters are kept, so MySQL boolean and FTS5 query operators in user input are dropped
+_SEARCH_TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize_search(search: str) -> List[str]:
+    return _SEARCH_TOKEN_PATTERN.findall(search or '')
+
+
+class SearchBackend:
+    """Base search backend, apply() returns the narrowed statement and a relevance expression or None."""
+
+    async def apply(
+        self,
+        session: AsyncSession,
+        statement: Select,
+        model,
+        search: str,
+        search_columns: List[str],
+    ) -> Tuple[Select, Optional[object]]:
+        raise NotImplementedError('Please Override this method in child classes')
+
+
+class LikeSearchBackend(SearchBackend):
+    """ILIKE '%term%' over each column. Works everywhere, but can't use an index."""
+
+    async def apply(self, session, statement, model, search, search_columns):
+        search_filters = []
+        for col_name in search_columns:
+            if hasattr(model, col_name):
+                column_attr = getattr(model, col_name)
+                search_filters.append(column_attr.ilike(f'%{search}%'))
+        if search_filters:
+            statement = statement.where(or_(*search_filters))
+        return statement, None
+
+
+class MySQLFullTextSearchBackend(SearchBackend):
+    """
+    MATCH (columns) AGAINST (term) using a FULLTEXT index on exactly the searched columns.
+    `boolean` mode requires every word and treats it as a prefix, which suits search-as-you-type.
+    """
+
+    def __init__(self, mode: str = 'natural'):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f'Unsupported search mode: {mode}')
+        self.mode = mode
+
+    def build_query(self, search: str) -> Optional[str]:
+        tokens = tokenize_search(search)
+        if not tokens:
+            return None
+        if self.mode == 'boolean':
+            return ' '.join(f'+{token}*' for token in tokens)
+        return ' '.join(tokens)
+
+    async def apply(self, session, statement, model, search, search_columns):
+        query = self.build_query(search)
+        if query is None:
+            return statement, None
+
+        columns = [getattr(model, col_name) for col_name in search_columns if hasattr(model, col_name)]
+        match_expression = match(*columns, against=bindparam('search_query', query))
+        if self.mode == 'boolean':
+            match_expression = match_expression.in_boolean_mode()
+        else:
+            match_expression = match_expression.in_natural_language_mode()
+
+        return statement.where(match_expression), type_coerce(match_expression, Float)
+
+
+class SQLiteFTS5SearchBackend(SearchBackend):
+    """
+    FTS5 external content table named "<table>_fts" kept in sync by triggers,
+    see create_index_statements(). Relevance is the negated bm25 rank.
+    """
+
+    def __init__(self, mode: str = 'natural'):
+        if mode not in SEARCH_MODES:
+            raise ValueError(f'Unsupported search mode: {mode}')
+        self.mode = mode
+
+    @staticmethod
+    def fts_table_name(table_name: str) -> str:
+        return f'{table_name}_fts'
+
+    @classmethod
+    def create_index_statements(cls, table_name: str, search_columns: List[str]) -> List[str]:
+        fts_table = cls.fts_table_name(table_name)
+        column_list = ', '.join(search_columns)
+        new_values = ', '.join(f'new.{col_name}' for col_name in search_columns)
+        old_values = ', '.join(f'old.{col_name}' for col_name in search_columns)
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({column_list}, content='{table_name}', content_rowid='id')",
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ai AFTER INSERT ON {table_name} BEGIN '
+            f'INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END',
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_ad AFTER DELETE ON {table_name} BEGIN '
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); END",
+            f'CREATE TRIGGER IF NOT EXISTS {fts_table}_au AFTER UPDATE ON {table_name} BEGIN '
+            f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values}); "
+            f'INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values}); END',
+            f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')",
+        ]
+
+    def build_query(self, search: str) -> Optional[str]:
+        tokens = tokenize_search(search)
+        if not tokens:
+            return None
+        if self.mode == 'boolean':
+            return ' AND '.join(f'"{token}"*' for token in tokens)
+        return ' OR '.join(f'"{token}"' for token in tokens)
+
+    async def apply(self, session, statement, model, search, search_columns):
+        query = self.build_query(search)
+        if query is None:
+            return statement, None
+
+        fts_table = self.fts_table_name(model.__tablename__)
+        fts = table(fts_table, column('rowid'), column('rank'))
+        matches = (
+            select(fts.c.rowid.label('rowid'), fts.c.rank.label('rank'))
+            .where(literal_column(fts_table).op('MATCH')(bindparam('search_query', query)))
+            .subquery()
+        )
+        statement = statement.join(matches, matches.c.rowid == model.id)
+        return statement, type_coerce(-matches.c.rank, Float)
+
+
+class FullTextSearchBackend(SearchBackend):
+    """
+    Picks the full-text implementation for the session's dialect:
+    MySQL FULLTEXT in production, FTS5 on SQLite (tests), ILIKE anywhere else.
+    """
+
+    def __init__(self, mode: str = 'natural'):
+        self.mode = mode
+        self.backends = {
+            'mysql': MySQLFullTextSearchBackend(mode),
+            'sqlite': SQLiteFTS5SearchBackend(mode),
+        }
+        self.fallback = LikeSearchBackend()
+
+    async def apply(self, session, statement, model, search, search_columns):
+        dialect_name = session.get_bind().dialect.name
+        backend = self.backends.get(dialect_name, self.fallback)
+        return await backend.apply(session, statement, model, search, search_columns)
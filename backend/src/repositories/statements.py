@@ -0,0 +1,86 @@
+"""statements.py
+
+Prebuilt statement templates for the hot repository queries.
+
+Building a select() tree and generating its cache key costs more than running it once SQLAlchemy has compiled it.
+Templates are built once per filter shape (which columns, which values are NULL or lists, eager loads, ...)
+with bindparam() placeholders for the values, so every later call reuses the same statement object,
+its memoized cache key and the compiled form in the engine's compiled cache.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from sqlalchemy import bindparam
+
+STATEMENT_CACHE_SIZE = 512
+
+
+class StatementCache:
+    def __init__(self, maxsize: int = STATEMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._statements = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]):
+        """The template for key, built with build() on the first call."""
+        statement = self._statements.get(key)
+        if statement is not None:
+            self._statements.move_to_end(key)
+            self.hits += 1
+            return statement
+
+        self.misses += 1
+        statement = build()
+        self._statements[key] = statement
+        if len(self._statements) > self.maxsize:
+            self._statements.popitem(last=False)
+        return statement
+
+    def clear(self):
+        self._statements.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {'size': len(self._statements), 'hits': self.hits, 'misses': self.misses}
+
+
+def value_shape(value: Any) -> str:
+    """The part of a filter value that changes the SQL: NULL => IS NULL, list => expanding IN, anything else => = :param."""
+    if value is None:
+        return 'null'
+    if isinstance(value, (list, tuple, set)):
+        return 'list'
+    return 'value'
+
+
+def conditions_shape(conditions: dict) -> tuple:
+    return tuple((column, value_shape(value)) for column, value in conditions.items())
+
+
+def relationships_shape(relationships: Optional[list]) -> tuple:
+    return tuple((rel.get('relation'), tuple(rel.get('columns', []))) for rel in relationships or [])
+
+
+def condition_param(column: str) -> str:
+    return f'where_{column}'
+
+
+def condition_filter(column_attribute, column: str, shape: str):
+    """Filter with a bindparam placeholder for a single condition of the given value shape."""
+    if shape == 'null':
+        return column_attribute.is_(None)
+    if shape == 'list':
+        return column_attribute.in_(bindparam(condition_param(column), expanding=True))
+    return column_attribute == bindparam(condition_param(column))
+
+
+def condition_params(conditions: dict) -> dict:
+    """Execution parameters matching the placeholders of condition_filter()."""
+    return {
+        condition_param(column): list(value) if isinstance(value, (tuple, set)) else value
+        for column, value in conditions.items()
+        if value is not None
+    }
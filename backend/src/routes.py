@@ -1,6 +1,7 @@
 from src.modules.auth.routes import AuthRoute
 from src.modules.user.routes import UserRoute
 from src.modules.task.routes import TaskRoute
+from src.modules.system.routes import SystemRoute
 
 __all__ = ['routes']
 
@@ -8,4 +9,5 @@ routes = [
     AuthRoute().base,
     UserRoute().base,
     TaskRoute().base,
+    SystemRoute().base,
 ]
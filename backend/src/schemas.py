@@ -27,6 +27,7 @@ class CursorPaginationParams(BaseModel):
     limit: int = Field(10, ge=1, le=100, description='Number of items to fetch per request')
     search: Optional[str] = None
     sort: Optional[str] = None
+    fields: Optional[str] = Field(None, description='Comma separated response fields, e.g. title,status,priority (id is always included)')
 
 
 async def validate_foreign_exitence(db_session, id_model_pair:list[dict]):    
@@ -6,7 +6,15 @@ from sqlalchemy.pool import StaticPool
 from sqlalchemy import text
 from datetime import datetime
 
+from contextlib import contextmanager
+
+from src.db.core import sessionmanager
+from src.db.instrumentation import install as install_query_instrumentation, track_queries
+from src.db.redis import redismanager, token_blocklist
+from src.helpers.ratelimiter import rate_limiter
 from src.models import Base
+from src.repositories.search import SQLiteFTS5SearchBackend
+from src.repositories.entity_cache import EntityCache
 from src.modules.user.models import User
 from src.modules.task.models import Task
 from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLEnum
@@ -59,6 +67,18 @@ class TaskTestModel(Base):
     deleted_at = Column(DateTime)
 
 
+install_query_instrumentation()
+
+
+@contextmanager
+def assert_max_queries(max_queries: int):
+    """Fail when the block executes more than max_queries SQL statements, e.g. a refresh() per entity"""
+    with track_queries() as stats:
+        yield stats
+    statements = '\n'.join(f'{times}x {statement}' for statement, times in stats.statements.most_common())
+    assert stats.count <= max_queries, f'Expected at most {max_queries} queries, got {stats.count}:\n{statements}'
+
+
 @pytest.fixture(scope="session")
 def event_loop():
     """Create an instance of the default event loop for the test session."""
@@ -67,6 +87,31 @@ def event_loop():
     loop.close()
 
 
+@pytest.fixture(autouse=True)
+async def reset_redis():
+    """
+    Every test runs on its own event loop, the shared Redis pool and what is bound to it
+    (pooled connections, the registered GCRA script, auto batches) must not outlive the test that opened them
+    """
+    yield
+    try:
+        await token_blocklist.stop()
+    except RuntimeError:
+        # Started by an app lifespan on a loop that is already closed
+        token_blocklist._listener = None
+    await redismanager.close()
+    rate_limiter._script = None
+    for client in (rate_limiter.redis_client, token_blocklist.redis_client, sessionmanager.pins.redis_client):
+        client._pending.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_entity_cache():
+    """Every test gets a fresh in-memory database, so entities cached by an earlier test must not leak"""
+    EntityCache.clear_local()
+    yield
+
+
 @pytest.fixture
 async def test_engine():
     """Create an in-memory SQLite async engine for testing"""
@@ -80,6 +125,9 @@ async def test_engine():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
         await conn.execute(text("PRAGMA foreign_keys=ON"))
+        # FTS5 stand-in for the MySQL FULLTEXT index on tasks (title, description)
+        for statement in SQLiteFTS5SearchBackend.create_index_statements('test_tasks', ['title', 'description']):
+            await conn.execute(text(statement))
     
     yield engine
     
@@ -0,0 +1,630 @@
+import pytest
+from unittest.mock import patch
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import TimeoutError as SQLAlchemyTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.db.core import sessionmanager, LazySession, SESSION_UNUSED, SESSION_IDLE, SESSION_COMMITTED, SESSION_SKIPPED
+from src.config import Config
+from src.db.pool import pool_sizing
+from src.db.redis import redismanager
+from src.db.routing import PrimaryPins
+from src.exceptions import AppException, ValidationException
+from src.models import Base
+from src.repositories import BaseRepository
+from src.repositories.base import RepositoryError
+from src.repositories.counting import CountCache, COUNT_EXACT, COUNT_CACHED, COUNT_ESTIMATED
+from src.repositories.entity_cache import EntityCache
+from src.modules.task.models import Task
+from src.modules.task.repositories import TaskRepository
+from src.modules.user.models import User
+from src.utils import encode_cursor, decode_cursor
+from src.helpers.serializer import serialize_model, partial_model, projection_columns
+from src.modules.task.schemas import TaskResponseModel
+from src.tests.conftest import TaskTestModel, UserTestModel, assert_max_queries
+
+
+class InMemoryRedisClient:
+    """Dict backed stand-in for the RedisClient calls used by CountCache and EntityCache"""
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, name):
+        return self.data.get(name)
+
+    async def set(self, name, value, expiry=None):
+        self.data[name] = value
+
+    async def incr(self, name):
+        self.data[name] = int(self.data.get(name, 0)) + 1
+        return self.data[name]
+
+    async def hget(self, name, key):
+        return self.data.get(name, {}).get(key)
+
+    async def hset(self, name, key, value, expiry=None):
+        self.data.setdefault(name, {})[key] = value
+
+    async def delete(self, name):
+        self.data.pop(name, None)
+
+    async def mset(self, mapping, expiry=None):
+        self.data.update(mapping)
+
+    async def delete_many(self, names):
+        return sum(self.data.pop(name, None) is not None for name in names)
+
+
+class TestRepositoryLevel:
+    @pytest.fixture
+    async def sample_tasks(self, db_session, test_user):
+        priorities = ['HIGH', 'LOW', 'MEDIUM', 'HIGH', 'LOW', 'HIGH', 'MEDIUM', 'HIGH']
+        due_dates = [
+            datetime(2024, 1, 1), None, datetime(2024, 1, 1), None,
+            datetime(2024, 3, 1), datetime(2024, 1, 1), None, datetime(2024, 2, 1),
+        ]
+        tasks = [
+            TaskTestModel(
+                title=f'Task {index}',
+                status='TODO',
+                priority=priority,
+                due_date=due_date,
+                creator_id=test_user.id,
+            )
+            for index, (priority, due_date) in enumerate(zip(priorities, due_dates))
+        ]
+        db_session.add_all(tasks)
+        await db_session.commit()
+        return tasks
+
+    async def _collect_pages(self, repository, db_session, sort, limit=3):
+        seen = []
+        cursor = None
+        while True:
+            page = await repository.paginate_cursor(db_session, cursor=cursor, limit=limit, sort=sort)
+            seen.extend(page.items)
+            if not page.has_next:
+                return seen
+            # Round trip through the opaque token like the route does
+            cursor = decode_cursor(encode_cursor(page.next_cursor))
+
+    @pytest.mark.asyncio
+    async def test_paginate_cursor_multi_key_sort(self, db_session, sample_tasks):
+        """Multi-key keyset pagination with duplicate and NULL values visits every row exactly once, in order"""
+        repository = BaseRepository(TaskTestModel)
+
+        seen = await self._collect_pages(repository, db_session, sort='-priority,due_date')
+
+        # NULLs sort first ascending, like MySQL and SQLite
+        expected = sorted(sample_tasks, key=lambda task: (task.due_date is not None, task.due_date or datetime.min, task.id))
+        expected = sorted(expected, key=lambda task: task.priority, reverse=True)
+        assert [task.id for task in seen] == [task.id for task in expected]
+
+    @pytest.mark.asyncio
+    async def test_paginate_cursor_tie_broken_single_key(self, db_session, sample_tasks):
+        """Non-unique single-key sorts are tie-broken by id in both directions"""
+        repository = BaseRepository(TaskTestModel)
+
+        for sort in ['priority', '-priority', 'due_date', '-due_date', None]:
+            seen = await self._collect_pages(repository, db_session, sort=sort, limit=2)
+            assert sorted(task.id for task in seen) == sorted(task.id for task in sample_tasks)
+            assert len(seen) == len(sample_tasks)
+
+    @pytest.mark.asyncio
+    async def test_paginate_cursor_full_text_search(self, db_session, test_user):
+        """Full-text search excludes non-matching rows, ranks by relevance and paginates with cursors"""
+        repository = TaskRepository(TaskTestModel)
+        db_session.add_all([
+            TaskTestModel(title='Quarterly report', description='Write the report about the report numbers', creator_id=test_user.id),
+            TaskTestModel(title='Fix login bug', description='Users cannot log in', creator_id=test_user.id),
+            TaskTestModel(title='Review', description='Review the quarterly report draft', creator_id=test_user.id),
+            TaskTestModel(title='Report', description=None, creator_id=test_user.id),
+        ])
+        await db_session.commit()
+
+        seen = []
+        cursor = None
+        while True:
+            page = await repository.paginate_cursor(
+                db_session, cursor=cursor, limit=1, search='repo', search_columns=['title', 'description']
+            )
+            seen.extend(page.items)
+            if not page.has_next:
+                break
+            assert page.next_cursor['sort'] == '-relevance,-id'
+            cursor = decode_cursor(encode_cursor(page.next_cursor))
+
+        assert len(seen) == 3
+        assert 'Fix login bug' not in [task.title for task in seen]
+        # Paging through the relevance-ranked results gives the same order as a single page
+        page = await repository.paginate_cursor(db_session, limit=10, search='repo', search_columns=['title', 'description'])
+        assert [task.id for task in seen] == [task.id for task in page.items]
+
+        # Explicit sorts still apply on top of the search filter
+        page = await repository.paginate_cursor(
+            db_session, limit=10, search='quarterly report', search_columns=['title', 'description'], sort='id'
+        )
+        assert [task.title for task in page.items] == ['Quarterly report', 'Review']
+
+    @pytest.mark.asyncio
+    async def test_paginate_count_strategies(self, db_session, test_user, test_admin_user):
+        """Cached totals are served from the cache until a repository write invalidates them"""
+        count_cache = CountCache('test_users', redis_client=InMemoryRedisClient())
+        repository = BaseRepository(UserTestModel, count_cache=count_cache)
+
+        page = await repository.paginate(db_session, 1, 1, count_strategy=COUNT_CACHED)
+        assert (page.total, page.count_strategy) == (2, COUNT_EXACT)
+        assert page.to_dict()['count_strategy'] == COUNT_EXACT
+
+        page = await repository.paginate(db_session, 2, 1, count_strategy=COUNT_CACHED)
+        assert (page.total, page.count_strategy) == (2, COUNT_CACHED)
+
+        await repository.create(db_session, {'name': 'Third', 'email': 'third@example.com', 'password': 'password'})
+        page = await repository.paginate(db_session, 1, 1, count_strategy=COUNT_CACHED)
+        assert (page.total, page.count_strategy) == (3, COUNT_EXACT)
+
+        # No table statistics on SQLite, estimated falls back to an exact count
+        page = await repository.paginate(db_session, 1, 1, count_strategy=COUNT_ESTIMATED)
+        assert (page.total, page.count_strategy) == (3, COUNT_EXACT)
+
+    @pytest.mark.asyncio
+    async def test_bulk_create_update_upsert(self, db_session, test_user):
+        """Bulk writes insert, update and upsert in batches"""
+        repository = BaseRepository(TaskTestModel)
+        user_id = test_user.id
+        rows = [{'title': f'Bulk {index}', 'priority': 'LOW', 'creator_id': user_id} for index in range(7)]
+
+        assert await repository.bulk_create(db_session, rows, batch_size=3) == 7
+        tasks = await repository.where_all(db_session, {'priority': 'LOW'})
+        assert len(tasks) == 7
+
+        task_ids = [task.id for task in tasks]
+        updates = [{'id': task_id, 'priority': 'HIGH'} for task_id in task_ids[:4]]
+        updates[0]['title'] = 'Renamed'
+        assert await repository.bulk_update(db_session, updates, batch_size=3) == 4
+        db_session.expire_all()
+        high = await repository.where_all(db_session, {'priority': 'HIGH'})
+        assert len(high) == 4
+        assert 'Renamed' in [task.title for task in high]
+        # Columns missing from a row are left untouched
+        assert sorted(task.title for task in high if task.title != 'Renamed') == ['Bulk 1', 'Bulk 2', 'Bulk 3']
+
+        upserts = [
+            {'id': task_ids[0], 'title': 'Upserted', 'priority': 'MEDIUM', 'creator_id': user_id},
+            {'title': 'Inserted', 'priority': 'MEDIUM', 'creator_id': user_id},
+        ]
+        await repository.bulk_upsert(db_session, upserts, update_columns=['title', 'priority'])
+        db_session.expire_all()
+        medium = await repository.where_all(db_session, {'priority': 'MEDIUM'})
+        assert sorted(task.title for task in medium) == ['Inserted', 'Upserted']
+
+    @pytest.mark.asyncio
+    async def test_bulk_create_duplicate_rows(self, db_session, test_user):
+        """Duplicate keys roll back the batch and are reported per row"""
+        repository = BaseRepository(UserTestModel)
+        rows = [
+            {'email': 'new@example.com', 'password': 'password'},
+            {'email': test_user.email, 'password': 'password'},
+            {'email': 'new@example.com', 'password': 'password'},
+        ]
+
+        with pytest.raises(ValidationException) as exc_info:
+            await repository.bulk_create(db_session, rows)
+
+        errors = exc_info.value.details['validationErrors']
+        assert [(error['row'], error['field']) for error in errors] == [(1, 'email'), (2, 'email')]
+        assert await repository.where_first(db_session, {'email': 'new@example.com'}) is None
+
+    @pytest.mark.asyncio
+    async def test_bulk_create_unit_of_work_savepoint(self, test_engine, test_user):
+        """In a unit-of-work session a failed batch rolls back to its savepoint, the request's earlier writes commit"""
+        session_maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        repository = BaseRepository(UserTestModel)
+
+        def unit_of_work_session():
+            session = session_maker()
+            session.info['unit_of_work'] = True
+            return session
+
+        lazy_session = LazySession(unit_of_work_session)
+        await repository.create(lazy_session, {'name': 'Kept', 'email': 'kept@example.com', 'password': 'password'})
+        with pytest.raises(ValidationException):
+            await repository.bulk_create(lazy_session, [
+                {'email': 'batch@example.com', 'password': 'password'},
+                {'email': test_user.email, 'password': 'password'},
+            ])
+        assert await repository.bulk_create(lazy_session, [{'email': 'retried@example.com', 'password': 'password'}]) == 1
+        assert await lazy_session.finish(True) == SESSION_COMMITTED
+        await lazy_session.close()
+
+        async with session_maker() as session:
+            emails = {user.email for user in await repository.where_all(session, {})}
+        assert {'kept@example.com', 'retried@example.com'} <= emails
+        assert 'batch@example.com' not in emails
+
+    @pytest.mark.asyncio
+    async def test_update_where_all_set_based(self, db_session, sample_tasks):
+        """update_where_all updates every match in one statement, returning entities or just a count"""
+        repository = BaseRepository(TaskTestModel)
+
+        entities = await repository.update_where_all(db_session, {'priority': 'HIGH'}, {'status': 'DONE'})
+        assert len(entities) == 4
+        assert all(task.status == 'DONE' for task in entities)
+
+        # Conditions that stop matching after the update still return the affected rows
+        entities = await repository.update_where_all(db_session, {'priority': 'LOW'}, {'priority': 'MEDIUM'})
+        assert len(entities) == 2
+        assert all(task.priority == 'MEDIUM' for task in entities)
+
+        count = await repository.update_where_all(db_session, {'priority': 'MEDIUM'}, {'status': 'IN_PROGRESS'}, return_entities=False)
+        assert count == 4
+        assert await repository.update_where_all(db_session, {'title': 'missing'}, {'status': 'DONE'}) is None
+
+    @pytest.mark.asyncio
+    async def test_stream_bounded_batches(self, db_session, sample_tasks):
+        """stream() yields every row in id order and detaches consumed batches from the session"""
+        repository = BaseRepository(TaskTestModel)
+        expected_ids = sorted(task.id for task in sample_tasks)
+        db_session.expunge_all()
+
+        seen = []
+        async for task in repository.stream(db_session, batch_size=3):
+            seen.append(task.id)
+            assert len(db_session.identity_map) <= 3
+
+        assert seen == expected_ids
+        assert len(db_session.identity_map) == 0
+
+        high_ids = [task.id async for task in repository.stream(db_session, {'priority': 'HIGH'}, batch_size=2)]
+        assert high_ids == sorted(task.id for task in sample_tasks if task.priority == 'HIGH')
+
+    @pytest.mark.asyncio
+    async def test_entity_cache_read_through(self, db_session, sample_tasks):
+        """get_by_id/where_first are served from the cache until a write invalidates the entity"""
+        entity_cache = EntityCache(TaskTestModel, ttl=60, redis_client=InMemoryRedisClient())
+        repository = BaseRepository(TaskTestModel, entity_cache=entity_cache)
+        task_id = sample_tasks[0].id
+
+        assert (await repository.get_by_id(db_session, task_id)).title == 'Task 0'
+        assert entity_cache.stats()['misses'] == 1
+        db_session.expunge_all()
+
+        task = await repository.get_by_id(db_session, task_id)
+        assert (task.title, task.due_date, entity_cache.stats()['local_hits']) == ('Task 0', datetime(2024, 1, 1), 1)
+        # Cache hits are attached to the session like a loaded row
+        assert task in db_session
+
+        EntityCache.clear_local()
+        assert (await repository.get_by_id(db_session, task_id)).title == 'Task 0'
+        assert entity_cache.stats()['redis_hits'] == 1
+
+        await repository.update(db_session, task_id, {'title': 'Renamed'})
+        db_session.expunge_all()
+        assert (await repository.get_by_id(db_session, task_id)).title == 'Renamed'
+
+        # Lookups by conditions are re-validated against the cached row
+        assert (await repository.where_first(db_session, {'title': 'Task 1'})).id == sample_tasks[1].id
+        await repository.update_where_all(db_session, {'title': 'Task 1'}, {'title': 'Moved'}, return_entities=False)
+        assert await repository.where_first(db_session, {'title': 'Task 1'}) is None
+
+        await repository.delete(db_session, task_id)
+        assert await repository.get_by_id(db_session, task_id) is None
+
+    @pytest.mark.asyncio
+    async def test_paginate_by_raw_sql(self, db_session, sample_tasks):
+        """Raw SQL pages come with their total in one query and keyset-paginate in sort order"""
+        repository = BaseRepository(TaskTestModel)
+        sql = '''
+            SELECT id, title, priority, due_date,
+                   ROW_NUMBER() OVER (PARTITION BY priority ORDER BY id) AS position
+            FROM test_tasks
+            WHERE id IN (SELECT id FROM test_tasks WHERE status = :status ORDER BY id)
+            ORDER BY id DESC;
+        '''
+
+        page = await repository.paginate_by_raw_sql(db_session, sql, {'status': 'TODO'}, page=2, per_page=3)
+        assert (page.total, page.count_strategy) == (8, COUNT_EXACT)
+        assert [row['title'] for row in page.items] == ['Task 4', 'Task 3', 'Task 2']
+        assert '_total_count' not in page.items[0]
+
+        # Pages past the end still report the total, two-query mode gives the same answer
+        assert (await repository.paginate_by_raw_sql(db_session, sql, {'status': 'TODO'}, page=9, per_page=3)).total == 8
+        page = await repository.paginate_by_raw_sql(db_session, sql, {'status': 'TODO'}, page=2, per_page=3, single_query=False)
+        assert (page.total, [row['title'] for row in page.items]) == (8, ['Task 4', 'Task 3', 'Task 2'])
+
+        seen = []
+        cursor = None
+        while True:
+            page = await repository.paginate_cursor_by_raw_sql(db_session, sql, {'status': 'TODO'}, cursor=cursor, limit=3, sort='due_date')
+            seen.extend(row['id'] for row in page.items)
+            if not page.has_next:
+                break
+            cursor = decode_cursor(encode_cursor(page.next_cursor))
+
+        expected = sorted(sample_tasks, key=lambda task: (task.due_date is not None, task.due_date or datetime.min, task.id))
+        assert seen == [task.id for task in expected]
+
+        with pytest.raises(RepositoryError):
+            await repository.paginate_cursor_by_raw_sql(db_session, sql, sort='id; DROP TABLE test_tasks')
+
+    @pytest.mark.asyncio
+    async def test_statement_templates_reused(self, db_session, sample_tasks):
+        """Hot queries reuse one statement per filter shape, NULL and list values get their own shape"""
+        repository = BaseRepository(TaskTestModel)
+        BaseRepository.statement_cache.clear()
+
+        assert (await repository.get_by_id(db_session, sample_tasks[0].id)).title == 'Task 0'
+        assert (await repository.get_by_id(db_session, sample_tasks[1].id)).title == 'Task 1'
+        assert BaseRepository.statement_cache.stats() == {'size': 1, 'hits': 1, 'misses': 1}
+
+        assert (await repository.where_first(db_session, {'priority': 'LOW', 'due_date': None})).id == sample_tasks[1].id
+        assert (await repository.where_first(db_session, {'priority': 'LOW', 'due_date': datetime(2024, 3, 1)})).id == sample_tasks[4].id
+        assert (await repository.where_first(db_session, {'priority': 'HIGH', 'due_date': None})).id == sample_tasks[3].id
+        assert BaseRepository.statement_cache.stats()['size'] == 3
+
+        seen = await self._collect_pages(repository, db_session, sort='-priority,due_date', limit=2)
+        assert len(seen) == len(sample_tasks)
+        size = BaseRepository.statement_cache.stats()['size']
+        assert await self._collect_pages(repository, db_session, sort='-priority,due_date', limit=2) == seen
+        assert BaseRepository.statement_cache.stats()['size'] == size
+
+    @pytest.mark.asyncio
+    async def test_column_projection(self, db_session, sample_tasks):
+        """List queries load only the response model columns, plus id and the sort keys"""
+        repository = BaseRepository(TaskTestModel)
+        db_session.expunge_all()
+        response_model = partial_model(TaskResponseModel, 'title,status,unknown')
+        columns = projection_columns(response_model)
+        assert columns == ['id', 'title', 'status']
+
+        page = await repository.paginate_cursor(db_session, limit=3, sort='due_date', columns=columns)
+        unloaded = inspect(page.items[0]).unloaded
+        assert {'description', 'priority', 'created_at'} <= unloaded
+        assert 'due_date' not in unloaded
+        assert serialize_model(page, response_model).items[0].model_dump().keys() == {'id', 'title', 'status'}
+
+        page = await repository.paginate(db_session, 1, 3, columns=['title'])
+        assert 'description' in inspect(page.items[0]).unloaded
+        assert partial_model(TaskResponseModel) is TaskResponseModel
+
+    @pytest.mark.asyncio
+    async def test_lazy_session_outcomes(self, test_engine, test_user):
+        """Request sessions are created on first use and only commit transactions that wrote"""
+        session_maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        repository = BaseRepository(UserTestModel)
+
+        lazy_session = LazySession(session_maker)
+        assert (await lazy_session.finish(True), lazy_session.connected) == (SESSION_UNUSED, False)
+
+        lazy_session = LazySession(session_maker)
+        assert (await repository.get_by_id(lazy_session, test_user.id)).email == test_user.email
+        assert (await lazy_session.finish(True), lazy_session.connected) == (SESSION_SKIPPED, True)
+        await lazy_session.close()
+
+        lazy_session = LazySession(session_maker)
+        user = await repository.get_by_id(lazy_session, test_user.id)
+        user.name = 'Renamed'
+        assert await lazy_session.finish(True) == SESSION_COMMITTED
+        await lazy_session.close()
+
+        # Outside unit-of-work sessions repository writes commit themselves, no refresh after the commit is left open
+        lazy_session = LazySession(session_maker)
+        await repository.update(lazy_session, test_user.id, {'name': 'Again'})
+        assert await lazy_session.finish(True) == SESSION_IDLE
+        await lazy_session.close()
+
+        lazy_session = LazySession(session_maker)
+        await repository.delete_where(lazy_session, {'name': 'nobody'})
+        assert await lazy_session.finish(True) == SESSION_IDLE
+        await lazy_session.close()
+
+    @pytest.mark.asyncio
+    async def test_replica_routing(self, tmp_path):
+        """Replica sessions read from the replica until they write, failing replicas fall back to the primary"""
+        urls = {name: f'sqlite+aiosqlite:///{tmp_path / name}.db' for name in ('primary', 'replica')}
+        for name, url in urls.items():
+            engine = create_async_engine(url)
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.execute(text(f"INSERT INTO test_users (email, role, password_hash, created_at, updated_at) VALUES ('{name}@example.com', 'USER', 'x', '2024-01-01', '2024-01-01')"))
+            await engine.dispose()
+
+        repository = BaseRepository(UserTestModel)
+        broken_url = f'sqlite+aiosqlite:///{tmp_path / "missing" / "replica.db"}'
+        await sessionmanager.initialize(urls['primary'], [urls['replica'], broken_url])
+        try:
+            healthy, broken = sessionmanager.router.replicas
+            sessionmanager.router.mark_down(broken)
+
+            async with sessionmanager.new_session(use_replica=True) as session:
+                assert [user.email for user in await repository.get_all(session)] == ['replica@example.com']
+                await repository.create(session, {'email': 'new@example.com', 'password': 'password'})
+                # Reads after a write stay on the primary
+                assert len(await repository.get_all(session)) == 2
+
+            async with sessionmanager.new_session() as session:
+                assert len(await repository.get_all(session)) == 2
+
+            # A replica that fails to connect is taken out of rotation
+            sessionmanager.router.mark_up(broken)
+            sessionmanager.router.mark_down(healthy)
+            async with sessionmanager.new_session(use_replica=True) as session:
+                with pytest.raises(RepositoryError):
+                    await repository.get_all(session)
+            assert [replica['healthy'] for replica in sessionmanager.router.status()] == [False, False]
+            async with sessionmanager.new_session(use_replica=True) as session:
+                assert len(await repository.get_all(session)) == 2
+
+            assert [replica['healthy'] for replica in await sessionmanager.check_replicas()] == [True, False]
+        finally:
+            await sessionmanager.close()
+
+        # Two workers: a write on one keeps the client on the primary in the other
+        worker, other_worker = PrimaryPins(window_seconds=60), PrimaryPins(window_seconds=60)
+        await worker.pin('client')
+        assert await worker.is_pinned('client') and not await worker.is_pinned('other')
+        assert await other_worker.is_pinned('client') and not other_worker.is_pinned_locally('client')
+        assert 59 <= await redismanager.client().ttl('read-your-writes:client') <= 60
+
+        # Redis down: the pinning worker still answers from its own copy
+        with patch.object(other_worker.redis_client, 'exists', side_effect=AppException('down')), \
+             patch.object(worker.redis_client, 'set', side_effect=AppException('down')):
+            await worker.pin('offline-client')
+            assert await worker.is_pinned('offline-client')
+            assert not await other_worker.is_pinned('offline-client')
+        await redismanager.client().delete('read-your-writes:client')
+
+    @pytest.mark.asyncio
+    async def test_pool_sizing_and_stats(self, tmp_path, monkeypatch):
+        """Pools are sized from the connection budget, idle connections are pinged and checkout waits are recorded"""
+        assert pool_sizing(150, 4) == (24, 13)
+        assert pool_sizing(150, 4, pool_size=10) == (10, 27)
+        assert pool_sizing(1, 8) == (1, 0)
+
+        for key, value in {'DB_POOL_SIZE': 1, 'DB_MAX_OVERFLOW': 0, 'DB_POOL_TIMEOUT': 0.1, 'DB_POOL_PRE_PING_IDLE': 0}.items():
+            monkeypatch.setattr(Config, key, value)
+        await sessionmanager.initialize(f'sqlite+aiosqlite:///{tmp_path / "pool"}.db', [])
+        try:
+            async with sessionmanager.engine.connect() as conn:
+                await conn.execute(text('SELECT 1'))
+                assert sessionmanager.pool_stats()[0]['checked_out'] == 1
+                with pytest.raises(SQLAlchemyTimeoutError):
+                    async with sessionmanager.engine.connect():
+                        pass
+            async with sessionmanager.engine.connect() as conn:
+                await conn.execute(text('SELECT 1'))
+
+            stats = sessionmanager.stats()['pools'][0]
+            assert (stats['name'], stats['size'], stats['checked_out'], stats['timeouts']) == ('primary', 1, 0, 1)
+            assert stats['checkouts'] == sum(stats['wait_histogram'].values()) == 2
+            # The second checkout found a connection returned to the pool and pinged it first
+            assert (stats['pings'], stats['ping_failures']) == (1, 0)
+        finally:
+            await sessionmanager.close()
+
+    @pytest.mark.asyncio
+    async def test_query_budget(self, db_session, sample_tasks):
+        """Set-based and bulk writes stay within a fixed number of statements, however many rows they touch"""
+        repository = BaseRepository(TaskTestModel)
+
+        with assert_max_queries(2) as stats:
+            entities = await repository.update_where_all(db_session, {'status': 'TODO'}, {'status': 'DONE'})
+        assert len(entities) == len(sample_tasks)
+        assert stats.repeated() == []
+
+        with assert_max_queries(3):
+            await repository.bulk_update(db_session, [{'id': task.id, 'priority': 'LOW'} for task in sample_tasks])
+
+        with assert_max_queries(3):
+            page = await repository.paginate_cursor(db_session, limit=5)
+        assert len(page.items) == 5
+
+        with pytest.raises(AssertionError):
+            with assert_max_queries(1):
+                for task in sample_tasks[:2]:
+                    await repository.get_by_id(db_session, task.id)
+
+    @pytest.mark.asyncio
+    async def test_list_query_plans(self, test_engine, db_session):
+        """Every hot paginate_cursor shape on tasks is an ordered range scan of its composite index, first page and later"""
+        # BIGINT primary keys do not autoincrement in SQLite
+        user = User(id=1, name='Owner', email='owner@example.com', password_hash='x')
+        db_session.add(user)
+        await db_session.flush()
+        db_session.add_all([
+            Task(id=index + 1, title=f'Task {index}', creator_id=user.id, assignee_id=user.id, due_date=datetime(2024, 1, index + 1))
+            for index in range(4)
+        ])
+        await db_session.commit()
+
+        executed = []
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('SELECT') and 'FROM tasks' in statement:
+                executed.append((statement, parameters))
+
+        shapes = [
+            ({}, None, 'idx_tasks_active'),
+            ({}, '-created_at', 'idx_tasks_active_created'),
+            ({}, 'due_date', 'idx_tasks_active_due'),
+            ({'status': 'TODO'}, None, 'idx_tasks_status_active'),
+            ({'priority': 'MEDIUM'}, None, 'idx_tasks_priority_active'),
+            ({'assignee_id': user.id}, None, 'idx_tasks_assignee_active'),
+            ({'assignee_id': user.id}, 'due_date', 'idx_tasks_assignee_active_due'),
+        ]
+        repository = TaskRepository(Task)
+        event.listen(test_engine.sync_engine, 'before_cursor_execute', capture)
+        try:
+            for conditions, sort, index in shapes:
+                executed.clear()
+                page = await repository.paginate_cursor(db_session, limit=2, conditions=conditions, sort=sort)
+                await repository.paginate_cursor(db_session, page.next_cursor, 2, conditions, sort=sort)
+                assert len(executed) == 2
+
+                connection = await db_session.connection()
+                for statement, parameters in executed:
+                    plan = (await connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)).all()
+                    details = ' | '.join(row[-1] for row in plan)
+                    assert f'INDEX {index} ' in details, (conditions, sort, details)
+                    assert 'TEMP B-TREE' not in details, (conditions, sort, details)
+        finally:
+            event.remove(test_engine.sync_engine, 'before_cursor_execute', capture)
+
+        migration = (Path(__file__).parent.parent / 'db' / 'migrations' / '0004_list_indexes.sql').read_text()
+        for table in (Task.__table__, User.__table__):
+            for table_index in table.indexes:
+                assert f'ADD INDEX {table_index.name} ({", ".join(column.name for column in table_index.columns)})' in migration
+
+    @pytest.mark.asyncio
+    async def test_unit_of_work(self, test_engine, test_user):
+        """Unit-of-work sessions flush repository writes and commit once, without refresh queries"""
+        session_maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+        repository = BaseRepository(TaskTestModel)
+        redis_client = InMemoryRedisClient()
+        repository.count_cache = CountCache('tasks', redis_client=redis_client)
+
+        async def write(session):
+            task = await repository.create(session, {'title': 'Write', 'creator_id': test_user.id})
+            await repository.update(session, task.id, {'status': 'DONE'})
+            await repository.update_where_all(session, {'id': task.id}, {'priority': 'LOW'}, return_entities=False)
+            return task
+
+        async with session_maker() as session:
+            with assert_max_queries(3) as auto_commit:
+                await write(session)
+        assert auto_commit.commits == 3
+        # Nothing is expired after the writes, so no refresh SELECT follows them
+        assert not [statement for statement in auto_commit.statements if statement.startswith('SELECT')]
+
+        def unit_of_work_session():
+            session = session_maker()
+            session.info['unit_of_work'] = True
+            return session
+
+        lazy_session = LazySession(unit_of_work_session)
+        with assert_max_queries(3) as unit_of_work:
+            task = await write(lazy_session)
+            assert unit_of_work.commits == 0
+            assert len(lazy_session.info['after_commit']) == 3
+            # Cached again by a concurrent reader before the commit, only the after-commit invalidation removes it
+            await repository.count_cache.set({}, 1)
+            assert await repository.count_cache.get({}) == 1
+            assert await lazy_session.finish(True) == SESSION_COMMITTED
+        assert unit_of_work.commits == 1
+        assert repository.count_cache.key not in redis_client.data
+        assert 'after_commit' not in lazy_session.info
+        await lazy_session.close()
+        async with session_maker() as session:
+            assert (await repository.get_by_id(session, task.id)).status == 'DONE'
+
+        lazy_session = LazySession(unit_of_work_session)
+        task = await write(lazy_session)
+        await repository.count_cache.set({}, 1)
+        await lazy_session.finish(False)
+        assert 'after_commit' not in lazy_session.info
+        # Rolled back, the queued invalidations were dropped with the transaction
+        assert await repository.count_cache.get({}) == 1
+        await lazy_session.close()
+        async with session_maker() as session:
+            assert await repository.get_by_id(session, task.id) is None
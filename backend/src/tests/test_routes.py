@@ -27,7 +27,7 @@ class TestRouteLevel:
         """Test Public endpoints accessible, protected endpoints require auth"""
         
         # Mock database session for all tests
-        with patch('src.db.core.sessionmanager.get_session') as mock_session, \
+        with patch('src.db.core.sessionmanager.new_session') as mock_session, \
              patch('src.modules.auth.services.AuthService.signup') as mock_signup, \
              patch('src.modules.auth.services.AuthService.authenticate') as mock_auth, \
              patch('src.modules.auth.services.AuthService.exists') as mock_exists:
@@ -118,7 +118,7 @@ class TestRouteLevel:
         }
         
         # Mock the database session, redis and services
-        with patch('src.db.core.sessionmanager.get_session') as mock_session, \
+        with patch('src.db.core.sessionmanager.new_session') as mock_session, \
              patch('src.modules.auth.services.AuthService.get_user_by_email') as mock_get_user, \
              patch('src.modules.task.services.TaskService.create') as mock_create_task, \
              patch('src.db.redis.TokenBlocklist.is_token_blocked') as mock_blocklist:
@@ -188,7 +188,7 @@ class TestRouteLevel:
         }
         
         # Mock the database session, redis and services
-        with patch('src.db.core.sessionmanager.get_session') as mock_session, \
+        with patch('src.db.core.sessionmanager.new_session') as mock_session, \
              patch('src.modules.auth.services.AuthService.get_user_by_email') as mock_get_user, \
              patch('src.db.redis.TokenBlocklist.is_token_blocked') as mock_blocklist:
             
@@ -230,7 +230,7 @@ class TestRouteLevel:
         headers = {"Authorization": f"Bearer {user_token}"}
         
         # Mock the database session, redis and services
-        with patch('src.db.core.sessionmanager.get_session') as mock_session, \
+        with patch('src.db.core.sessionmanager.new_session') as mock_session, \
              patch('src.modules.auth.services.AuthService.get_user_by_email') as mock_get_user, \
              patch('src.modules.task.services.TaskService.find') as mock_find_task, \
              patch('src.modules.task.services.TaskService.update') as mock_update_task, \
@@ -319,3 +319,414 @@ class TestRouteLevel:
                     assert any(msg in response_text for msg in [
                         "not authorized", "unauthorized", "forbidden"
                     ]), f"Should indicate authorization error: {response.text}"
+
+    def test_shared_redis_pool(self):
+        """The lifespan opens one Redis pool that every request reuses, and closes it on shutdown"""
+        import time
+        from src.db.redis import redismanager, token_blocklist
+
+        with patch('src.db.core.sessionmanager.initialize', new_callable=AsyncMock), \
+             patch('src.db.core.sessionmanager.close', new_callable=AsyncMock):
+            with TestClient(app) as client:
+                redis = redismanager.redis
+                assert redis is not None
+                # The revocation listener loads the filter on its own connections, let it settle before counting
+                for _ in range(100):
+                    if token_blocklist.filter.ready:
+                        break
+                    time.sleep(0.01)
+                assert token_blocklist.filter.ready
+                for _ in range(5):
+                    assert client.get('/doc/openapi.json').status_code == 200
+                assert redismanager.redis is redis
+                stats = redismanager.stats()
+                # One connection holds the revocation subscription, sequential requests check connections in and out
+                assert stats['in_use'] == 1 and stats['available'] >= 1
+            assert redismanager.redis is None
+
+    @pytest.mark.asyncio
+    async def test_rate_limits(self):
+        """GCRA buckets admit up to the limit, weight requests by cost and report it in the response headers"""
+        from httpx import ASGITransport, AsyncClient
+        from src.db.redis import RedisClient
+        from src.helpers.ratelimiter import RateLimiter, RateLimitPolicy
+
+        keys = ['rate-limit:test:burst', 'rate-limit:test:cost', 'rate-limit:test:huge']
+        limiter = RateLimiter()
+        policy = RateLimitPolicy('test', 3, 60)
+        await RedisClient().delete_many(keys)
+        try:
+            results = [await limiter.hit('rate-limit:test:burst', policy) for _ in range(4)]
+            assert [(result.allowed, result.remaining) for result in results] == [(True, 2), (True, 1), (True, 0), (False, 0)]
+            assert 19 <= int(results[-1].headers()['Retry-After']) <= 20
+
+            assert (await limiter.hit('rate-limit:test:cost', policy, cost=2)).remaining == 1
+            assert not (await limiter.hit('rate-limit:test:cost', policy, cost=2)).allowed
+            # A request costing more than the whole bucket is never admitted
+            assert (await limiter.hit('rate-limit:test:huge', policy, cost=4)).retry_after_ms == -1
+
+            # On the test's own event loop, the pool opened above is the one the requests use
+            async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+                response = await client.get('/doc/openapi.json')
+                assert response.headers['X-RateLimit-Limit'] == '50'
+                remaining = int(response.headers['X-RateLimit-Remaining'])
+                # One token per request, unless the bucket refilled one in between
+                response = await client.get('/doc/openapi.json')
+                assert int(response.headers['X-RateLimit-Remaining']) in (remaining - 1, remaining)
+        finally:
+            await RedisClient().delete_many(keys)
+
+    @pytest.mark.asyncio
+    async def test_local_rate_limit_tier(self):
+        """Workers admit from a local allowance, report the usage in batches and overshoot by at most their allowance"""
+        import asyncio
+        from src.db.redis import RedisClient
+        from src.helpers.ratelimiter import RateLimiter, RateLimitPolicy, LocalTier
+
+        keys = ['rate-limit:test:local', 'rate-limit:test:shared']
+        await RedisClient().delete_many(keys)
+        try:
+            policy = RateLimitPolicy('test', 20, 60)
+            limiter = RateLimiter(local_tier=LocalTier(batch_size=5, fraction=0.5, sync_ms=50))
+            remaining = [(await limiter.consume('rate-limit:test:local', policy)).remaining for _ in range(7)]
+            assert remaining == [19, 18, 17, 16, 15, 14, 13]
+            assert limiter.local.stats() == {'keys': 1, 'local_hits': 5, 'syncs': 2}
+
+            for _ in range(2):
+                await limiter.consume('rate-limit:test:local', policy)
+            await asyncio.sleep(0.06)
+            await limiter.flush()
+            assert (await RateLimiter().hit('rate-limit:test:local', policy, cost=0)).remaining == 11
+
+            # Two workers sharing a bucket of 4, each may admit 2 on its own before asking Redis again
+            workers = [RateLimiter(local_tier=LocalTier(batch_size=2, fraction=1, sync_ms=1000)) for _ in range(2)]
+            small = RateLimitPolicy('test', 4, 60)
+            for worker in workers:
+                await worker.consume('rate-limit:test:shared', small)
+            admitted = 2
+            for _ in range(5):
+                for worker in workers:
+                    admitted += (await worker.consume('rate-limit:test:shared', small)).allowed
+            assert small.limit <= admitted <= small.limit + 2 * 2
+        finally:
+            await RedisClient().delete_many(keys)
+
+    @pytest.mark.asyncio
+    async def test_token_revocation_filter(self):
+        """Revocations reach every worker's local filter, checks need no Redis call and entries live as long as the token"""
+        import asyncio
+        from time import time
+        from src.db.redis import TokenBlocklist, redismanager
+
+        worker, other_worker = TokenBlocklist(), TokenBlocklist()
+        await worker.block_token('revoked-before-start', time() + 100)
+        await worker.start()
+        try:
+            for _ in range(100):
+                if worker.filter.ready:
+                    break
+                await asyncio.sleep(0.01)
+            assert worker.filter.ready and 'revoked-before-start' in worker.filter._revoked
+
+            await other_worker.block_token('revoked-by-other-worker', time() + 100)
+            for _ in range(100):
+                if worker.filter.contains('revoked-by-other-worker'):
+                    break
+                await asyncio.sleep(0.01)
+
+            with patch.object(worker.redis_client, 'exists', new_callable=AsyncMock) as mock_exists:
+                assert await worker.is_token_blocked('revoked-by-other-worker')
+                assert not await worker.is_token_blocked('never-revoked')
+            mock_exists.assert_not_called()
+
+            assert 99 <= await redismanager.client().ttl('revoked-token:revoked-by-other-worker') <= 100
+        finally:
+            await worker.stop()
+        assert not worker.filter.ready
+        assert await worker.is_token_blocked('revoked-by-other-worker')
+
+    def test_auth_context_decodes_once(self, client):
+        """The token is decoded and the user loaded once per request, however many auth dependencies a route has"""
+        from src.modules.auth.utils import decode_jwt_token
+
+        headers = {"Authorization": f"Bearer {self._create_admin_access_token()}"}
+        admin = AsyncMock()
+        admin.role = "ADMIN"
+        with patch('src.db.core.sessionmanager.new_session') as mock_session, \
+             patch('src.modules.auth.services.AuthService.get_user_by_email', new_callable=AsyncMock, return_value=admin) as mock_get_user, \
+             patch('src.db.redis.TokenBlocklist.is_token_blocked', new_callable=AsyncMock, return_value=False), \
+             patch('src.modules.auth.schemes.bearer.decode_jwt_token', wraps=decode_jwt_token) as mock_decode:
+            mock_session.return_value = AsyncMock()
+
+            # RoleChecker on the route and get_current_user in the handler both need the user
+            response = client.post("/api/v1/tasks", json={"title": "Task"}, headers=headers)
+
+        assert response.status_code not in [401, 403], response.text
+        assert mock_decode.call_count == 1
+        assert mock_get_user.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_role_claims_authorization(self, test_engine):
+        """Admin routes authorize from the signed role claim, a committed role change makes the user's earlier tokens stale"""
+        from httpx import ASGITransport, AsyncClient
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+        from src.db.core import LazySession
+        from src.db.redis import TOKEN_VERSIONS_KEY, redismanager, token_blocklist
+        from src.modules.user.schemas import UserUpdateModel
+        from src.modules.user.services import UserService
+        from src.tests.conftest import UserTestModel, assert_max_queries
+
+        headers = {"Authorization": f"Bearer {self._create_admin_access_token(user_id='9022')}"}
+        transport = ASGITransport(app=app)
+        await redismanager.client().hdel(TOKEN_VERSIONS_KEY, '9022')
+        try:
+            with patch('src.db.core.sessionmanager.new_session') as mock_session, \
+                 patch('src.modules.auth.services.AuthService.get_user_by_email', new_callable=AsyncMock) as mock_get_user:
+                async with AsyncClient(transport=transport, base_url="http://testserver") as client:
+                    response = await client.get("/api/v1/system/db", headers=headers)
+                    assert response.status_code == 200, response.text
+                    mock_get_user.assert_not_awaited()
+                    mock_session.assert_not_called()
+
+                    user_tokens = self._create_test_access_token(user_id='9023', role="USER")
+                    response = await client.get("/api/v1/system/db", headers={"Authorization": f"Bearer {user_tokens}"})
+                    assert response.status_code == 400
+                    mock_get_user.assert_not_awaited()
+
+                    session_maker = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+                    async with session_maker() as session:
+                        session.add(UserTestModel(id=9022, name='Admin', email='admin9022@example.com', role='ADMIN', password_hash='x'))
+                        await session.commit()
+
+                    def unit_of_work_session():
+                        session = session_maker()
+                        session.info['unit_of_work'] = True
+                        return session
+
+                    service = UserService(UserTestModel)
+                    demote = UserUpdateModel(name='Admin', email='admin9022@example.com', role='USER')
+
+                    # Demoted in a request that rolls back: the tokens stay valid
+                    lazy_session = LazySession(unit_of_work_session)
+                    await service.update(lazy_session, 9022, demote)
+                    await lazy_session.finish(False)
+                    await lazy_session.close()
+                    assert await token_blocklist.user_version('9022') == 0
+
+                    # Demoted through UserService.update: the version moves only once the new role is committed
+                    lazy_session = LazySession(unit_of_work_session)
+                    with assert_max_queries(2):
+                        await service.update(lazy_session, 9022, demote)
+                    assert await token_blocklist.user_version('9022') == 0
+                    response = await client.get("/api/v1/system/db", headers=headers)
+                    assert response.status_code == 200, response.text
+                    await lazy_session.finish(True)
+                    await lazy_session.close()
+                    assert await token_blocklist.user_version('9022') == 1
+                    response = await client.get("/api/v1/system/db", headers=headers)
+                    assert response.status_code == 400
+
+                    # An update leaving the role alone keeps the tokens valid
+                    async with session_maker() as session:
+                        await service.update(session, 9022, demote)
+                    assert await token_blocklist.user_version('9022') == 1
+
+                    reissued = create_jwt_token(
+                        user_data={'email': 'admin@example.com', 'user_id': '9022', 'role': 'ADMIN', 'ver': 1},
+                        expiry=timedelta(minutes=60),
+                    )
+                    response = await client.get("/api/v1/system/db", headers={"Authorization": f"Bearer {reissued}"})
+                    assert response.status_code == 200, response.text
+        finally:
+            await redismanager.client().hdel(TOKEN_VERSIONS_KEY, '9022')
+
+    @pytest.mark.asyncio
+    async def test_verified_token_cache(self):
+        """Verified claims are reused until exp, key material is parsed once and revocation is still checked per request"""
+        import jwt
+        from httpx import ASGITransport, AsyncClient
+        from time import time
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from src.modules.auth import utils
+        from src.modules.auth.tokens import JWTKeys, VerifiedTokenCache
+
+        token = self._create_admin_access_token(user_id='9024')
+        utils.verified_tokens.discard(token)
+        with patch('src.modules.auth.utils.jwt.decode', wraps=jwt.decode) as mock_decode:
+            claims = utils.decode_jwt_token(token)
+            assert utils.decode_jwt_token(token) is claims
+            assert utils.decode_jwt_token(token[:-2] + 'xx') is None
+        # The tampered token was verified (and rejected), the valid one only once
+        assert mock_decode.call_count == 2
+
+        cache = VerifiedTokenCache(maxsize=2)
+        cache.set('expired', {'exp': time() - 1})
+        assert cache.get('expired') is None and cache.stats()['size'] == 0
+        for name in ('a', 'b', 'c'):
+            cache.set(name, {'exp': time() + 60})
+        assert cache.get('a') is None and cache.get('c') is not None
+        assert VerifiedTokenCache(maxsize=0).get('a') is None
+
+        # Asymmetric keys: JWT_SECRET holds the private key, verification uses the derived public key
+        pem = ec.generate_private_key(ec.SECP256R1()).private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        ).decode()
+        keys = JWTKeys('ES256', pem.replace('\n', '\\n'))
+        assert isinstance(keys.verifying_key, ec.EllipticCurvePublicKey)
+        signed = jwt.encode({'sub': '1'}, keys.signing_key, algorithm='ES256')
+        assert jwt.decode(signed, keys.verifying_key, algorithms=['ES256']) == {'sub': '1'}
+
+        headers = {"Authorization": f"Bearer {token}"}
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+            with patch('src.db.core.sessionmanager.new_session'), \
+                 patch('src.db.redis.TokenBlocklist.is_token_blocked', new_callable=AsyncMock, return_value=True):
+                response = await client.get("/api/v1/system/auth", headers=headers)
+            assert response.status_code == 400
+            response = await client.get("/api/v1/system/auth", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()['data']['verified_tokens']['hits'] >= 2
+
+    @pytest.mark.asyncio
+    async def test_redis_batching(self):
+        """Multi-key calls and pipelines share round trips, auto batching coalesces the commands of one event loop tick"""
+        import asyncio
+        from src.db.redis import RedisClient
+        from src.exceptions import AppException
+
+        keys = ['batch:a', 'batch:b', 'batch:c', 'batch:text', 'batch:counter', 'batch:k']
+        client = RedisClient()
+        await client.delete_many(keys)
+        try:
+            await client.mset({'batch:a': '1', 'batch:b': '2'}, expiry=60)
+            assert await client.mget(['batch:a', 'batch:b', 'batch:missing']) == [b'1', b'2', None]
+            assert await client.exists_many(['batch:a', 'batch:missing']) == [True, False]
+            async with client.pipeline() as pipe:
+                pipe.set('batch:c', 'x')
+                pipe.incr('batch:a')
+            assert await client.delete_many(['batch:a', 'batch:b', 'batch:c']) == 3
+
+            batching = RedisClient(auto_batch=True)
+            await batching.set('batch:text', 'not a number')
+            results = await asyncio.gather(
+                *(batching.incr('batch:counter') for _ in range(10)),
+                batching.exists('batch:counter'),
+                batching.incr('batch:text'),
+                return_exceptions=True,
+            )
+            assert sorted(results[:10]) == list(range(1, 11))
+            # One round trip for the twelve commands, the failing one only fails its own caller
+            assert isinstance(results[-1], AppException) and results[-2] is True
+            assert batching.batch_stats['max_batch'] == 12
+
+            # A value that cannot be encoded stops the pipeline before it is sent, the other commands still run
+            await batching.set('batch:a', '1')
+            results = await asyncio.gather(
+                batching.exists('batch:a'), batching.set('batch:k', None), batching.get('batch:a'),
+                return_exceptions=True,
+            )
+            assert results[0] is True and isinstance(results[1], AppException) and results[2] == b'1'
+            assert 'Invalid input' in str(results[1])
+
+            redis = await batching.connect()
+            script = redis.register_script("return tonumber(ARGV[1]) + 1")
+            await redis.script_flush()
+            # NOSCRIPT from the batched EVALSHA falls back to loading the script
+            assert await asyncio.gather(*(batching.run_script(script, keys=[], args=[n]) for n in range(3))) == [1, 2, 3]
+            assert await batching.run_script(script, keys=[], args=[41]) == 42
+        finally:
+            await client.delete_many(keys)
+
+    @pytest.mark.asyncio
+    async def test_task_export(self, test_engine):
+        """The export streams NDJSON or CSV with download headers, applies the filters and closes its own session"""
+        import csv
+        import io
+        import json
+        from datetime import datetime
+        from httpx import ASGITransport, AsyncClient
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+        from src.db.redis import RedisClient
+        from src.modules.task.models import Task
+        from src.modules.task.repositories import TaskRepository
+        from src.modules.user.models import User
+
+        class ExportSession(AsyncSession):
+            closed = False
+
+            async def close(self):
+                self.closed = True
+                await super().close()
+
+        session_maker = async_sessionmaker(test_engine, class_=ExportSession, expire_on_commit=False)
+        async with session_maker() as session:
+            session.add_all([
+                User(id=9006, name='Exporter', email='export9006@example.com', role='USER', password_hash='x'),
+                User(id=9007, name='Assignee', email='export9007@example.com', role='USER', password_hash='x'),
+            ])
+            await session.flush()
+            session.add_all([
+                Task(id=1, title='Draft', status='TODO', priority='HIGH', creator_id=9006, assignee_id=9007,
+                     due_date=datetime(2024, 12, 31, 23, 59, 59)),
+                Task(id=2, title='Review, then ship', description='Line one\nline two', status='DONE', priority='LOW', creator_id=9006),
+                Task(id=3, title='Plan', status='TODO', priority='LOW', creator_id=9006, assignee_id=9007),
+            ])
+            await session.commit()
+
+        export_sessions = []
+
+        async def get_session(use_replica=False):
+            export_sessions.append(session_maker())
+            return export_sessions[-1]
+
+        headers = {"Authorization": f"Bearer {self._create_test_access_token(user_id='9006')}"}
+        rate_limit_key = 'rate-limit:user:user:9006'
+        await RedisClient().delete_many([rate_limit_key])
+        try:
+            with patch('src.db.core.sessionmanager.new_session', return_value=AsyncMock()), \
+                 patch('src.db.core.sessionmanager.get_session', side_effect=get_session):
+                async with AsyncClient(transport=ASGITransport(app=app), base_url="http://testserver") as client:
+                    response = await client.get("/api/v1/tasks/export", headers=headers)
+                    assert response.status_code == 200, response.text
+                    assert response.headers['content-type'] == 'application/x-ndjson'
+                    assert response.headers['content-disposition'] == 'attachment; filename="tasks.ndjson"'
+                    rows = [json.loads(line) for line in response.text.splitlines()]
+                    assert [row['id'] for row in rows] == [1, 2, 3]
+                    assert rows[0]['due_date'] == '2024-12-31T23:59:59' and rows[1]['description'] == 'Line one\nline two'
+
+                    response = await client.get("/api/v1/tasks/export", params={'format': 'csv'}, headers=headers)
+                    assert response.status_code == 200, response.text
+                    assert response.headers['content-type'].startswith('text/csv')
+                    assert response.headers['content-disposition'] == 'attachment; filename="tasks.csv"'
+                    assert response.text.splitlines()[0] == 'id,title,description,status,priority,due_date,assignee_id,creator_id,created_at,updated_at'
+                    rows = list(csv.DictReader(io.StringIO(response.text)))
+                    assert [(row['id'], row['title'], row['description']) for row in rows] == [
+                        ('1', 'Draft', ''), ('2', 'Review, then ship', 'Line one\nline two'), ('3', 'Plan', ''),
+                    ]
+
+                    for params, ids in [
+                        ({'status': 'TODO'}, [1, 3]),
+                        ({'priority': 'LOW'}, [2, 3]),
+                        ({'assignee_id': 9007, 'priority': 'HIGH'}, [1]),
+                        ({'status': 'IN_PROGRESS'}, []),
+                    ]:
+                        response = await client.get("/api/v1/tasks/export", params=params, headers=headers)
+                        assert [json.loads(line)['id'] for line in response.text.splitlines()] == ids, params
+
+                    # Failing once rows are sent: NDJSON says so in a last line, CSV is cut short
+                    async def failing_stream(self, session, conditions={}, **kwargs):
+                        yield await session.get(Task, 1)
+                        raise RuntimeError('connection lost')
+
+                    with patch.object(TaskRepository, 'stream', failing_stream):
+                        response = await client.get("/api/v1/tasks/export", headers=headers)
+                        lines = [json.loads(line) for line in response.text.splitlines()]
+                        assert [row['id'] for row in lines[:-1]] == [1]
+                        assert lines[-1] == {'error': 'Export failed', 'rows': 1}
+                        with pytest.raises(Exception, match='connection lost'):
+                            await client.get("/api/v1/tasks/export", params={'format': 'csv'}, headers=headers)
+
+            assert len(export_sessions) == 8
+            assert all(session.closed for session in export_sessions)
+        finally:
+            await RedisClient().delete_many([rate_limit_key])
@@ -41,6 +41,42 @@ class TestServiceLevel:
             db_session, "test@example.com", "wrongpassword"
         )
         assert wrong_auth is None
+
+    @pytest.mark.asyncio
+    async def test_password_hashing_off_loop(self, db_session, test_user):
+        """bcrypt runs in the bounded worker pool, extra callers are turned away and old cost factors re-hashed on login"""
+        import asyncio
+        from passlib.context import CryptContext
+        from src.config import Config
+        from src.modules.auth.exceptions import PasswordHasherBusy
+        from src.modules.auth.hashing import PasswordHasher
+
+        hasher = PasswordHasher(CryptContext(schemes=['bcrypt'], bcrypt__rounds=10), workers=1, queue_size=1)
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        ticking = asyncio.create_task(ticker())
+        try:
+            results = await asyncio.gather(*(hasher.hash('password') for _ in range(3)), return_exceptions=True)
+        finally:
+            ticking.cancel()
+            hasher.close()
+        # One hashing, one waiting for the slot, the third rejected instead of queued
+        assert [isinstance(result, PasswordHasherBusy) for result in results] == [False, False, True]
+        assert hasher.stats()['completed'] == 2 and hasher.stats()['rejected'] == 1
+        # The event loop kept serving while two hashes ran back to back
+        assert ticks > 20
+
+        # A hash made with another cost factor is replaced on the next successful login
+        test_user.password_hash = CryptContext(schemes=['bcrypt'], bcrypt__rounds=4).hash('testpassword123')
+        await db_session.commit()
+        assert await AuthService(UserTestModel).authenticate(db_session, 'test@example.com', 'testpassword123')
+        assert test_user.password_hash.startswith(f'$2b${Config.PASSWORD_HASH_ROUNDS:02d}$')
     
     @pytest.mark.asyncio
     async def test_task_service_operations(self, db_session, test_user, test_admin_user):
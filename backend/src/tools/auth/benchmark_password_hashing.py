@@ -0,0 +1,71 @@
+"""benchmark_password_hashing.py
+
+Login throughput and event loop latency under a burst of concurrent logins,
+bcrypt verification run on the event loop vs. in the PasswordHasher worker pool.
+No database is needed, every login verifies the same stored hash at the configured cost factor.
+A probe task wakes up every PROBE_INTERVAL_MS, how late it wakes is what any other request would wait.
+
+inline: passwd_context.verify() called from the coroutine, as login did before
+pool:   password_hasher.verify(), PASSWORD_HASH_WORKERS threads
+
+Usage (from backend/): python -m src.tools.auth.benchmark_password_hashing [logins]
+"""
+
+import asyncio
+import sys
+from time import perf_counter
+
+from src.config import Config
+from src.modules.auth.utils import passwd_context, password_hasher
+
+PASSWORD = 'benchmark-password'
+PROBE_INTERVAL_MS = 5
+
+
+async def inline_login(hash: str):
+    assert passwd_context.verify(PASSWORD, hash)
+
+
+async def pool_login(hash: str):
+    assert await password_hasher.verify(PASSWORD, hash)
+
+
+async def probe(lags: list):
+    while True:
+        started = perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL_MS / 1000)
+        lags.append((perf_counter() - started) * 1000 - PROBE_INTERVAL_MS)
+
+
+async def burst(login, hash: str, logins: int) -> dict:
+    lags = []
+    probing = asyncio.create_task(probe(lags))
+    await asyncio.sleep(0)
+    started = perf_counter()
+    await asyncio.gather(*(login(hash) for _ in range(logins)))
+    elapsed = perf_counter() - started
+    probing.cancel()
+    lags.sort()
+    return {
+        'logins_per_s': logins / elapsed,
+        'lag_p50_ms': lags[len(lags) // 2] if lags else elapsed * 1000,
+        'lag_max_ms': lags[-1] if lags else elapsed * 1000,
+    }
+
+
+async def run(logins: int = 32):
+    # The pool may turn callers away past its queue, a benchmark burst waits instead
+    password_hasher.queue_size = max(password_hasher.queue_size, logins)
+    hash = passwd_context.hash(PASSWORD)
+    flows = {'inline': inline_login, 'pool': pool_login}
+
+    print(f'bcrypt cost {Config.PASSWORD_HASH_ROUNDS}, {password_hasher.workers} hashing threads, {logins} concurrent logins')
+    print(f'{"flow":<10}{"logins/s":>12}{"loop lag p50":>16}{"loop lag max":>16}')
+    for name, login in flows.items():
+        result = await burst(login, hash, logins)
+        print(f'{name:<10}{result["logins_per_s"]:>12.1f}{result["lag_p50_ms"]:>14.1f}ms{result["lag_max_ms"]:>14.1f}ms')
+    password_hasher.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 32))
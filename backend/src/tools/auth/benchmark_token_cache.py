@@ -0,0 +1,73 @@
+"""benchmark_token_cache.py
+
+Per-request cost of verifying an access token for the algorithms offered by show:algorithms (and ES256),
+with fresh keys generated for the run.
+
+string:   jwt.decode() with the key as a string, parsed again on every call (as before)
+prepared: jwt.decode() with the key object JWTKeys parsed once
+cached:   VerifiedTokenCache lookup by token digest, the steady state for a reused token
+
+Usage (from backend/): python -m src.tools.auth.benchmark_token_cache [iterations]
+"""
+
+import secrets
+import sys
+from time import perf_counter, time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from src.modules.auth.tokens import JWTKeys, VerifiedTokenCache
+
+
+def private_pem(key) -> str:
+    return key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+
+
+def public_pem(key) -> str:
+    return key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+
+
+def key_material():
+    rsa_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    ec_key = ec.generate_private_key(ec.SECP256R1())
+    hmac_secret = secrets.token_urlsafe(64)
+    return {
+        'HS256': (hmac_secret, hmac_secret),
+        'RS256': (private_pem(rsa_key), public_pem(rsa_key)),
+        'ES256': (private_pem(ec_key), public_pem(ec_key)),
+    }
+
+
+def timed(fn, iterations: int) -> float:
+    for _ in range(min(100, iterations)):
+        fn()
+    started = perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (perf_counter() - started) / iterations * 1e6
+
+
+def run(iterations: int = 2000):
+    payload = {'user': {'email': 'admin@example.com', 'user_id': '1', 'role': 'ADMIN'}, 'exp': int(time()) + 3600}
+
+    print(f'{"algorithm":<10}{"string us":>12}{"prepared us":>14}{"cached us":>12}   ({iterations} decodes)')
+    for algorithm, (secret, verifying) in key_material().items():
+        keys = JWTKeys(algorithm, secret)
+        token = jwt.encode(payload, keys.signing_key, algorithm=algorithm)
+        cache = VerifiedTokenCache(maxsize=1024)
+        cache.set(token, jwt.decode(token, keys.verifying_key, algorithms=[algorithm]))
+
+        string = timed(lambda: jwt.decode(token, verifying, algorithms=[algorithm]), iterations)
+        prepared = timed(lambda: jwt.decode(token, keys.verifying_key, algorithms=[algorithm]), iterations)
+        cached = timed(lambda: cache.get(token), iterations)
+        print(f'{algorithm:<10}{string:>12.1f}{prepared:>14.1f}{cached:>12.1f}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,83 @@
+"""benchmark_statements.py
+
+Per-call cost of preparing the hot repository statements, rebuilt from scratch vs. reused templates.
+No database is needed: the timings cover what happens before the driver is called,
+building the select() tree, generating its cache key and compiling it for MySQL.
+
+Usage (from backend/): python -m src.tools.db.benchmark_statements [iterations]
+"""
+
+import sys
+from timeit import timeit
+
+from sqlalchemy import and_, bindparam, desc, tuple_, Integer
+from sqlalchemy.dialects import mysql
+from sqlalchemy.future import select
+
+from src.modules.task.models import Task
+from src.modules.user.models import User  # noqa: F401, resolves the Task relationships
+from src.repositories.statements import StatementCache, condition_filter, conditions_shape
+
+DIALECT = mysql.dialect()
+
+
+def rebuilt_get_by_id():
+    return select(Task).filter(Task.id == 42).filter(Task.deleted_at == None)
+
+
+def rebuilt_where_first():
+    filters = [getattr(Task, column) == value for column, value in {'creator_id': 7, 'status': 'TODO'}.items()]
+    filters.append(Task.deleted_at == None)
+    return select(Task).where(and_(*filters))
+
+
+def rebuilt_paginate_cursor():
+    filters = [Task.deleted_at == None, Task.creator_id == 7]
+    filters.append(tuple_(Task.created_at, Task.id) < tuple_('2024-01-01 00:00:00', 100))
+    return select(Task).where(and_(*filters)).order_by(desc(Task.created_at), desc(Task.id)).limit(11)
+
+
+def template_builders():
+    def get_by_id():
+        return select(Task).filter(Task.id == bindparam('entity_id')).filter(Task.deleted_at == None)
+
+    def where_first():
+        shape = conditions_shape({'creator_id': 7, 'status': 'TODO'})
+        filters = [condition_filter(getattr(Task, column), column, value_shape) for column, value_shape in shape]
+        filters.append(Task.deleted_at == None)
+        return select(Task).where(and_(*filters))
+
+    def paginate_cursor():
+        filters = [Task.deleted_at == None, condition_filter(Task.creator_id, 'creator_id', 'value')]
+        filters.append(tuple_(Task.created_at, Task.id) < tuple_(bindparam('cursor_0'), bindparam('cursor_1')))
+        statement = select(Task).where(and_(*filters)).order_by(desc(Task.created_at), desc(Task.id))
+        return statement.limit(bindparam('limit', type_=Integer))
+
+    return {'get_by_id': get_by_id, 'where_first': where_first, 'paginate_cursor': paginate_cursor}
+
+
+def run(iterations: int = 10000):
+    rebuilt = {'get_by_id': rebuilt_get_by_id, 'where_first': rebuilt_where_first, 'paginate_cursor': rebuilt_paginate_cursor}
+    templates = template_builders()
+    cache = StatementCache()
+    compiled_cache = {}
+
+    def prepare(statement):
+        # What Session.execute does on a compiled cache hit: generate the cache key and look the compiled form up
+        key = statement._generate_cache_key()
+        compiled = compiled_cache.get(key.key)
+        if compiled is None:
+            compiled = compiled_cache[key.key] = statement.compile(dialect=DIALECT)
+        return compiled
+
+    print(f'{"query":<18}{"no cache":>12}{"rebuilt":>12}{"template":>12}{"saved":>10}   (us per call, {iterations} calls)')
+    for name in rebuilt:
+        no_cache = timeit(lambda: rebuilt[name]().compile(dialect=DIALECT), number=iterations) / iterations * 1e6
+        rebuilt_cost = timeit(lambda: prepare(rebuilt[name]()), number=iterations) / iterations * 1e6
+        template_cost = timeit(lambda: prepare(cache.get(name, templates[name])), number=iterations) / iterations * 1e6
+        saved = (1 - template_cost / rebuilt_cost) * 100
+        print(f'{name:<18}{no_cache:>12.1f}{rebuilt_cost:>12.1f}{template_cost:>12.1f}{saved:>9.0f}%')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -58,13 +58,20 @@ def decode_cursor(cursor_token: str) -> Dict[str, Any]:
         json_str = base64.b64decode(cursor_token.encode()).decode()
         cursor_data = json.loads(json_str)
         
+        def parse_datetime(value):
+            if isinstance(value, str) and 'T' in value:
+                try:
+                    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+                except ValueError:
+                    pass
+            return value
+
         if isinstance(cursor_data, dict):
             for key, value in cursor_data.items():
-                if isinstance(value, str) and 'T' in value:
-                    try:
-                        cursor_data[key] = datetime.fromisoformat(value.replace('Z', '+00:00'))
-                    except ValueError:
-                        pass
+                if isinstance(value, list):
+                    cursor_data[key] = [parse_datetime(each) for each in value]
+                else:
+                    cursor_data[key] = parse_datetime(value)
         
         return cursor_data
     except Exception as e: